@@ -0,0 +1,4 @@
+# bench/
+# Benchmarks for the simulator and the seed generators. Run them from the
+# top of the repository: python -m bench (the full suite, see -h) or
+# python -m bench.allocations (allocations per generation only)
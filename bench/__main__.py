@@ -0,0 +1,7 @@
+# bench/__main__.py
+# Allows running the benchmark suite as: python -m bench
+
+from bench.suite import main
+
+main()
+# EOF
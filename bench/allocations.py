@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+
+# bench/allocations.py
+
+# Measures how much memory the simulation loop allocates per generation,
+# comparing the default runSimulation against its preallocate mode.
+# Allocations are counted with tracemalloc: every generation the peak is
+# reset, so the peak above the starting level is the memory that generation
+# churned through before handing it back.
+
+import argparse
+import tracemalloc
+import numpy as np
+import gameUtils
+import seedTester as st
+
+def measureSteps(world, generations, kernelMx=gameUtils.fullKernel):
+	# Steps the world (plus a census, as runSimulation does) and returns the
+	# mean number of bytes allocated per generation
+	tracemalloc.start()
+	total = 0
+	for generation in range(generations):
+		tracemalloc.reset_peak()
+		start = tracemalloc.get_traced_memory()[0]
+		world.step(kernelMx)
+		world.calcDensity()
+		total += tracemalloc.get_traced_memory()[1] - start
+	tracemalloc.stop()
+	return total / generations
+
+def measureSimulation(seed, sideLength, maxDuration, **simArgs):
+	# Runs one full simulation under tracemalloc
+	# Returns (generations run, peak bytes above the starting level)
+	tracemalloc.start()
+	start = tracemalloc.get_traced_memory()[0]
+	result = st.runSimulation(seed, sideLength, maxDuration, **simArgs)
+	peak = tracemalloc.get_traced_memory()[1] - start
+	tracemalloc.stop()
+	return (len(result[1]), peak)
+
+def main():
+	cmdArgs = argparse.ArgumentParser(description="Compares the memory allocated per generation with and without preallocated buffers.")
+	cmdArgs.add_argument('-f', '--file', type=str, help="Use a Plaintext seed as the workload (default: a random 4x4 seed).")
+	cmdArgs.add_argument('-s', '--size', type=int, default=100, help="Sets the side length of the world grid.")
+	cmdArgs.add_argument('-t', '--time', type=int, default=200, help="Sets the number of generations to measure.")
+	argVals = cmdArgs.parse_args()
+	if argVals.file is not None: seed = gameUtils.readSeedFile(argVals.file)
+	else: seed = np.random.default_rng(0).random((4, 4)) < 0.5
+	print("World:", argVals.size, "x", argVals.size, "-", argVals.time, "generations")
+	for label, preallocate in (("default", False), ("preallocate", True)):
+		world = gameUtils.GameOfLife(seed, argVals.size)
+		if preallocate: world.allocateBuffers()
+		perStep = measureSteps(world, argVals.time)
+		generations, peak = measureSimulation(seed, argVals.size, argVals.time, preallocate=preallocate)
+		print(label + ":", round(perStep), "bytes allocated per generation;",
+				"runSimulation peak", peak, "bytes over", generations, "generations")
+
+if __name__ == "__main__":
+	main()
+# EOF
@@ -0,0 +1,244 @@
+# bench/suite.py
+
+# The benchmark harness: sweeps the stepping engines, world sizes, seed
+# densities and generator workloads, reports throughput, peak RSS and
+# allocations per generation, and writes everything out as JSON. A stored
+# JSON run can be given as a baseline, in which case any metric that got
+# worse by more than the tolerance is reported and the run exits non-zero.
+# Run it from the top of the repository: python -m bench -h
+
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import platform
+import resource
+import sys
+import time
+import numpy as np
+import gameUtils
+import seedTester as st
+from bench.allocations import measureSteps
+
+# Metrics where a bigger number is better; every other metric is a cost
+throughputMetrics = ('cellsPerSec', 'gensPerSec', 'seedsPerSec', 'runsPerSec')
+costMetrics = ('peakRssKb', 'allocBytesPerGen')
+suites = {
+	'quick': {'sizes': [10, 100, 1024], 'populations': [20, 200]},
+	'full': {'sizes': [10, 64, 100, 256, 1024, 4096], 'populations': [20, 200, 2000]},
+}
+
+def loadPattern(path):
+	# Reads a seed file without letting its comments reach stdout
+	with contextlib.redirect_stdout(io.StringIO()):
+		return gameUtils.readSeedFile(path)
+
+def randomWorld(engine, sideLength, density, rng):
+	# Builds a world for the engine and fills it at the given density
+	world = gameUtils.engines[engine](np.zeros((1, 1), dtype=bool), sideLength)
+	world.state = rng.random((sideLength, sideLength)) < density
+	world.takeCensus()
+	return world
+
+def timeSteps(world, generations, budget):
+	# Steps the world until the generation count or time budget runs out
+	# Returns (generations run, seconds taken)
+	start = time.perf_counter()
+	elapsed = 0.0
+	run = 0
+	while run < generations and (run == 0 or elapsed < budget):
+		world.step()
+		world.calcDensity()
+		run += 1
+		elapsed = time.perf_counter() - start
+	return (run, elapsed)
+
+def peakRssKb():
+	# Returns the peak resident set size of this process in KB
+	peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	if sys.platform == 'darwin': peak //= 1024 # macOS reports bytes
+	return peak
+
+# Workloads
+# Each one takes its parameters as keyword arguments and returns a dict of
+# metrics. They are run in a fresh child process so peak RSS is per case.
+def stepWorkload(engine, sideLength, density, generations, budget, pattern=None):
+	# Times the raw step+census loop of one engine
+	rng = np.random.default_rng(0)
+	if pattern is None:
+		world = randomWorld(engine, sideLength, density, rng)
+	else:
+		world = gameUtils.engines[engine](loadPattern(pattern), sideLength)
+	# One untimed step first, so lazy setup (eg Numba compiling) is excluded
+	world.step()
+	run, elapsed = timeSteps(world, generations, budget)
+	metrics = {'generations': run, 'seconds': elapsed, 'gensPerSec': run / elapsed,
+			'cellsPerSec': run * sideLength ** 2 / elapsed}
+	# Allocation counting slows stepping down, so it gets its own short pass
+	metrics['allocBytesPerGen'] = measureSteps(world, min(run, 5))
+	return metrics
+
+def convolveWorkload(sideLength, density, generations, budget):
+	# Times GameOfLife.convolve on its own
+	world = randomWorld('convolve', sideLength, density, np.random.default_rng(0))
+	start = time.perf_counter()
+	run = 0
+	while run < generations and (run == 0 or time.perf_counter() - start < budget):
+		world.convolve(gameUtils.fullKernel)
+		run += 1
+	elapsed = time.perf_counter() - start
+	return {'generations': run, 'seconds': elapsed, 'gensPerSec': run / elapsed,
+			'cellsPerSec': run * sideLength ** 2 / elapsed}
+
+def simulationWorkload(population, sideLength, generations, seedWidth=4):
+	# Times full runSimulation calls, one seed at a time, as the GA used to
+	rng = np.random.default_rng(0)
+	seeds = [rng.random((seedWidth, seedWidth)) < 0.5 for index in range(population)]
+	start = time.perf_counter()
+	results = [st.runSimulation(seed, sideLength, generations) for seed in seeds]
+	elapsed = time.perf_counter() - start
+	simulated = sum(len(result[1]) for result in results)
+	return {'seconds': elapsed, 'seedsPerSec': population / elapsed, 'gensPerSec': simulated / elapsed,
+			'cellsPerSec': simulated * sideLength ** 2 / elapsed}
+
+def batchWorkload(population, sideLength, generations, seedWidth=4):
+	# Times runSimulationBatch over a whole population
+	rng = np.random.default_rng(0)
+	seeds = [rng.random((seedWidth, seedWidth)) < 0.5 for index in range(population)]
+	start = time.perf_counter()
+	results = st.runSimulationBatch(seeds, sideLength, generations)
+	elapsed = time.perf_counter() - start
+	simulated = sum(len(result[1]) for result in results)
+	return {'seconds': elapsed, 'seedsPerSec': population / elapsed, 'gensPerSec': simulated / elapsed,
+			'cellsPerSec': simulated * sideLength ** 2 / elapsed}
+
+def generatorWorkload(generator, population):
+	# Times a complete, seeded run of one of the generator programs
+	module = __import__(generator)
+	argv = [generator, '--seed', '0']
+	if generator == 'geneticGenerator': argv += ['-p', str(population)]
+	savedArgv = sys.argv
+	sys.argv = argv
+	start = time.perf_counter()
+	try:
+		with contextlib.redirect_stdout(io.StringIO()):
+			module.main()
+	finally:
+		sys.argv = savedArgv
+	elapsed = time.perf_counter() - start
+	return {'seconds': elapsed, 'runsPerSec': 1 / elapsed}
+
+workloads = {
+	'step': stepWorkload,
+	'convolve': convolveWorkload,
+	'simulation': simulationWorkload,
+	'batch': batchWorkload,
+	'generator': generatorWorkload,
+}
+
+def runCase(name, params):
+	# Runs a single workload and adds the peak RSS to its metrics
+	metrics = workloads[name](**params)
+	metrics['peakRssKb'] = peakRssKb()
+	return metrics
+
+def runIsolated(name, params):
+	# Runs the workload in a forked child, so its memory use is its own
+	context = multiprocessing.get_context('fork')
+	with context.Pool(1) as pool:
+		return pool.apply(runCase, (name, params))
+
+def buildCases(argVals):
+	# Expands the command line sweep into a list of (workload, params)
+	cases = []
+	sizes = argVals.sizes or suites[argVals.suite]['sizes']
+	populations = argVals.populations or suites[argVals.suite]['populations']
+	for engine in argVals.engines:
+		for size in sizes:
+			if engine == 'hashlife' and size & (size - 1): continue
+			for density in argVals.densities:
+				cases.append(('step', {'engine': engine, 'sideLength': size, 'density': density,
+						'generations': argVals.generations, 'budget': argVals.budget}))
+			for pattern in argVals.patterns:
+				cases.append(('step', {'engine': engine, 'sideLength': size, 'density': None,
+						'generations': argVals.generations, 'budget': argVals.budget, 'pattern': pattern}))
+	for size in sizes:
+		cases.append(('convolve', {'sideLength': size, 'density': argVals.densities[0],
+				'generations': argVals.generations, 'budget': argVals.budget}))
+	for population in populations:
+		cases.append(('simulation', {'population': population, 'sideLength': 10, 'generations': 1000}))
+		cases.append(('batch', {'population': population, 'sideLength': 10, 'generations': 1000}))
+	if argVals.generators:
+		cases.append(('generator', {'generator': 'geneticGenerator', 'population': populations[0]}))
+		cases.append(('generator', {'generator': 'neuralNetwork', 'population': populations[0]}))
+	return cases
+
+def caseKey(result):
+	# Identifies a result so it can be matched against the baseline
+	return result['workload'] + json.dumps(result['params'], sort_keys=True)
+
+def compareToBaseline(results, baseline, tolerance):
+	# Returns a list of messages, one for every metric that regressed
+	previous = {caseKey(result): result for result in baseline['results']}
+	regressions = []
+	for result in results:
+		old = previous.get(caseKey(result))
+		if old is None: continue
+		for metric, value in result['metrics'].items():
+			oldValue = old['metrics'].get(metric)
+			if not oldValue: continue
+			if metric in throughputMetrics: change = (oldValue - value) / oldValue
+			elif metric in costMetrics: change = (value - oldValue) / oldValue
+			else: continue
+			if change > tolerance:
+				regressions.append(caseKey(result) + ' ' + metric + ': ' + str(oldValue) + ' -> ' + str(value)
+						+ ' (' + str(round(change * 100, 1)) + '% worse)')
+	return regressions
+
+def main(args=None):
+	cmdArgs = argparse.ArgumentParser(description="Benchmarks the simulator engines and generator workloads.")
+	cmdArgs.add_argument('--suite', type=str, default='quick', choices=suites, help="Selects the default world sizes and population sizes.")
+	cmdArgs.add_argument('--sizes', type=intList, default=None, help="Comma-separated world side lengths, eg 10,100,4096.")
+	cmdArgs.add_argument('--densities', type=floatList, default=[0.3], help="Comma-separated starting densities for random worlds.")
+	cmdArgs.add_argument('--generations', type=int, default=50, help="Sets the number of generations per step workload.")
+	cmdArgs.add_argument('--budget', type=float, default=2.0, help="Caps the seconds spent stepping a single case.")
+	cmdArgs.add_argument('--populations', type=intList, default=None, help="Comma-separated population sizes for the simulation workloads.")
+	cmdArgs.add_argument('--engines', type=stringList, default=['convolve', 'packed', 'tiled', 'fused'], help="Comma-separated engine names (see gameUtils.engines).")
+	cmdArgs.add_argument('--patterns', type=stringList, default=[], help="Comma-separated seed files to use as fixed workloads.")
+	cmdArgs.add_argument('--generators', action='store_true', help="Also time complete geneticGenerator and neuralNetwork runs.")
+	cmdArgs.add_argument('--no-isolate', dest='isolate', action='store_false', help="Run every case in this process (peak RSS becomes cumulative).")
+	cmdArgs.add_argument('-o', '--output', type=str, default=None, help="Writes the JSON results to this file instead of stdout.")
+	cmdArgs.add_argument('--baseline', type=str, default=None, help="Compares against a stored JSON run and fails on regressions.")
+	cmdArgs.add_argument('--tolerance', type=float, default=0.25, help="Sets the fraction by which a metric may worsen before it counts.")
+	argVals = cmdArgs.parse_args(args)
+	results = []
+	for name, params in buildCases(argVals):
+		metrics = runIsolated(name, params) if argVals.isolate else runCase(name, params)
+		results.append({'workload': name, 'params': params, 'metrics': metrics})
+		print(name, params, {key: round(value, 1) for key, value in metrics.items()}, file=sys.stderr)
+	report = {'meta': {'python': platform.python_version(), 'numpy': np.__version__,
+			'machine': platform.machine(), 'time': time.strftime("%Y-%m-%d %H:%M:%S")}, 'results': results}
+	output = json.dumps(report, indent=1)
+	if argVals.output is None: print(output)
+	else:
+		with open(argVals.output, 'w') as target:
+			target.write(output + '\n')
+	if argVals.baseline is not None:
+		with open(argVals.baseline) as source:
+			baseline = json.load(source)
+		regressions = compareToBaseline(results, baseline, argVals.tolerance)
+		for message in regressions:
+			print("REGRESSION:", message, file=sys.stderr)
+		if regressions:
+			sys.exit(1)
+		print("No regressions against", argVals.baseline, file=sys.stderr)
+
+def intList(text):
+	return [int(entry) for entry in text.split(',') if entry]
+def floatList(text):
+	return [float(entry) for entry in text.split(',') if entry]
+def stringList(text):
+	return [entry for entry in text.split(',') if entry]
+
+# EOF
@@ -0,0 +1,70 @@
+# checkpoint.py
+
+# Saves and restores the state of a long-running search, so that a killed
+# run can be resumed with --resume. A checkpoint folder holds:
+# - snapshot-NNNNNN.npz: the arrays of the search state at generation NNNNNN
+# - manifest.json: the generation, the name of the current snapshot and any
+#   small values (including the state of the random module)
+# Both are written to temporary files and renamed into place, and the
+# manifest only changes once its snapshot is complete, so whichever
+# checkpoint the manifest names is always whole. Older snapshots are
+# removed after the manifest has moved on.
+
+import json
+import os
+import random
+import time
+import numpy as np
+
+manifestName = 'manifest.json'
+
+def randomState():
+	# Captures the state of the random module and numpy's global generator
+	# Returns (arrays for the snapshot, values for the manifest)
+	version, pyState, pyGauss = random.getstate()
+	npName, npKeys, npPos, npHasGauss, npGauss = np.random.get_state()
+	arrays = {'rngPython': np.array(pyState, dtype=np.uint64), 'rngNumpy': npKeys}
+	values = {'rngPython': [version, pyGauss], 'rngNumpy': [npName, int(npPos), int(npHasGauss), float(npGauss)]}
+	return (arrays, values)
+
+def restoreRandomState(arrays, values):
+	# Puts back a random state captured by randomState
+	version, pyGauss = values['rngPython']
+	random.setstate((version, tuple(int(entry) for entry in arrays['rngPython']), pyGauss))
+	npName, npPos, npHasGauss, npGauss = values['rngNumpy']
+	np.random.set_state((npName, arrays['rngNumpy'], npPos, npHasGauss, npGauss))
+
+def saveCheckpoint(folder, program, generation, arrays, values=None):
+	# Atomically writes a checkpoint of the given arrays and manifest values
+	# The random state is always included
+	os.makedirs(folder, exist_ok=True)
+	rngArrays, rngValues = randomState()
+	snapshotName = 'snapshot-' + str(generation).zfill(6) + '.npz'
+	temporary = os.path.join(folder, snapshotName + '.tmp.npz')
+	np.savez(temporary, **arrays, **rngArrays)
+	os.replace(temporary, os.path.join(folder, snapshotName))
+	manifest = {'version': 1, 'program': program, 'generation': generation, 'snapshot': snapshotName,
+			'time': time.strftime("%Y-%m-%d %H:%M:%S"), 'values': dict(values or {}, **rngValues)}
+	manifestPath = os.path.join(folder, manifestName)
+	with open(manifestPath + '.tmp', 'w') as target:
+		json.dump(manifest, target, indent=1)
+	os.replace(manifestPath + '.tmp', manifestPath)
+	for entry in os.listdir(folder):
+		if entry.startswith('snapshot-') and entry != snapshotName:
+			os.remove(os.path.join(folder, entry))
+	return os.path.join(folder, snapshotName)
+
+def loadCheckpoint(folder, program):
+	# Reads the latest checkpoint in the folder, restoring the random state
+	# Returns (generation, arrays, manifest values), or None if there is none
+	manifestPath = os.path.join(folder, manifestName)
+	if not os.path.exists(manifestPath): return None
+	with open(manifestPath) as source:
+		manifest = json.load(source)
+	assert manifest['program'] == program, "The checkpoint in " + folder + " belongs to " + manifest['program']
+	with np.load(os.path.join(folder, manifest['snapshot'])) as snapshot:
+		arrays = {name: snapshot[name] for name in snapshot.files}
+	restoreRandomState(arrays, manifest['values'])
+	return (manifest['generation'], arrays, manifest['values'])
+
+# EOF
@@ -0,0 +1,150 @@
+# fitnessCache.py
+
+# Memoizes seed fitness values so repeated candidates skip the simulator.
+# Seeds are reduced to a canonical form first: they are cropped to the
+# bounding box of their live tiles and the smallest of their 8 rotations and
+# reflections is kept. On the square torus the simulation results do not
+# depend on where or how the seed is placed, so every seed sharing a
+# canonical form shares a fitness value.
+# Values live in an in-memory LRU tier and, optionally, an SQLite file that
+# separate runs can share.
+
+import json
+import sqlite3
+from collections import OrderedDict
+import numpy as np
+
+def cropSeed(seed):
+	# Trims the empty rows and columns from around the live tiles
+	seed = np.asarray(seed, dtype=bool)
+	rows = np.flatnonzero(seed.any(axis=1))
+	cols = np.flatnonzero(seed.any(axis=0))
+	if len(rows) == 0: return np.zeros((0, 0), dtype=bool)
+	return seed[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1]
+
+def symmetries(seed):
+	# Yields the 8 rotations and reflections of the given matrix
+	for turns in range(4):
+		rotated = np.rot90(seed, turns)
+		yield rotated
+		yield rotated.T
+
+def canonicalKey(seed):
+	# Returns a string that is identical for all seeds which only differ by
+	# translation, rotation or reflection
+	cropped = cropSeed(seed)
+	if cropped.size == 0: return 'empty'
+	keys = []
+	for variant in symmetries(cropped):
+		keys.append(str(variant.shape[0]) + 'x' + str(variant.shape[1]) + ':' + np.packbits(variant).tobytes().hex())
+	return min(keys)
+
+def namespaceFor(**simArgs):
+	# Builds a namespace string from the simulation arguments, so values
+	# computed under different settings are never mixed up
+	return ','.join(key + '=' + str(simArgs[key]) for key in sorted(simArgs))
+
+class FitnessCache:
+	# Two-tier fitness memo: an LRU dict in memory plus an optional SQLite file
+	# capacity: the number of entries kept in memory
+	# path: the SQLite file to use as the on-disk tier (None to disable)
+	# namespace: separates values computed with different simulation settings
+	def __init__(self, capacity=65536, path=None, namespace=''):
+		self.capacity = capacity
+		self.namespace = namespace
+		self.memory = OrderedDict()
+		self.hits = 0
+		self.diskHits = 0
+		self.misses = 0
+		self.db = None
+		if path is not None:
+			# Several processes (eg the GA's islands) may share the file, so
+			# a writer waits for the others' locks instead of failing at once
+			self.db = sqlite3.connect(path, timeout=60)
+			self.db.execute("CREATE TABLE IF NOT EXISTS fitness (namespace TEXT, seed TEXT, value TEXT, PRIMARY KEY (namespace, seed))")
+			self.db.commit()
+	def remember(self, key, value):
+		# Places a value in the memory tier, evicting the oldest if full
+		self.memory[key] = value
+		self.memory.move_to_end(key)
+		if len(self.memory) > self.capacity:
+			self.memory.popitem(last=False)
+	def get(self, seed, key=None):
+		# Returns the cached value for the seed, or None if it is unknown
+		if key is None: key = canonicalKey(seed)
+		if key in self.memory:
+			self.memory.move_to_end(key)
+			self.hits += 1
+			return self.memory[key]
+		if self.db is not None:
+			row = self.db.execute("SELECT value FROM fitness WHERE namespace = ? AND seed = ?", (self.namespace, key)).fetchone()
+			if row is not None:
+				value = tuple(json.loads(row[0]))
+				self.remember(key, value)
+				self.hits += 1
+				self.diskHits += 1
+				return value
+		self.misses += 1
+		return None
+	def put(self, seed, value, key=None):
+		# Stores the value for the seed in both tiers
+		self.putMany([seed], [value], [key])
+	def putMany(self, seeds, values, keys=None):
+		# Stores several values at once, with a single disk commit
+		if keys is None: keys = [None] * len(seeds)
+		rows = []
+		for seed, value, key in zip(seeds, values, keys):
+			if key is None: key = canonicalKey(seed)
+			self.remember(key, value)
+			rows.append((self.namespace, key, json.dumps(value)))
+		if self.db is not None and rows:
+			self.db.executemany("INSERT OR REPLACE INTO fitness VALUES (?, ?, ?)", rows)
+			self.db.commit()
+	def lookupMany(self, seeds, compute):
+		# Returns the values for all seeds, calling compute(list of seeds)
+		# once for the distinct canonical seeds that are not cached yet
+		keys = [canonicalKey(seed) for seed in seeds]
+		values = [None] * len(seeds)
+		pending = {} # key -> indices of the seeds that need it
+		for index, key in enumerate(keys):
+			if key in pending:
+				# A duplicate within this batch counts as a hit
+				pending[key].append(index)
+				self.hits += 1
+				continue
+			values[index] = self.get(seeds[index], key)
+			if values[index] is None: pending[key] = [index]
+		if pending:
+			firstIndices = [indices[0] for indices in pending.values()]
+			missed = [seeds[index] for index in firstIndices]
+			newValues = compute(missed)
+			self.putMany(missed, newValues, list(pending))
+			for indices, value in zip(pending.values(), newValues):
+				for index in indices: values[index] = value
+		return values
+	def getState(self):
+		# Returns the counters as a dict of arrays, for checkpoints
+		# The entries themselves are left out: they can be recomputed, and
+		# saving up to capacity of them every generation costs more than that
+		# (pass a path to keep them across runs)
+		return {'cacheCounters': np.array([self.hits, self.diskHits, self.misses])}
+	def setState(self, state):
+		# Restores the counters returned by getState, if the dict holds them
+		if 'cacheCounters' not in state: return
+		self.hits, self.diskHits, self.misses = (int(count) for count in state['cacheCounters'])
+	def hitRate(self):
+		# Returns the fraction of lookups that were served from the cache
+		total = self.hits + self.misses
+		if total == 0: return 0.0
+		return self.hits / total
+	def report(self):
+		# Returns a one-line summary of the cache counters
+		return ("Fitness cache: " + str(self.hits) + " hits (" + str(self.diskHits) + " from disk), "
+				+ str(self.misses) + " misses, " + str(round(self.hitRate() * 100, 1)) + "% hit rate")
+	def close(self):
+		# Closes the on-disk tier
+		if self.db is not None:
+			self.db.close()
+			self.db = None
+
+# EOF
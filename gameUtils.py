@@ -5,49 +5,34 @@
 # Contains the base GameOfLife class and assorted utilities for interacting
 # with it.
 
+import hashlib
+import re
+from collections import deque, namedtuple
 import numpy as np
-import scipy.signal as scp
+import patternIO
 
 liveChar = 'O'
 deadChar = '.'
+# The Moore neighborhood: all eight tiles surrounding a given tile
+fullKernel = [[1, 1, 1], [1, 0, 1], [1, 1, 1]]
+# The von Neumann neighborhood: only the four orthogonal neighbors
+orthoKernel = [[0, 1, 0], [1, 0, 1], [0, 1, 0]]
+# What happened in a world's latest step: the population it ended with and
+# the tiles that were born, died or changed (births + deaths) on the way
+StepStats = namedtuple('StepStats', ['generation', 'population', 'births', 'deaths', 'changed'])
 
 def readSeedFile(filename):
 	# Reads in the specified seed, printing any comments it discovers, and
 	# then creates and returns a matching Numpy array
-	seedLineIndex = 0
-	seedVals = []
-	with open(filename) as target:
-		for line in target:
-			# if the line starts with !, print it
-			if (line.startswith('!')):
-				print(line[1:], end='')
-			# Otherwise, if it's got the right starting val, read it
-			elif (line.startswith('.')) or (line.startswith('O')):
-				seedVals.append(parsePlaintextLine(line))
-			# Elsewise, there was an error
-			else:
-				print("! An invalid value was encountered while reading the seed file:", line.start())
-				return 0
-	# Use the seedVals to build the seedMx: list length, entry length
-	mxWidth = len(seedVals[0])
-	mxHeight = len(seedVals)
-	mxSize = (mxWidth, mxHeight)
-	seedMx = np.zeros(mxSize, dtype=bool)
-	#for line in seedVals:
-	for row in range(mxHeight):
-		for col in range(mxWidth):
-			seedMx[row][col] = seedVals[row][col]
-	return seedMx
+	# Plaintext, RLE and Life 1.06 files are accepted (see patternIO)
+	pattern = patternIO.readPattern(filename)
+	for comment in pattern.comments:
+		print(comment)
+	return pattern.seed
 def mxToStringList(target):
 	# Returns a string-list representation of a given matrix
-	output = []
-	for row in target:
-		rowString = ''
-		for entry in row:
-			if entry: rowString += liveChar
-			else: rowString += deadChar
-		output.append(rowString)
-	return output
+	chars = np.where(np.asarray(target, dtype=bool), liveChar, deadChar)
+	return [''.join(row) for row in chars]
 def parsePlaintextLine(seedLine):
 	# Reads in a string of . and O and returns an array of 0/1s
 	seedValues = np.zeros(len(seedLine) - 1)
@@ -62,66 +47,1105 @@ def parsePlaintextLine(seedLine):
 			pass
 	return seedValues
 
+# Life-like rules
+# A rule says which neighbor counts bring a dead tile to life (B) and which
+# keep a live tile alive (S), written as eg B3/S23 for Conway's Life. A 'V'
+# on the end (B2/S013V) counts the von Neumann neighborhood instead of the
+# Moore one. Each rule precomputes a (2, neighbors + 1) table indexed by
+# [current tile, neighbor count], so the next state is a single lookup.
+# The table is also packed into the bits of one integer (bit tile * stride +
+# count), and the lookup is done by shifting that integer by every tile's
+# index: numpy's fancy indexing is several times slower than its elementwise
+# operations, while the shift costs about as much as the two comparisons the
+# hard-coded rule used to make.
+# NOTE: the simulator has always run B2/S23 (a dead tile with 2 neighbors is
+# born, a live one with 2 or 3 survives), not Conway's B3/S23; it remains
+# the default so existing results and caches stay valid.
+defaultRule = 'B2/S23'
+namedRules = {
+	'thresher': 'B2/S23',
+	'life': 'B3/S23',
+	'conway': 'B3/S23',
+	'highlife': 'B36/S23',
+	'seeds': 'B2/S',
+	'daynight': 'B3678/S34678',
+	'lifewithoutdeath': 'B3/S012345678',
+	'maze': 'B3/S12345',
+	'2x2': 'B36/S125',
+}
+parsedRules = {} # notation -> LifeRule, so parsing happens once per rule
+topBit = np.uint32(1 << 31)
+
+class LifeRule:
+	# A parsed Life-like rule and its lookup table
+	# births, survivals: the neighbor counts that give a live tile next turn
+	# vonNeumann: counts the four orthogonal neighbors instead of all eight
+	def __init__(self, births, survivals, vonNeumann=False):
+		self.neighbors = 4 if vonNeumann else 8
+		self.births = tuple(sorted(set(births)))
+		self.survivals = tuple(sorted(set(survivals)))
+		for count in self.births + self.survivals:
+			if count > self.neighbors:
+				raise ValueError("A rule cannot count " + str(count) + " of " + str(self.neighbors) + " neighbors")
+		self.vonNeumann = vonNeumann
+		self.kernel = orthoKernel if vonNeumann else fullKernel
+		self.table = np.zeros((2, self.neighbors + 1), dtype=bool)
+		self.table[0, list(self.births)] = True
+		self.table[1, list(self.survivals)] = True
+		# Row-major: tile * stride + count indexes the flattened table
+		self.flatTable = self.table.ravel()
+		self.stride = self.neighbors + 1
+		self.packedTable = np.uint32(sum(1 << index for index in np.flatnonzero(self.flatTable)))
+		# The same bits in reverse, for apply's in-place path: shifting left
+		# by an index moves that index's bit to the top of the word
+		self.reversedTable = np.uint32(sum(1 << (31 - index) for index in np.flatnonzero(self.flatTable)))
+		self.strideByte = np.uint8(self.stride)
+		self.notation = ('B' + ''.join(str(count) for count in self.births) + '/S'
+				+ ''.join(str(count) for count in self.survivals) + ('V' if vonNeumann else ''))
+	def __eq__(self, other):
+		return isinstance(other, LifeRule) and self.notation == other.notation
+	def __hash__(self):
+		return hash(self.notation)
+	def __str__(self):
+		return self.notation
+	def __repr__(self):
+		return "LifeRule('" + self.notation + "')"
+	def apply(self, state, counts, out=None, indexMx=None, wordMx=None):
+		# Returns the next state for the given state and neighbor counts
+		# If out is given, with a uint8 indexMx and a uint32 wordMx of the
+		# same shape as scratch space (and uint8 counts), the lookup writes
+		# into out without allocating; every ufunc then sees a single dtype,
+		# since mixing them makes numpy allocate casting buffers
+		tiles = state.view(np.uint8) if state.dtype == bool else state.astype(np.uint8)
+		if out is None:
+			return ((self.packedTable >> (tiles * self.strideByte + counts)) & 1).astype(bool)
+		np.multiply(tiles, self.strideByte, out=indexMx)
+		np.add(indexMx, counts, out=indexMx)
+		np.copyto(wordMx, indexMx, casting='unsafe')
+		np.left_shift(self.reversedTable, wordMx, out=wordMx)
+		return np.greater_equal(wordMx, topBit, out=out)
+
+def parseRule(notation):
+	# Returns the LifeRule for B/S notation (B3/S23, B3S23, S23/B3, the old
+	# survival/birth form 23/3, with an optional V suffix) or a rule name
+	# Raises ValueError if the notation cannot be read
+	if isinstance(notation, LifeRule):
+		return notation
+	if notation is None:
+		notation = defaultRule
+	if notation in parsedRules:
+		return parsedRules[notation]
+	text = namedRules.get(notation.strip().lower(), notation).strip().upper()
+	vonNeumann = text.endswith('V')
+	if vonNeumann: text = text[:-1]
+	match = (re.fullmatch(r'B([0-8]*)/?S([0-8]*)', text) or re.fullmatch(r'S([0-8]*)/?B([0-8]*)', text)
+			or re.fullmatch(r'([0-8]*)/([0-8]*)', text))
+	if match is None:
+		raise ValueError("Unreadable rule: " + str(notation))
+	if text.startswith('B'): births, survivals = match.groups()
+	else: survivals, births = match.groups()
+	rule = LifeRule([int(count) for count in births], [int(count) for count in survivals], vonNeumann)
+	parsedRules[notation] = rule
+	return rule
+
+def ruleNotation(notation):
+	# Returns the canonical notation of a rule, eg for argparse type= checks
+	return parseRule(notation).notation
+
+def placeSeed(seed, sideLength):
+	# Builds an empty game world and applies the seed to it
+	# The game world's geography wraps around
+	# -> all starting positions are equally viable
+	# -->> start from midpoint of field for simplicity
+	state = np.zeros((sideLength, sideLength), dtype=bool)
+	xPos = int(sideLength / 2 - seed.shape[0])
+	yPos = int(sideLength / 2 - seed.shape[1])
+	rows = (np.arange(seed.shape[0]) + xPos) % sideLength
+	cols = (np.arange(seed.shape[1]) + yPos) % sideLength
+	state[np.ix_(rows, cols)] = seed
+	return state
+
+def isFullKernel(kernelMx):
+	# True for the kernel that counts all eight neighbors; the module's own
+	# list is recognized by identity, without converting anything
+	return kernelMx is fullKernel or np.array_equal(kernelMx, fullKernel)
+
+def isNeighborKernel(kernelMx):
+	# True for the 3x3 kernels of 0s and 1s that countNeighborsBatch handles
+	if kernelMx is fullKernel or kernelMx is orthoKernel: return True
+	kernelMx = np.asarray(kernelMx)
+	return kernelMx.shape == (3, 3) and bool(((kernelMx == 0) | (kernelMx == 1)).all())
+
+def addInto(outputMx, sourceMx, shiftedMx=None):
+	# Adds a (possibly strided) slice into outputMx
+	# Given a scratch shiftedMx, the slice is copied into it first: a ufunc
+	# reading a strided operand goes through a temporary buffer of numpy's
+	# own on every call, while copyto does not
+	if shiftedMx is not None:
+		np.copyto(shiftedMx, sourceMx)
+		sourceMx = shiftedMx
+	return np.add(outputMx, sourceMx, out=outputMx)
+
+def convolveInto(state, kernelMx, paddedMx, outputMx, rowsMx=None, shiftedMx=None):
+	# Allocation-free counterpart to GameOfLife.convolve for 3x3 0/1 kernels
+	# paddedMx is a uint8 scratch matrix two tiles wider and taller than the
+	# state; the neighbor counts are written into outputMx and returned
+	# Given a uint8 rowsMx as tall as the state and as wide as paddedMx, the
+	# kernel is taken to be the full one and summed separably, in five
+	# additions rather than eight
+	# Given a uint8 shiftedMx shaped like the state, the strided slices are
+	# added through it (see addInto), so that nothing is allocated at all
+	rows, cols = state.shape
+	# Copy the world into the middle of the padded buffer and wrap the edges
+	# (through a uint8 view, since a bool->uint8 cast would need a buffer)
+	state = state.view(np.uint8)
+	paddedMx[1:-1, 1:-1] = state
+	paddedMx[0, 1:-1] = state[-1]
+	paddedMx[-1, 1:-1] = state[0]
+	paddedMx[:, 0] = paddedMx[:, -2]
+	paddedMx[:, -1] = paddedMx[:, 1]
+	if rowsMx is not None:
+		# Whole rows first, since those slices are contiguous; the strided
+		# column slices then go in one at a time
+		np.add(paddedMx[:-2], paddedMx[1:-1], out=rowsMx)
+		np.add(rowsMx, paddedMx[2:], out=rowsMx)
+		np.copyto(outputMx, rowsMx[:, 1:-1])
+		np.subtract(outputMx, state, out=outputMx)
+		addInto(outputMx, rowsMx[:, :-2], shiftedMx)
+		return addInto(outputMx, rowsMx[:, 2:], shiftedMx)
+	outputMx.fill(0)
+	for dy in range(3):
+		for dx in range(3):
+			# The kernel is flipped, as in a true convolution
+			if kernelMx[2 - dy][2 - dx]:
+				addInto(outputMx, paddedMx[dy:dy + rows, dx:dx + cols], shiftedMx)
+	return outputMx
+
 class GameOfLife:
-	def __init__(self, seed, sideLength):
+	# rule: a LifeRule or its notation (see parseRule); B2/S23 by default
+	# The census is incremental: step() leaves the new population behind as a
+	# by-product, so takeCensus and calcDensity cost O(1) between steps. Only
+	# assigning a new state marks the census dirty, and the next query then
+	# recounts it once. The changed-tile count and the bounding box are worked
+	# out lazily, at most once per generation, when someone asks for them.
+	def __init__(self, seed, sideLength, rule=None):
 		# Define the internal environment variables
+		self.rule = parseRule(rule)
 		self.qtyLive = 0
 		self.qtyDead = 0
 		self.density = 0
 		self.popRatio = 0
 		self.worldSize = sideLength ** 2
-		# Build an empty game world
-		self.state = np.zeros((sideLength, sideLength), dtype=bool)
+		self.spareState = None # set up by allocateBuffers
+		self.generation = 0
+		self.previousLive = 0 # the population before the latest step
+		self.previous = None # whatever countChanged compares the state with
+		self.changedCells = None # None until counted for this generation
+		self.censusDirty = True
+		self.box = None
+		self.boxDirty = True
 		# Obtain the seed config from the input file
 		#self.initialSeed = self.readSeedFile(seedFilename)
 		self.initialSeed = seed
-		# Apply the seed to the game world
-		# The game world's geography wraps around
-		# -> all starting positions are equally viable
-		# -->> start from midpoint of field for simplicity
-		xPos = int(sideLength / 2 - self.initialSeed.shape[0])
-		yPos = int(sideLength / 2 - self.initialSeed.shape[1])
-		for yOffset in range(self.initialSeed.shape[1]):
-			for xOffset in range(self.initialSeed.shape[0]):
-				self.state[(xPos + xOffset)][(yPos + yOffset)] = self.initialSeed[xOffset][yOffset]
+		# The seed is laid out on a scratch matrix and only then assigned to
+		# self.state, so subclasses can store the world however they like
+		self.state = placeSeed(seed, sideLength)
 		self.takeCensus() # updates qtyLive, qtyDead, popRatio with init vals
+		self.previousLive = self.qtyLive
+	@classmethod
+	def validate(cls, sideLength, rule=None):
+		# Raises ValueError if the engine cannot run a world of this size
+		# under the rule, so callers can turn the combination down up front
+		# The convolve engine runs anything
+		pass
+	@property
+	def state(self):
+		return self.grid
+	@state.setter
+	def state(self, newState):
+		self.grid = newState
+		self.markDirty()
+	def markDirty(self):
+		# Called whenever the state is replaced from outside of step()
+		self.censusDirty = True
+		self.boxDirty = True
+		self.previous = None
+		self.changedCells = None
 	def displaySimpleGrid(self):
 		# Primitive method for displaying the game grid, for troubleshooting
-		for row in self.state:
-			for entry in row:
-				if entry == True: print(liveChar, end='')
-				else: print(deadChar, end='')
-			print('\n', end='')
+		# The whole grid goes out in a single write (see liveView for a
+		# viewer that keeps up with a running simulation)
+		print('\n'.join(mxToStringList(self.state)))
 	def takeCensus(self):
-		# Counts the number of live tiles in the game world and updates the
-		# population counts of both live and dead tiles
-		# Returns both values as a tuple
-		self.qtyLive = np.count_nonzero(self.state)
+		# Updates the population counts of both live and dead tiles
+		# The live tiles are only recounted if the state was replaced since
+		# the last census; after a step the count is already known
+		# Returns the ratio of live to dead tiles
+		if self.censusDirty:
+			self.qtyLive = self.countLive()
+			self.censusDirty = False
 		self.qtyDead = self.worldSize - self.qtyLive
 		if self.qtyDead: self.popRatio = self.qtyLive / self.qtyDead
 		return self.popRatio
+	def countLive(self):
+		# Scans the whole world for live tiles; engines override this with
+		# whatever count is cheapest for their storage
+		return np.count_nonzero(self.state)
 	def calcDensity(self):
 		# Calculates the density of the game world: liveTiles / totalTiles
 		self.takeCensus()
 		return self.qtyLive / self.worldSize
-	def convolve(self, kernelMx):
+	def recordStep(self, live, previous):
+		# Bookkeeping at the end of step(): live is the new population and
+		# previous is whatever countChanged needs to compare against
+		# The census must have been clean when the step began
+		self.previousLive = self.qtyLive
+		self.qtyLive = int(live)
+		self.censusDirty = False
+		self.previous = previous
+		self.changedCells = None
+		self.boxDirty = True
+		self.takeCensus()
+	def countChanged(self):
+		# Counts the tiles that differ from the previous generation
+		if self.previous is None: return 0
+		return np.count_nonzero(self.state != self.previous)
+	def stepStats(self):
+		# Returns the StepStats of the latest step
+		# Births and deaths follow from the changed tiles and the change in
+		# population, so they cost a single extra count (or none, for the
+		# engines that count changes while stepping)
+		self.takeCensus()
+		if self.changedCells is None:
+			self.changedCells = int(self.countChanged())
+		growth = self.qtyLive - self.previousLive
+		if self.previous is None and self.changedCells == 0: growth = 0
+		births = (self.changedCells + growth) // 2
+		return StepStats(self.generation, self.qtyLive, births, births - growth, self.changedCells)
+	def boundingBox(self):
+		# Returns (top, left, bottom, right) of the live cells, inclusive, or
+		# None if the world is empty; cached until the world changes
+		# Patterns that wrap around an edge of the torus span the whole axis
+		if self.boxDirty:
+			state = self.state
+			rows = np.flatnonzero(state.any(axis=1))
+			cols = np.flatnonzero(state.any(axis=0))
+			self.box = None
+			if len(rows): self.box = (int(rows[0]), int(cols[0]), int(rows[-1]), int(cols[-1]))
+			self.boxDirty = False
+		return self.box
+	def allocateBuffers(self):
+		# Preallocates everything step() needs, so that stepping no longer
+		# creates new matrices: a spare state that trades places with
+		# self.state every generation, the neighbor counts and scratch space
+		shape = np.shape(self.state)
+		self.spareState = np.zeros(shape, dtype=bool)
+		self.neighborMx = np.zeros(shape, dtype=np.uint8)
+		self.paddedMx = np.zeros((shape[0] + 2, shape[1] + 2), dtype=np.uint8)
+		self.rowsMx = np.zeros((shape[0], shape[1] + 2), dtype=np.uint8)
+		self.shiftedMx = np.zeros(shape, dtype=np.uint8)
+		# The kernel last given to convolve, and whether it is the full one,
+		# so that a step only compares the kernel by identity
+		self.lastKernel = None
+		self.lastKernelFull = False
+		self.indexMx = np.zeros(shape, dtype=np.uint8)
+		self.wordMx = np.zeros(shape, dtype=np.uint32)
+	def convolve(self, kernelMx, out=None):
 		# Applies convolution to the supplied matrices
 		# 1 For each entry in A,
 		# 2 Apply 2d convolution of K with sub-matrix centered on entry_A
 		# 3 Place result of convolution at entry_B
 		# Returns a matrix where each entry is the count of its live neighbors
-		outputMx = np.zeros(np.shape(self.state), dtype=int)
-		outputMx = scp.convolve2d(self.state, kernelMx, mode='same', boundary='wrap')
-		return outputMx
-	def applyConwayRules(self, neighborMx):
+		# If out is given (needs allocateBuffers), the counts are written there
+		if out is not None:
+			if kernelMx is not self.lastKernel:
+				self.lastKernel = kernelMx
+				self.lastKernelFull = isFullKernel(kernelMx)
+			return convolveInto(self.state, kernelMx, self.paddedMx, out, self.rowsMx if self.lastKernelFull else None, self.shiftedMx)
+		if isNeighborKernel(kernelMx):
+			return countNeighborsBatch(np.asarray(self.state, dtype=bool)[None], kernelMx)[0]
+		# Only other kernels need scipy, which takes most of a second to import
+		import scipy.signal as scp
+		return scp.convolve2d(self.state, kernelMx, mode='same', boundary='wrap')
+	def applyConwayRules(self, neighborMx, out=None):
 		# Uses the given matrix of convolution sums and the previous state
-		# Applies the Conway default ruleset (FIXME: RLE code?)
-		outputMx = np.zeros(np.shape(neighborMx), dtype=bool)
-		# Any tile with 2 OR 3 neighbors is ALIVE
-		outputMx[np.where((neighborMx == 2) & (self.state == 1))] = 1
-		outputMx[np.where((neighborMx == 3) & (self.state == 1))] = 1
-		# Any DEAD tile with 2 neighbors is ALIVE
-		outputMx[np.where((neighborMx == 2) & (self.state == 0))] = 1
-		return outputMx
+		# Applies the world's rule (B2/S23 unless another one was given) by
+		# looking every tile up in the rule's table
+		# If out is given (needs allocateBuffers), the new state is written there
+		if out is not None:
+			return self.rule.apply(self.state, neighborMx, out, self.indexMx, self.wordMx)
+		return self.rule.apply(self.state, neighborMx)
+	def step(self, kernelMx=None):
+		# Advances the world by a single generation
+		# The kernel defaults to the rule's neighborhood
+		# After allocateBuffers, the two state buffers swap roles instead
+		if kernelMx is None: kernelMx = self.rule.kernel
+		self.takeCensus()
+		previous = self.state
+		if self.spareState is None:
+			self.state = self.applyConwayRules(self.convolve(kernelMx))
+		else:
+			self.convolve(kernelMx, out=self.neighborMx)
+			self.applyConwayRules(self.neighborMx, out=self.spareState)
+			self.state, self.spareState = self.spareState, self.state
+		self.generation += 1
+		self.recordStep(np.count_nonzero(self.state), previous)
+		return self.state
+
+# Bit-packed stepping engine
+# The world is stored as rows of 64-bit words, one bit per tile, with bit j of
+# word k holding column 64k+j. Neighbor counts are built from eight shifted
+# copies of the words using a bitwise ripple adder, so every generation works
+# on 1/8th of the memory of a bool grid and never builds an int matrix.
+wordType = np.dtype('<u8')
+wordOne = np.uint64(1)
+wordTop = np.uint64(63)
+# Lookup table for counting bits when np.bitwise_count is unavailable
+popTable = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+def packRows(boolMx, wordCount):
+	# Packs each row of a bool matrix into little-endian 64-bit words
+	padded = np.zeros((boolMx.shape[0], wordCount * 64), dtype=bool)
+	padded[:, :boolMx.shape[1]] = boolMx
+	return np.packbits(padded, axis=1, bitorder='little').view(wordType)
+def unpackRows(words, width):
+	# Inverse of packRows: returns a bool matrix of the given width
+	bits = np.unpackbits(words.view(np.uint8), axis=1, count=width, bitorder='little')
+	return bits.astype(bool)
+def popCount(words):
+	# Counts the set bits across an array of packed words
+	if hasattr(np, 'bitwise_count'):
+		return int(np.bitwise_count(words).sum())
+	return int(popTable[words.view(np.uint8)].sum())
+
+class PackedGameOfLife(GameOfLife):
+	# Drop-in replacement for GameOfLife that steps a bit-packed torus
+	# The state property unpacks to (and packs from) the usual bool matrix,
+	# so convolve/applyConwayRules/displaySimpleGrid still work unchanged
+	def __init__(self, seed, sideLength, rule=None):
+		self.validate(sideLength, rule)
+		self.sideLength = sideLength
+		self.wordCount = -(-sideLength // 64)
+		# Position of the final column inside the final word
+		self.lastBit = np.uint64((sideLength - 1) % 64)
+		self.tailMask = np.uint64((1 << (int(self.lastBit) + 1)) - 1)
+		super().__init__(seed, sideLength, rule)
+	@classmethod
+	def validate(cls, sideLength, rule=None):
+		if ruleNotation(rule) != defaultRule:
+			raise ValueError("The packed engine only supports the " + defaultRule + " rule")
+	@property
+	def state(self):
+		return unpackRows(self.words, self.sideLength)
+	@state.setter
+	def state(self, newState):
+		self.words = packRows(np.asarray(newState, dtype=bool), self.wordCount)
+		self.markDirty()
+	def allocateBuffers(self):
+		# Stepping works on the packed words, so bool buffers would go unused
+		pass
+	def countLive(self):
+		# Counts bits on the packed words
+		return popCount(self.words)
+	def countChanged(self):
+		if self.previous is None: return 0
+		return popCount(self.words ^ self.previous)
+	def shiftWest(self, words):
+		# Each tile receives the value of its western neighbor (column - 1)
+		output = words << wordOne
+		output[:, 1:] |= words[:, :-1] >> wordTop
+		output[:, 0] |= (words[:, -1] >> self.lastBit) & wordOne
+		output[:, -1] &= self.tailMask
+		return output
+	def shiftEast(self, words):
+		# Each tile receives the value of its eastern neighbor (column + 1)
+		output = words >> wordOne
+		output[:, :-1] |= words[:, 1:] << wordTop
+		output[:, -1] |= (words[:, 0] & wordOne) << self.lastBit
+		return output
+	def countNeighbors(self):
+		# Sums the eight neighbor planes into bit-sliced counters
+		# Returns (s0, s1, s2, s3): the binary digits of each tile's count
+		words = self.words
+		north = np.roll(words, 1, axis=0)
+		south = np.roll(words, -1, axis=0)
+		sums = [np.zeros_like(words) for bit in range(4)]
+		carry = np.empty_like(words)
+		nextCarry = np.empty_like(words)
+		for row in (north, words, south):
+			planes = [self.shiftWest(row), self.shiftEast(row)]
+			if row is not words: planes.append(row)
+			for plane in planes:
+				# Ripple the plane through the counters; s3 only ever sees 8
+				np.bitwise_and(sums[0], plane, out=carry)
+				sums[0] ^= plane
+				for bit in (1, 2):
+					np.bitwise_and(sums[bit], carry, out=nextCarry)
+					sums[bit] ^= carry
+					carry, nextCarry = nextCarry, carry
+				sums[3] |= carry
+		return sums
+	def step(self, kernelMx=None):
+		# Advances the packed world by a single generation
+		# Only the full (Moore) kernel is supported by the adder network
+		assert kernelMx is None or isFullKernel(kernelMx), "The packed engine only supports the full kernel!"
+		self.takeCensus()
+		s0, s1, s2, s3 = self.countNeighbors()
+		# Same rules as applyConwayRules: 2 neighbors -> ALIVE,
+		# 3 neighbors -> ALIVE only if already alive
+		newWords = s1 & ~s2 & ~s3 & (~s0 | self.words)
+		newWords[:, -1] &= self.tailMask
+		previous = self.words
+		self.words = newWords
+		self.generation += 1
+		self.recordStep(popCount(newWords), previous)
+		return newWords
+
+# Batched stepping
+# A stack of N worlds is held as one (N, side, side) bool array and stepped
+# together, so a whole population costs one set of numpy calls per generation
+def padBatch(tiles):
+	# Returns the uint8 worlds with a one-tile border wrapped from the
+	# opposite edges (much quicker than np.pad's wrap mode)
+	count, sideY, sideX = tiles.shape
+	padded = np.empty((count, sideY + 2, sideX + 2), dtype=np.uint8)
+	padded[:, 1:-1, 1:-1] = tiles
+	padded[:, 0, 1:-1] = tiles[:, -1]
+	padded[:, -1, 1:-1] = tiles[:, 0]
+	padded[:, :, 0] = padded[:, :, -2]
+	padded[:, :, -1] = padded[:, :, 1]
+	return padded
+def countNeighborsBatch(states, kernelMx=fullKernel):
+	# Returns the neighbor counts of every tile in every world
+	# The worlds wrap around individually, exactly as convolve does
+	sideY, sideX = states.shape[1:]
+	tiles = states.view(np.uint8)
+	padded = padBatch(tiles)
+	if isFullKernel(kernelMx):
+		# The Moore sum is separable: three columns, then three rows, less
+		# the tile itself
+		rows = padded[:, :, :-2] + padded[:, :, 1:-1]
+		rows += padded[:, :, 2:]
+		counts = rows[:, :-2] + rows[:, 1:-1]
+		counts += rows[:, 2:]
+		counts -= tiles
+		return counts
+	counts = np.zeros(states.shape, dtype=np.uint8)
+	for dy in range(3):
+		for dx in range(3):
+			# The kernel is flipped, as in a true convolution
+			if kernelMx[2 - dy][2 - dx]:
+				counts += padded[:, dy:dy + sideY, dx:dx + sideX]
+	return counts
+def stepBatch(states, rule=None):
+	# Advances every world in the stack by a single generation
+	# Same rules as applyConwayRules, B2/S23 unless another rule is given
+	rule = parseRule(rule)
+	return rule.apply(states, countNeighborsBatch(states, rule.kernel))
+
+# Cycle detection
+# Every generation is reduced to a translation-invariant key: the live tiles
+# are rolled so the pattern starts just after the widest empty band of rows
+# and of columns, then cropped. Two generations with the same key differ only
+# by a shift around the torus, which identifies still lifes (period 1, no
+# shift), oscillators (period p, no shift) and spaceships (period p, shift).
+# When several bands are equally wide, or the live tiles reach across a
+# whole axis, the start is picked by content rather than position: first
+# by the smallest rotation of the per-row (or per-column) live counts, then
+# by the smallest packed pattern among the starts still tied. Only when
+# more than maxKeyTies starts per axis remain tied does position decide,
+# and that can only hide a cycle (a false negative), never invent one:
+# equal keys always mean equal patterns.
+maxKeyTies = 8
+
+def cyclicStarts(occupied, counts):
+	# Given a bool vector of occupied rows/cols on a torus and the live count
+	# of each, returns (candidate starts, span) for the occupied region
+	# The candidates all start just after a widest empty band (anywhere, if
+	# there is none) and share the smallest rotation of the counts
+	size = len(occupied)
+	indices = np.flatnonzero(occupied)
+	if len(indices) == 0:
+		return (np.zeros(1, dtype=np.intp), size)
+	if len(indices) == size:
+		starts, span = indices, size
+	else:
+		gaps = np.diff(np.append(indices, indices[0] + size))
+		widest = int(gaps.max())
+		starts = np.sort(indices[(np.flatnonzero(gaps == widest) + 1) % len(indices)])
+		span = size - (widest - 1)
+	# Narrow the candidates one position at a time, keeping those whose
+	# rotated counts are smallest so far; a periodic axis keeps several
+	for step in range(span):
+		if len(starts) == 1: break
+		values = counts[(starts + step) % size]
+		starts = starts[values == values.min()]
+	return (starts, span)
+def canonicalKey(state):
+	# Returns (key, (rowOffset, colOffset)) for the given world state
+	# The key is a digest of the cropped pattern, the offsets locate it
+	rowStarts, height = cyclicStarts(state.any(axis=1), np.count_nonzero(state, axis=1))
+	colStarts, width = cyclicStarts(state.any(axis=0), np.count_nonzero(state, axis=0))
+	best = None
+	for rowStart in rowStarts[:maxKeyTies]:
+		for colStart in colStarts[:maxKeyTies]:
+			rolled = np.roll(state, (-int(rowStart), -int(colStart)), axis=(0, 1))[:height, :width]
+			packed = np.packbits(rolled).tobytes()
+			if best is None or packed < best[0]: best = (packed, (int(rowStart), int(colStart)))
+	packed, offsets = best
+	digest = hashlib.blake2b(packed, digest_size=16)
+	digest.update(np.array((height, width)).tobytes())
+	return (digest.digest(), offsets)
+
+class CycleDetector:
+	# Remembers the canonical keys of recent generations in a bounded table
+	# and reports when the current generation repeats one of them
+	def __init__(self, sideLength, maxHistory=1024):
+		self.sideLength = sideLength
+		self.maxHistory = maxHistory
+		self.history = {} # key -> (generation, offsets)
+		self.order = deque()
+		self.period = 0
+		self.displacement = (0, 0)
+	def check(self, state, generation):
+		# Records the state as the given generation
+		# Returns True once a repeat is found, after which the period and
+		# displacement (rows, cols) describe the cycle
+		key, offsets = canonicalKey(state)
+		if key in self.history:
+			firstSeen, firstOffsets = self.history[key]
+			self.period = generation - firstSeen
+			self.displacement = tuple(self.wrapOffset(offsets[axis] - firstOffsets[axis]) for axis in (0, 1))
+			return True
+		self.history[key] = (generation, offsets)
+		self.order.append(key)
+		if len(self.order) > self.maxHistory:
+			del self.history[self.order.popleft()]
+		return False
+	def wrapOffset(self, offset):
+		# Maps a torus offset onto the range (-side/2, side/2]
+		offset %= self.sideLength
+		if offset > self.sideLength // 2: offset -= self.sideLength
+		return offset
+
+# Hashlife engine
+# The world is a quadtree of hash-consed nodes: every distinct square of
+# cells exists exactly once, so repeated structure (empty space above all)
+# costs nothing. Each node memoizes its RESULT, the centre half of the node
+# advanced 2^j generations, which lets the engine jump forward by powers of
+# two instead of stepping one generation at a time.
+class QuadNode:
+	# A square of 2^level x 2^level cells; leaves (level 0) are single cells
+	__slots__ = ('level', 'nw', 'ne', 'sw', 'se', 'population', 'results', 'bounds')
+	def __init__(self, level, nw, ne, sw, se, population):
+		self.level = level
+		self.nw = nw
+		self.ne = ne
+		self.sw = sw
+		self.se = se
+		self.population = population
+		self.results = {} # j -> centre node advanced 2^j generations
+		self.bounds = False # cached nodeBounds; False until computed
+
+deadLeaf = QuadNode(0, None, None, None, None, 0)
+liveLeaf = QuadNode(0, None, None, None, None, 1)
+# The hash-consing table: (nw, ne, sw, se) -> the unique node built from them
+# It is shared by every world and would otherwise only grow, so nodeResult
+# gives up on a jump once the table holds more than maxQuadNodes nodes (a few
+# hundred bytes each), and HashLife clears it and retries in shorter jumps
+quadNodes = {}
+maxQuadNodes = 1 << 19
+boundQuadNodes = True # cleared while HashLife runs a jump that cannot be split
+emptyNodes = [deadLeaf]
+
+class QuadNodesFull(Exception):
+	# Raised by nodeResult when the node table outgrows maxQuadNodes
+	pass
+
+def joinNodes(nw, ne, sw, se):
+	# Returns the unique node with the given four quadrants
+	key = (nw, ne, sw, se)
+	node = quadNodes.get(key)
+	if node is None:
+		population = nw.population + ne.population + sw.population + se.population
+		node = QuadNode(nw.level + 1, nw, ne, sw, se, population)
+		quadNodes[key] = node
+	return node
+def emptyNode(level):
+	# Returns the all-dead node of the given level
+	while len(emptyNodes) <= level:
+		smaller = emptyNodes[-1]
+		emptyNodes.append(joinNodes(smaller, smaller, smaller, smaller))
+	return emptyNodes[level]
+def clearHashLife():
+	# Drops every memoized node and result, to release their memory
+	# Nodes still held by a world stay valid: they are only no longer shared
+	# with the nodes built after this, and their results are worked out again
+	for node in quadNodes.values():
+		node.results = {}
+	quadNodes.clear()
+	del emptyNodes[1:]
+def matrixToNode(matrix, level):
+	# Builds a node of the given level from a bool matrix of side 2^level
+	if level == 0:
+		return liveLeaf if matrix[0, 0] else deadLeaf
+	if not matrix.any():
+		return emptyNode(level)
+	half = 1 << (level - 1)
+	return joinNodes(matrixToNode(matrix[:half, :half], level - 1), matrixToNode(matrix[:half, half:], level - 1),
+			matrixToNode(matrix[half:, :half], level - 1), matrixToNode(matrix[half:, half:], level - 1))
+def nodeToMatrix(node, output=None, row=0, col=0):
+	# Writes the cells of the node into a bool matrix and returns it
+	if output is None:
+		output = np.zeros((1 << node.level, 1 << node.level), dtype=bool)
+	if node.population == 0:
+		return output
+	if node.level == 0:
+		output[row, col] = True
+		return output
+	half = 1 << (node.level - 1)
+	nodeToMatrix(node.nw, output, row, col)
+	nodeToMatrix(node.ne, output, row, col + half)
+	nodeToMatrix(node.sw, output, row + half, col)
+	nodeToMatrix(node.se, output, row + half, col + half)
+	return output
+def nodeBounds(node):
+	# Returns (top, left, bottom, right) of the live cells, relative to the
+	# node's own corner and inclusive, or None if the node is empty
+	if node.bounds is not False:
+		return node.bounds
+	if node.population == 0:
+		bounds = None
+	elif node.level == 0:
+		bounds = (0, 0, 0, 0)
+	else:
+		half = 1 << (node.level - 1)
+		boxes = []
+		for child, rowOffset, colOffset in ((node.nw, 0, 0), (node.ne, 0, half), (node.sw, half, 0), (node.se, half, half)):
+			box = nodeBounds(child)
+			if box is not None:
+				boxes.append((box[0] + rowOffset, box[1] + colOffset, box[2] + rowOffset, box[3] + colOffset))
+		bounds = (min(box[0] for box in boxes), min(box[1] for box in boxes),
+				max(box[2] for box in boxes), max(box[3] for box in boxes))
+	node.bounds = bounds
+	return bounds
+def centreNode(node):
+	# Returns the node one level up with the given node in its centre
+	empty = emptyNode(node.level - 1)
+	return joinNodes(joinNodes(empty, empty, empty, node.nw), joinNodes(empty, empty, node.ne, empty),
+			joinNodes(empty, node.sw, empty, empty), joinNodes(node.se, empty, empty, empty))
+def baseResult(node):
+	# Advances the centre 2x2 of a 4x4 node by one generation
+	# Same rules as applyConwayRules: 2 neighbors -> ALIVE,
+	# 3 neighbors -> ALIVE only if already alive
+	cells = nodeToMatrix(node).astype(np.uint8)
+	quadrants = []
+	for row in (1, 2):
+		for col in (1, 2):
+			count = int(cells[row - 1:row + 2, col - 1:col + 2].sum()) - cells[row, col]
+			alive = count == 2 or (count == 3 and cells[row, col])
+			quadrants.append(liveLeaf if alive else deadLeaf)
+	return joinNodes(*quadrants)
+def nodeResult(node, j):
+	# Returns the centre half of the node advanced 2^j generations
+	# j may be at most node.level - 2
+	if j in node.results:
+		return node.results[j]
+	if boundQuadNodes and len(quadNodes) > maxQuadNodes: raise QuadNodesFull()
+	if node.population == 0:
+		result = emptyNode(node.level - 1)
+	elif node.level == 2:
+		result = baseResult(node)
+	else:
+		nw, ne, sw, se = node.nw, node.ne, node.sw, node.se
+		# The nine overlapping sub-squares, each half the size of the node
+		subSquares = [nw, joinNodes(nw.ne, ne.nw, nw.se, ne.sw), ne,
+				joinNodes(nw.sw, nw.se, sw.nw, sw.ne), joinNodes(nw.se, ne.sw, sw.ne, se.nw), joinNodes(ne.sw, ne.se, se.nw, se.ne),
+				sw, joinNodes(sw.ne, se.nw, sw.se, se.sw), se]
+		if j < node.level - 2:
+			# Each sub-square already covers the full 2^j generations, so
+			# the pieces only need to be stitched back together
+			c = [nodeResult(square, j) for square in subSquares]
+			result = joinNodes(joinNodes(c[0].se, c[1].sw, c[3].ne, c[4].nw), joinNodes(c[1].se, c[2].sw, c[4].ne, c[5].nw),
+					joinNodes(c[3].se, c[4].sw, c[6].ne, c[7].nw), joinNodes(c[4].se, c[5].sw, c[7].ne, c[8].nw))
+		else:
+			# Two half steps of 2^(j-1) generations each
+			c = [nodeResult(square, j - 1) for square in subSquares]
+			result = joinNodes(nodeResult(joinNodes(c[0], c[1], c[3], c[4]), j - 1), nodeResult(joinNodes(c[1], c[2], c[4], c[5]), j - 1),
+					nodeResult(joinNodes(c[3], c[4], c[6], c[7]), j - 1), nodeResult(joinNodes(c[4], c[5], c[7], c[8]), j - 1))
+	node.results[j] = result
+	return result
+
+class HashLife(GameOfLife):
+	# Quadtree engine that can jump ahead by any number of generations
+	# Takes the same seed matrices as GameOfLife, placed the same way
+	# toroidal=True wraps the world around like the other engines; this
+	# needs a power-of-two sideLength. toroidal=False runs on an unbounded
+	# plane, with sideLength only fixing where the seed is placed.
+	def __init__(self, seed, sideLength, toroidal=True, rule=None):
+		# The memoized results are shared by every world, so the rule is fixed
+		self.validate(sideLength, rule, toroidal)
+		self.toroidal = toroidal
+		self.generation = 0
+		# The longest jump (as a power of two) made without filling the node
+		# table; longer ones are split up front rather than tried again
+		self.jumpLimit = 64
+		super().__init__(seed, sideLength, rule)
+	@classmethod
+	def validate(cls, sideLength, rule=None, toroidal=True):
+		if ruleNotation(rule) != defaultRule:
+			raise ValueError("The hashlife engine only supports the " + defaultRule + " rule")
+		if toroidal and sideLength & (sideLength - 1):
+			raise ValueError("The toroidal hashlife world needs a power-of-two side length, not " + str(sideLength))
+	@property
+	def state(self):
+		# Materializes the world as a dense bool matrix
+		# In plane mode this covers the same sideLength square the seed was
+		# placed in; cells that have moved outside of it are not shown
+		return self.window(self.root, self.originRow, self.originCol)
+	def window(self, root, originRow, originCol):
+		# Materializes the given root node the same way the state does
+		if self.toroidal:
+			return nodeToMatrix(root)
+		side = int(np.sqrt(self.worldSize))
+		output = np.zeros((side, side), dtype=bool)
+		full = nodeToMatrix(root)
+		rowStart, colStart = -originRow, -originCol
+		rows = slice(max(rowStart, 0), max(min(rowStart + side, full.shape[0]), 0))
+		cols = slice(max(colStart, 0), max(min(colStart + side, full.shape[1]), 0))
+		output[rows.start - rowStart:rows.stop - rowStart, cols.start - colStart:cols.stop - colStart] = full[rows, cols]
+		return output
+	@state.setter
+	def state(self, newState):
+		newState = np.asarray(newState, dtype=bool)
+		side = newState.shape[0]
+		level = max(int(np.ceil(np.log2(side))), 1)
+		padded = np.zeros((1 << level, 1 << level), dtype=bool)
+		padded[:side, :side] = newState
+		self.root = matrixToNode(padded, level)
+		# The world coordinates of the root's top-left corner
+		self.originRow = 0
+		self.originCol = 0
+		self.markDirty()
+	def allocateBuffers(self):
+		# Nodes are shared and memoized, so there is nothing to preallocate
+		pass
+	def countLive(self):
+		# Read straight off the root node
+		return self.root.population
+	def countChanged(self):
+		# Compares the materialized worlds; after advance() this spans the
+		# whole jump rather than a single generation
+		if self.previous is None: return 0
+		return np.count_nonzero(self.state != self.window(*self.previous))
+	def boundingBox(self):
+		# Returns (top, left, bottom, right) of the live cells in world
+		# coordinates, inclusive, or None if the world is empty
+		box = nodeBounds(self.root)
+		if box is None: return None
+		return (box[0] + self.originRow, box[1] + self.originCol, box[2] + self.originRow, box[3] + self.originCol)
+	def step(self, kernelMx=None):
+		# Advances the world by a single generation
+		assert kernelMx is None or isFullKernel(kernelMx), "The hashlife engine only supports the full kernel!"
+		self.advance(1)
+	def advance(self, generations):
+		# Advances the world by the given number of generations, jumping
+		# ahead by a power of two for every set bit of the count
+		self.takeCensus()
+		previous = (self.root, self.originRow, self.originCol)
+		j = 0
+		while generations:
+			if generations & 1: self.jump(j)
+			generations >>= 1
+			j += 1
+		self.recordStep(self.root.population, previous)
+	def jump(self, j):
+		# Advances the world 2^j generations, keeping the node table within
+		# maxQuadNodes: if the jump fills the table, the table is cleared and
+		# the jump is made again from the current root as two half jumps
+		# A single generation is never split; it needs few nodes anyway
+		global boundQuadNodes
+		if j > self.jumpLimit:
+			self.jump(j - 1)
+			self.jump(j - 1)
+			return
+		if len(quadNodes) > maxQuadNodes: clearHashLife()
+		boundQuadNodes = j > 0
+		try:
+			if self.toroidal: self.jumpTorus(j)
+			else: self.jumpPlane(j)
+		except QuadNodesFull:
+			clearHashLife()
+			self.jumpLimit = j - 1
+			self.jump(j - 1)
+			self.jump(j - 1)
+			return
+		finally:
+			boundQuadNodes = True
+		self.generation += 1 << j
+	def advanceTo(self, generation):
+		# Advances the world to the given (later) generation
+		assert generation >= self.generation, "Hashlife cannot run backwards!"
+		self.advance(generation - self.generation)
+	def jumpTorus(self, j):
+		# Advances the wrapped world 2^j generations
+		# The torus is equivalent to an infinite plane tiled with copies of
+		# itself, so the root is tiled until its RESULT can span 2^j steps
+		level = self.root.level
+		tiles = max(1, j - level + 2)
+		tiled = self.root
+		for copy in range(tiles):
+			tiled = joinNodes(tiled, tiled, tiled, tiled)
+		result = nodeResult(tiled, j)
+		for copy in range(tiles - 1):
+			result = result.nw
+		if tiles == 1:
+			# The RESULT was offset by half a world: swap the quadrants back
+			result = joinNodes(result.se, result.sw, result.ne, result.nw)
+		self.root = result
+	def jumpPlane(self, j):
+		# Advances the unbounded world 2^j generations
+		# The root is padded until the live cells sit far enough inside its
+		# RESULT region that nothing can cross the edge in 2^j steps
+		while not self.fitsForJump(j):
+			half = 1 << (self.root.level - 1)
+			self.root = centreNode(self.root)
+			self.originRow -= half
+			self.originCol -= half
+		quarter = 1 << (self.root.level - 2)
+		self.root = nodeResult(self.root, j)
+		self.originRow += quarter
+		self.originCol += quarter
+	def fitsForJump(self, j):
+		# Checks that the root is big enough to advance 2^j generations
+		level = self.root.level
+		if level < j + 2 or level < 3: return False
+		box = nodeBounds(self.root)
+		if box is None: return True
+		quarter = 1 << (level - 2)
+		low = quarter + (1 << j)
+		high = 3 * quarter - (1 << j) - 1
+		return min(box[0], box[1]) >= low and max(box[2], box[3]) <= high
+
+# Active-tile stepping
+# The world is split into square tiles and only the tiles that hold live
+# cells, or touch one that does, are stepped; every other tile is empty and
+# stays empty. Each active tile is gathered with a one-cell halo, so the
+# work per generation follows the population rather than the world's area.
+class TiledGameOfLife(GameOfLife):
+	# Drop-in replacement for GameOfLife that only steps the active tiles
+	# When the tile size does not divide the side length, the last row and
+	# column of tiles are ragged: they hold the leftover cells, and the cells
+	# their blocks reach past the world's edge are wrapped round for the halo
+	# but never written back
+	# NOTE: assign a whole new matrix to state rather than editing it in
+	# place, since the assignment is what refreshes the tile bookkeeping
+	def __init__(self, seed, sideLength, tileSize=32, rule=None):
+		self.sideLength = sideLength
+		self.tileSize = min(sideLength, tileSize)
+		self.tileCount = -(-sideLength // self.tileSize)
+		self.ragged = sideLength % self.tileSize != 0
+		# Row/col offsets of a tile plus its halo, relative to the tile corner
+		self.haloOffsets = np.arange(-1, self.tileSize + 1)
+		self.validate(sideLength, rule)
+		super().__init__(seed, sideLength, rule)
+	@classmethod
+	def validate(cls, sideLength, rule=None):
+		# With B0 an empty tile comes to life, so every tile would be active
+		if 0 in parseRule(rule).births:
+			raise ValueError("The tiled engine cannot run B0 rules")
+	@property
+	def state(self):
+		return self.world
+	@state.setter
+	def state(self, newState):
+		self.world = np.array(newState, dtype=bool)
+		padded = self.world
+		if self.ragged:
+			paddedSide = self.tileCount * self.tileSize
+			padded = np.zeros((paddedSide, paddedSide), dtype=bool)
+			padded[:self.sideLength, :self.sideLength] = self.world
+		tiles = padded.reshape(self.tileCount, self.tileSize, self.tileCount, self.tileSize)
+		self.tilePopulation = np.count_nonzero(tiles, axis=(1, 3))
+		self.markDirty()
+	def activeTiles(self):
+		# Returns a bool grid of the tiles that need stepping: the live tiles
+		# and their eight (wrapped) neighbors
+		live = self.tilePopulation > 0
+		active = live.copy()
+		for rowShift in (-1, 0, 1):
+			for colShift in (-1, 0, 1):
+				if rowShift or colShift:
+					active |= np.roll(live, (rowShift, colShift), axis=(0, 1))
+		return active
+	def allocateBuffers(self):
+		# Tiles are stepped in place, so there is nothing to preallocate
+		pass
+	def countLive(self):
+		# Summed from the per-tile counts
+		return int(self.tilePopulation.sum())
+	def step(self, kernelMx=None):
+		# Advances the active tiles by a single generation
+		# The world is updated in place, so the changed tiles are counted
+		# here, on the active blocks, rather than left to countChanged
+		if kernelMx is None: kernelMx = self.rule.kernel
+		self.takeCensus()
+		self.generation += 1
+		active = np.argwhere(self.activeTiles())
+		if len(active) == 0:
+			self.recordStep(0, None)
+			self.changedCells = 0
+			return self.world
+		size = self.tileSize
+		rows = (active[:, 0, None] * size + self.haloOffsets) % self.sideLength
+		cols = (active[:, 1, None] * size + self.haloOffsets) % self.sideLength
+		# (K, size + 2, size + 2): every active tile with its halo
+		blocks = self.world[rows[:, :, None], cols[:, None, :]].view(np.uint8)
+		counts = np.zeros((len(active), size, size), dtype=np.uint8)
+		for dy in range(3):
+			for dx in range(3):
+				# The kernel is flipped, as in a true convolution
+				if kernelMx[2 - dy][2 - dx]:
+					counts += blocks[:, dy:dy + size, dx:dx + size]
+		# Same rules as applyConwayRules
+		oldBlocks = blocks[:, 1:-1, 1:-1].astype(bool)
+		newBlocks = self.rule.apply(oldBlocks, counts)
+		# All reads went into blocks, so the world can be updated in place
+		if self.ragged:
+			# Drop the cells of ragged tiles that lie past the world's edge
+			inside = np.arange(size) < self.sideLength - active[:, :, None] * size
+			valid = inside[:, 0, :, None] & inside[:, 1, None, :]
+			newBlocks &= valid
+			oldBlocks &= valid
+			blockRows = np.broadcast_to(rows[:, 1:-1, None], valid.shape)[valid]
+			blockCols = np.broadcast_to(cols[:, None, 1:-1], valid.shape)[valid]
+			self.world[blockRows, blockCols] = newBlocks[valid]
+		else:
+			self.world[rows[:, 1:-1, None], cols[:, None, 1:-1]] = newBlocks
+		self.tilePopulation[active[:, 0], active[:, 1]] = np.count_nonzero(newBlocks, axis=(1, 2))
+		self.recordStep(self.tilePopulation.sum(), None)
+		self.changedCells = np.count_nonzero(newBlocks != oldBlocks)
+		return self.world
+
+# Fused stepping
+# One pass over the world computes the next generation into a preallocated
+# second buffer together with the live count and the number of changed
+# tiles, so takeCensus never has to rescan the grid. The kernel is compiled
+# with Numba when it is installed and useNumba is set; otherwise a numpy
+# fallback does the same work through preallocated buffers.
+useNumba = True # feature flag: set to False to force the numpy fallback
+fusedKernels = {} # 'numba' -> the compiled kernel, once it has been built
+
+numbaRange = range # swapped for numba.prange before compiling
+
+def fusedStepKernel(source, target):
+	# Writes the next generation of source into target (both uint8 views)
+	# Returns (live tiles, changed tiles) of the new generation
+	rows, cols = source.shape
+	live = 0
+	changed = 0
+	for row in numbaRange(rows):
+		above = source[row - 1]
+		middle = source[row]
+		below = source[row + 1 if row + 1 < rows else 0]
+		output = target[row]
+		# Running column sums: the neighborhood of col is the sum of the
+		# three columns around it, minus the tile itself
+		previous = above[cols - 1] + middle[cols - 1] + below[cols - 1]
+		current = above[0] + middle[0] + below[0]
+		for col in range(cols):
+			right = col + 1 if col + 1 < cols else 0
+			following = above[right] + middle[right] + below[right]
+			tile = middle[col]
+			count = previous + current + following - tile
+			# Same rules as applyConwayRules: 2 neighbors -> ALIVE,
+			# 3 neighbors -> ALIVE only if already alive
+			alive = (count == 2) | ((count == 3) & (tile == 1))
+			output[col] = alive
+			live += alive
+			changed += alive ^ tile
+			previous = current
+			current = following
+	return live, changed
+
+def loadFusedKernel():
+	# Returns the compiled kernel, or None if Numba is off or unavailable
+	if not useNumba:
+		return None
+	if 'numba' not in fusedKernels:
+		try:
+			import numba
+		except ImportError:
+			fusedKernels['numba'] = None
+		else:
+			# prange splits the rows across threads; live/changed reduce
+			global numbaRange
+			numbaRange = numba.prange
+			fusedKernels['numba'] = numba.njit(parallel=True, cache=True)(fusedStepKernel)
+	return fusedKernels['numba']
+
+class FusedGameOfLife(GameOfLife):
+	# Drop-in replacement for GameOfLife with a fused, double-buffered step
+	# After every step, qtyLive and changedCells are already up to date
+	def __init__(self, seed, sideLength, rule=None):
+		self.validate(sideLength, rule)
+		self.buffers = [np.zeros((sideLength, sideLength), dtype=bool) for index in range(2)]
+		self.current = 0
+		self.kernel = loadFusedKernel()
+		if self.kernel is None:
+			# Scratch space for the numpy fallback
+			self.padded = np.zeros((sideLength + 2, sideLength + 2), dtype=np.uint8)
+			self.counts = np.zeros((sideLength, sideLength), dtype=np.uint8)
+			self.scratch = np.zeros((sideLength, sideLength), dtype=bool)
+			self.shifted = np.zeros((sideLength, sideLength), dtype=np.uint8)
+		super().__init__(seed, sideLength, rule)
+	@classmethod
+	def validate(cls, sideLength, rule=None):
+		if ruleNotation(rule) != defaultRule:
+			raise ValueError("The fused engine only supports the " + defaultRule + " rule")
+	@property
+	def state(self):
+		return self.buffers[self.current]
+	@state.setter
+	def state(self, newState):
+		np.copyto(self.buffers[self.current], newState, casting='unsafe')
+		self.markDirty()
+	def allocateBuffers(self):
+		# Both state buffers and the scratch space are allocated up front
+		pass
+	def step(self, kernelMx=None):
+		# Advances the world a generation, swapping the two buffers
+		assert kernelMx is None or isFullKernel(kernelMx), "The fused engine only supports the full kernel!"
+		self.takeCensus()
+		source = self.buffers[self.current]
+		target = self.buffers[1 - self.current]
+		if self.kernel is not None:
+			live, changed = self.kernel(source.view(np.uint8), target.view(np.uint8))
+		else:
+			live, changed = self.numpyStep(source, target)
+		self.current = 1 - self.current
+		self.generation += 1
+		self.recordStep(live, None)
+		self.changedCells = int(changed)
+		return target
+	def numpyStep(self, source, target):
+		# Fallback for fusedStepKernel that avoids any new allocations
+		padded, counts, scratch = self.padded, self.counts, self.scratch
+		convolveInto(source, fullKernel, padded, counts, shiftedMx=self.shifted)
+		np.equal(counts, 2, out=target)
+		np.equal(counts, 3, out=scratch)
+		scratch &= source
+		target |= scratch
+		np.not_equal(target, source, out=scratch)
+		return np.count_nonzero(target), np.count_nonzero(scratch)
+
+# The available stepping backends, by name
+engines = {
+	'convolve': GameOfLife,
+	'packed': PackedGameOfLife,
+	'hashlife': HashLife,
+	'tiled': TiledGameOfLife,
+	'fused': FusedGameOfLife,
+}
 
 # EOF
@@ -10,47 +10,82 @@
 # EXTERNALIA
 import argparse
 import math
+import multiprocessing
 import random as rng
 import numpy as np
 import seedTester as st
+import gameUtils
+import fitnessCache
+import instrument
+import patternIO
+import seedCorpus
+import checkpoint
 
 # FIXME: hardcoded values are here for debugging purposes
 seedWidth = 4
 geneSize = seedWidth ** 2
 mutationRate = 100
 fileFlag = False # set this to True to write output seeds to files
+haltMode = 'stability' # how runSimulation decides a seed has settled
+lifeRule = gameUtils.defaultRule # the B/S rule seeds are simulated under
+simPool = None # the st.SimulationPool used for fitness runs, if any
+fitnessMemo = None # the fitnessCache.FitnessCache in front of fitness(), if any
 
 # PRIMITIVES
-def randomGene(length):
-	# Creates a random gene string of binary digits of the given length
-	newGene = ''
-	for index in range(length):
-		newGene += str(rng.randint(0, 1))
-	return newGene
-
-def randomPopnStrings(geneSize, popSize):
-	# Creates and returns a set of candidate genes from the givens
-	# - give each one a random solution string
-	# - generate the fitness value of the child
-	genPop = list();
-	for index in range(popSize):
-		newGene = randomGene(geneSize)
-		genPop.append((newGene, fitness(newGene)))
-	return genPop
-
+# The population is kept as a (popSize, geneSize) bool matrix with one gene
+# per row, so that every operator below works on a whole generation at once
 def randomPopnMatrix(geneSize, popSize):
 	# Creates and returns a NumPy matrix containing the set of genes
-	genPop = np.zeros((popSize, geneSize))
-	for i in range(popSize):
-		for j in range(geneSize):
-			genPop[i, j] = rng.randint(0, 1)
-	return genPop
+	return np.random.randint(0, 2, size=(popSize, geneSize)).astype(bool)
+
+def geneToStr(gene):
+	# Returns the binary string form of a gene row
+	return ''.join('1' if bit else '0' for bit in gene)
+
+def strToGene(geneStr):
+	# Returns the gene row for a binary gene string
+	return np.array([bit == '1' for bit in geneStr], dtype=bool)
 
 def fitness(gene):
 	# Calculates the fitness of a genetic seed by running it through the tester
 	# Obtain the raw performance data: (live tiles, world size), [stability rates]
 	# Note that len(stability rates) == total convolutions of simulation
-	fitnessData = st.runSimulation(st.strToSeed(gene, seedWidth))
+	return fitnessBatch([gene])[0]
+
+def fitnessBatch(genes):
+	# Calculates the fitness of every gene string in the list with one
+	# batched simulation run; returns the fitness values in the same order
+	return fitnessMatrix(np.array([strToGene(gene) for gene in genes]).reshape(len(genes), -1))
+
+def fitnessMatrix(genes):
+	# Calculates the fitness of every row of a gene matrix
+	# Genes already known to the fitness cache skip the simulator entirely
+	seeds = list(genes.reshape(len(genes), seedWidth, seedWidth))
+	if fitnessMemo is None: return simulateSeeds(seeds)
+	return fitnessMemo.lookupMany(seeds, simulateSeeds)
+
+def fitnessArrays(genes):
+	# Returns the fitness of a gene matrix as (stability, duration) arrays
+	values = fitnessMatrix(genes)
+	stability = np.array([value[0] for value in values], dtype=float)
+	duration = np.array([value[1] for value in values], dtype=int)
+	return (stability, duration)
+
+def rankPopulation(stability, duration):
+	# Returns the population indices from most to least fit
+	# Higher stability ranks first, with longer durations breaking ties
+	return np.lexsort((duration, stability))[::-1]
+
+def simulateSeeds(seeds):
+	# Runs the given seed matrices through the simulator and scores them
+	if simPool is None:
+		results = st.runSimulationBatch(seeds, haltMode=haltMode, rule=lifeRule)
+	else:
+		results = simPool.evaluate(seeds, haltMode=haltMode, rule=lifeRule)
+	return [scoreSimulation(fitnessData) for fitnessData in results]
+
+def scoreSimulation(fitnessData):
+	# Turns the raw output of runSimulation into a (stability, duration) pair
 	# We choose to define a "fit" gene as one that is stable:
 	# - it should not over/underpopulate, but should settle at some nonzero
 	# population count, ie the average density does not fluctuate (much)
@@ -60,36 +95,152 @@ def fitness(gene):
 	duration = len(fitnessData[1])
 	return ((density / duration), duration)
 
-def propagate(foo, bar):
-	# Performs a propagation operation on the two given GameStates
-	# Returns the created child GameStates as a tuple of States
-	geneLength = len(foo)
-	assert len(foo) == len(bar), "Gene length mismatch!"
-	crossover = rng.randint(0, geneLength - 1)
-	#print("1: ", foo, " + 2: ", bar, " @", crossover) # DEBUG
-	firstChild = ''
-	secondChild = ''
-	for i in range(geneLength):
-		if i < crossover:
-			firstChild += foo[i]
-			secondChild += bar[i]
-		else:
-			firstChild += bar[i]
-			secondChild += foo[i]
-	#print("N1:", firstChild) # DEBUG
-	#print("N2:", secondChild) # DEBUG
-	return (firstChild, secondChild)
-
-def mutate(subject):
-	# Performs a requested mutation on a randomly chosen gene of the subject
-	#print("Mutating", subject) # DEBUG
-	genePosition = rng.randint(0, len(subject) - 1)
-	if subject[genePosition] == '0':
-		subject = subject[:genePosition] + '1' + subject[genePosition+1:]
+# OPERATORS
+def rouletteSelect(weights, count):
+	# Picks count indices with probability proportional to their weights
+	# All picks are made at once by searching the cumulative weights
+	weights = np.asarray(weights, dtype=float)
+	total = weights.sum()
+	if total <= 0: return np.random.randint(0, len(weights), size=count)
+	cumulative = np.cumsum(weights)
+	picks = np.searchsorted(cumulative, np.random.random(count) * total)
+	return np.minimum(picks, len(weights) - 1)
+
+def selectPairs(weights, count):
+	# Picks count pairs of distinct parents in proportion to their weights
+	# The second parent is drawn with the first one's weight taken out, so no
+	# redraws are needed
+	weights = np.asarray(weights, dtype=float)
+	if weights.sum() <= 0: weights = np.ones(len(weights))
+	first = rouletteSelect(weights, count)
+	cumulative = np.cumsum(weights)
+	remaining = cumulative[-1] - weights[first]
+	draws = np.random.random(count) * remaining
+	second = np.searchsorted(cumulative, draws)
+	# Past the first parent, the cumulative weights all include its weight
+	past = second >= first
+	second[past] = np.searchsorted(cumulative, draws[past] + weights[first[past]])
+	second = np.minimum(second, len(weights) - 1)
+	# Only reachable when the weights are all zero or rounding lands on it
+	clash = second == first
+	second[clash] = (first[clash] + 1 + np.random.randint(0, len(weights) - 1, size=clash.sum())) % len(weights)
+	return (first, second)
+
+def propagate(firstParents, secondParents):
+	# Performs single-point crossover on two matrices of parent genes
+	# Row i of each produces the i-th pair of children
+	# Returns the created children as a tuple of gene matrices
+	count, geneLength = firstParents.shape
+	assert firstParents.shape == secondParents.shape, "Gene length mismatch!"
+	crossover = np.random.randint(0, geneLength, size=count)
+	# Each child takes its own parent's genes before the crossover point
+	fromOwn = np.arange(geneLength) < crossover[:, None]
+	return (np.where(fromOwn, firstParents, secondParents), np.where(fromOwn, secondParents, firstParents))
+
+def propagateUniform(firstParents, secondParents, swapRate=0.5):
+	# Performs uniform crossover: every gene position is swapped between the
+	# two children independently, with the given probability
+	assert firstParents.shape == secondParents.shape, "Gene length mismatch!"
+	fromOwn = np.random.random(firstParents.shape) >= swapRate
+	return (np.where(fromOwn, firstParents, secondParents), np.where(fromOwn, secondParents, firstParents))
+
+def mutate(genes, rate):
+	# Flips one randomly chosen gene in each row, for rate% of the rows
+	# Returns the mutated copy; the input matrix is left unchanged
+	genes = genes.copy()
+	rows = np.flatnonzero(np.random.randint(0, 101, size=len(genes)) < rate)
+	positions = np.random.randint(0, genes.shape[1], size=len(rows))
+	genes[rows, positions] ^= True
+	return genes
+
+def mutateBits(genes, bitRate):
+	# Flips every gene independently with the given probability
+	return genes ^ (np.random.random(genes.shape) < bitRate)
+
+def susSelect(weights, count):
+	# Stochastic universal sampling: count evenly spaced pointers with one
+	# random offset, so every index is picked close to its expected number
+	# of times. The picks are shuffled so that pairing them up is random
+	weights = np.asarray(weights, dtype=float)
+	total = weights.sum()
+	if total <= 0: return np.random.randint(0, len(weights), size=count)
+	pointers = (np.random.random() + np.arange(count)) * (total / count)
+	picks = np.minimum(np.searchsorted(np.cumsum(weights), pointers), len(weights) - 1)
+	return np.random.permutation(picks)
+
+def tournamentSelect(popSize, count, size=3):
+	# Tournament selection on a population sorted from most to least fit:
+	# each pick is the fittest of size random entrants, ie the lowest index
+	return np.random.randint(0, popSize, size=(count, size)).min(axis=1)
+
+def selectParents(method, stability, poolSize, pairs, tournamentSize=3):
+	# Picks the parent pairs for a generation from a population sorted from
+	# most to least fit; returns (first parent indices, second parent indices)
+	# Roulette and SUS draw from the fittest poolSize entries by stability,
+	# while tournaments are held across the whole population
+	if method == 'roulette':
+		return selectPairs(stability[:poolSize], pairs)
+	if method == 'sus':
+		picks = susSelect(stability[:poolSize], pairs * 2)
 	else:
-		subject = subject[:genePosition] + '0' + subject[genePosition+1:]
-	#print("! Mutated", subject, "@", genePosition) # DEBUG
-	return subject
+		picks = tournamentSelect(len(stability), pairs * 2, tournamentSize)
+	return (picks[:pairs], picks[pairs:])
+
+selections = ('roulette', 'sus', 'tournament')
+
+crossovers = {
+	'single': propagate,
+	'uniform': propagateUniform,
+}
+
+# GENERATIONS
+def generationPlan(populationSize, elite=None):
+	# Works out the sizes used by every generation of a population
+	# Returns (parent pool size, elite size, parent pairs per generation)
+	# Determine how many parents will be in the propagation pool
+	# Always produce a whole integer
+	parentPoolSize = math.floor(populationSize / 2)
+	# Round down to nearest even value if needed
+	if parentPoolSize % 2 == 1:
+		parentPoolSize -= 1
+	parentPoolSize = max(parentPoolSize, 2)
+	# Each generation the elite parents and the children compete for the
+	# populationSize places; enough children are made to fill the places
+	eliteSize = populationSize if elite is None else min(elite, populationSize)
+	pairCount = -(-max(parentPoolSize, populationSize - eliteSize) // 2)
+	return (parentPoolSize, eliteSize, pairCount)
+
+def evolveGeneration(genes, stability, duration, plan, argVals):
+	# Runs one generation: selection, crossover, mutation and truncation
+	# plan comes from generationPlan; argVals holds the operator settings
+	# Returns the next (genes, stability, duration), fittest first
+	parentPoolSize, eliteSize, pairCount = plan
+	populationSize = len(genes)
+	# Sort the population in descending order by their fitness rating
+	order = rankPopulation(stability, duration)
+	genes, stability, duration = genes[order], stability[order], duration[order]
+	# Pick the parent pairs, each pair producing two children
+	firstParents, secondParents = selectParents(argVals.selection, stability, parentPoolSize, pairCount, argVals.tournament)
+	firstKids, secondKids = crossovers[argVals.crossover](genes[firstParents], genes[secondParents])
+	# Check to see if any of the children genes mutate
+	children = mutate(np.concatenate([firstKids, secondKids]), mutationRate)
+	if argVals.bitRate > 0: children = mutateBits(children, argVals.bitRate)
+	# The children are evaluated together in one batch
+	childStability, childDuration = fitnessArrays(children)
+	# Truncate the elite parents plus the children back down to size
+	genes = np.concatenate([genes[:eliteSize], children])
+	stability = np.concatenate([stability[:eliteSize], childStability])
+	duration = np.concatenate([duration[:eliteSize], childDuration])
+	survivors = rankPopulation(stability, duration)[:populationSize]
+	return (genes[survivors], stability[survivors], duration[survivors])
+
+def trackProgress(progress, best, minDelta):
+	# Updates the convergence bookkeeping with a generation's best stability
+	if progress['bestStability'] is None or best > progress['bestStability'] + minDelta:
+		progress['bestStability'] = best
+		progress['stale'] = 0
+	else:
+		progress['stale'] += 1
 
 def printAsSeed(seedStr, width, liveChar='O', deadChar='.'):
 	# Displays the given seed string as a formatted GoL seed
@@ -111,134 +262,260 @@ def printAsSeed(seedStr, width, liveChar='O', deadChar='.'):
 def saveToPlaintext(target, width, filename=''):
 	# Saves the given seed as a Plaintext file
 	# If a filename is not specified, then will be saved with timestamp
-	#print("T:", target) # DEBUG
-	import hashlib
-	seedhash = hashlib.md5(target[0].encode('utf-8')).hexdigest()
-	import time
-	datestamp = time.strftime("%Y%m%d")
-	timestamp = time.strftime("%H%M%S")
-	if filename == '':
-		filename = datestamp + '-' + timestamp + '_' + 'Gseed-' + seedhash[:8] + '.txt'
-	#print(filename)
-	newFile = open("outputs/" + filename, "w")
-	newFile.write("! seed: " + seedhash + '\n')
-	newFile.write("! This seed was created with geneticGenerator.py\n")
-	newFile.write("! Generated on " + time.strftime("%c") + " at " + time.strftime("%X") + '\n')
-	newFile.write("! Runtime: " + str(target[1][1]) + " iterations\n")
-	newFile.write("! Stability (density/time): " + str(target[1][0]) + '\n')
-	col = 0
-	for entry in target[0]:
-		newFile.write(entry)
-		col += 1
-		if col == width:
-			col = 0
-			newFile.write('\n')
-	newFile.close()
+	seed = st.strToSeed(target[0], width).astype(bool)
+	patternIO.saveGeneratedSeed(seed, target[1], "geneticGenerator.py", 'Gseed', filename=filename)
+
+# CHECKPOINTS
+def saveState(folder, generation, genes, stability, duration, progress=None):
+	# Checkpoints the population (with its fitness values) after a generation
+	# progress holds the convergence bookkeeping, so a resumed run stops when
+	# the original would have
+	# The fitness cache's counters are saved too, so the resumed run carries
+	# on counting from them; its entries are not (see FitnessCache.getState)
+	arrays = {'genes': genes, 'stability': stability, 'duration': duration}
+	if fitnessMemo is not None: arrays.update(fitnessMemo.getState())
+	checkpoint.saveCheckpoint(folder, 'geneticGenerator', generation, arrays, dict(progress or {}, seedWidth=seedWidth))
+
+def loadState(folder):
+	# Restores the last checkpoint in the folder
+	# Returns (generations completed, genes, stability, duration, progress),
+	# or None if there is none
+	state = checkpoint.loadCheckpoint(folder, 'geneticGenerator')
+	if state is None: return None
+	generation, arrays, values = state
+	assert values['seedWidth'] == seedWidth, "The checkpoint was made with a different seed width!"
+	progress = {key: values[key] for key in ('bestStability', 'stale') if key in values}
+	if fitnessMemo is not None: fitnessMemo.setState(arrays)
+	return (generation, arrays['genes'].astype(bool), arrays['stability'], arrays['duration'], progress)
+
+# ISLANDS
+# In the island model every island is a separate population evolving in its
+# own process. Every few generations (an epoch) each island sends copies of
+# its fittest entries to its neighbours in the migration topology, where
+# they replace the least fit entries. The islands search independently in
+# between, which keeps the overall population more diverse.
+def migrationTargets(topology, islandCount, shuffle):
+	# Returns, for every island, the list of islands its migrants go to
+	# shuffle: a permutation of the islands, used by the 'random' topology
+	if islandCount < 2: return [[] for island in range(islandCount)]
+	if topology == 'ring':
+		return [[(island + 1) % islandCount] for island in range(islandCount)]
+	if topology == 'full':
+		return [[other for other in range(islandCount) if other != island] for island in range(islandCount)]
+	# 'random': a ring over a freshly shuffled order of the islands
+	targets = [[] for island in range(islandCount)]
+	for position, island in enumerate(shuffle):
+		targets[island].append(shuffle[(position + 1) % islandCount])
+	return targets
+
+topologies = ('ring', 'full', 'random')
+
+def receiveMigrants(genes, stability, duration, migrants):
+	# Replaces the least fit entries with the incoming migrants
+	# Returns the population, fittest first
+	order = rankPopulation(stability, duration)
+	genes, stability, duration = genes[order], stability[order], duration[order]
+	incoming = [arrays for arrays in migrants if len(arrays[0])]
+	if not incoming: return (genes, stability, duration)
+	newGenes = np.concatenate([arrays[0] for arrays in incoming])
+	newStability = np.concatenate([arrays[1] for arrays in incoming])
+	newDuration = np.concatenate([arrays[2] for arrays in incoming])
+	# Never replace more than half of the island
+	count = min(len(newGenes), len(genes) // 2)
+	keep = len(genes) - count
+	genes = np.concatenate([genes[:keep], newGenes[:count]])
+	stability = np.concatenate([stability[:keep], newStability[:count]])
+	duration = np.concatenate([duration[:keep], newDuration[:count]])
+	order = rankPopulation(stability, duration)
+	return (genes[order], stability[order], duration[order])
+
+def runIsland(island, argVals, connection):
+	# The body of one island's process
+	# Waits for ('evolve', generations, migrants) messages, answering each
+	# with its own migrants and best stability, until ('finish',) arrives,
+	# which it answers with its whole population and cache counters
+	global haltMode, lifeRule, simPool, fitnessMemo
+	haltMode = argVals.halt
+	lifeRule = argVals.rule
+	simPool = None
+	fitnessMemo = fitnessCache.FitnessCache(path=argVals.cache, namespace=fitnessCache.namespaceFor(sideLength=10, maxDuration=1000, haltMode=haltMode, rule=lifeRule))
+	if argVals.seed is not None:
+		rng.seed(argVals.seed + island)
+		np.random.seed(argVals.seed + island)
+	genes = randomPopnMatrix(geneSize, argVals.population)
+	stability, duration = fitnessArrays(genes)
+	plan = generationPlan(len(genes), argVals.elite)
+	while True:
+		message = connection.recv()
+		if message[0] == 'finish':
+			connection.send((genes, stability, duration, fitnessMemo.hits, fitnessMemo.diskHits, fitnessMemo.misses))
+			fitnessMemo.close()
+			break
+		generations, migrants = message[1], message[2]
+		genes, stability, duration = receiveMigrants(genes, stability, duration, migrants)
+		for generation in range(generations):
+			genes, stability, duration = evolveGeneration(genes, stability, duration, plan, argVals)
+		count = argVals.migrants
+		connection.send(((genes[:count], stability[:count], duration[:count]), float(stability.max())))
+	connection.close()
+
+def runIslands(argVals):
+	# Evolves argVals.islands populations in parallel, migrating between them
+	# every argVals.epoch generations
+	# Returns (genes, stability, duration, generations run) for all islands
+	# together
+	context = multiprocessing.get_context()
+	connections = []
+	processes = []
+	for island in range(argVals.islands):
+		parentEnd, childEnd = context.Pipe()
+		process = context.Process(target=runIsland, args=(island, argVals, childEnd), daemon=True)
+		process.start()
+		connections.append(parentEnd)
+		processes.append(process)
+	topologyRng = np.random.default_rng(argVals.seed)
+	inbox = [[] for island in range(argVals.islands)]
+	progress = {'bestStability': None, 'stale': 0}
+	generation = 0
+	while generation < argVals.generations:
+		if argVals.patience and progress['stale'] >= argVals.patience:
+			print("Converged: no improvement in", progress['stale'], "generations")
+			break
+		epoch = min(argVals.epoch, argVals.generations - generation)
+		for island, connection in enumerate(connections):
+			connection.send(('evolve', epoch, inbox[island]))
+		replies = [connection.recv() for connection in connections]
+		generation += epoch
+		# Convergence is judged on the best island, once per epoch
+		trackProgress(progress, max(reply[1] for reply in replies), argVals.minDelta)
+		if progress['stale']: progress['stale'] += epoch - 1
+		targets = migrationTargets(argVals.topology, argVals.islands, topologyRng.permutation(argVals.islands))
+		inbox = [[] for island in range(argVals.islands)]
+		for island, reply in enumerate(replies):
+			for target in targets[island]:
+				inbox[target].append(reply[0])
+	results = []
+	for connection in connections:
+		connection.send(('finish',))
+		results.append(connection.recv())
+	for process in processes:
+		process.join()
+	fitnessMemo.hits += sum(result[3] for result in results)
+	fitnessMemo.diskHits += sum(result[4] for result in results)
+	fitnessMemo.misses += sum(result[5] for result in results)
+	genes = np.concatenate([result[0] for result in results])
+	stability = np.concatenate([result[1] for result in results])
+	duration = np.concatenate([result[2] for result in results])
+	return (genes, stability, duration, generation)
+
+def runPopulation(argVals):
+	# Evolves a single population in this process, with checkpointing
+	# Returns (genes, stability, duration, generations run)
+	startGeneration = 0
+	progress = {'bestStability': None, 'stale': 0}
+	state = None
+	if argVals.resume:
+		assert argVals.checkpoint is not None, "--resume needs a --checkpoint folder to resume from!"
+		state = loadState(argVals.checkpoint)
+		if state is None: print("No checkpoint found in", argVals.checkpoint, "- starting afresh")
+	if state is not None:
+		startGeneration, genes, stability, duration, savedProgress = state
+		progress.update(savedProgress)
+		print("Resuming from generation", startGeneration, "of", argVals.checkpoint)
+	else:
+		genes = randomPopnMatrix(geneSize, argVals.population)
+		stability, duration = fitnessArrays(genes)
+		if argVals.checkpoint is not None: saveState(argVals.checkpoint, 0, genes, stability, duration, progress)
+	plan = generationPlan(len(genes), argVals.elite)
+	generation = startGeneration
+	# *** GENERATIONAL LOOP STARTS HERE
+	while generation < argVals.generations:
+		if argVals.patience and progress['stale'] >= argVals.patience:
+			print("Converged: no improvement in", progress['stale'], "generations")
+			break
+		genes, stability, duration = evolveGeneration(genes, stability, duration, plan, argVals)
+		generation += 1
+		# Track the best stability for the convergence check
+		trackProgress(progress, float(stability.max()), argVals.minDelta)
+		if argVals.checkpoint is not None and (generation % argVals.checkpointEvery == 0 or generation == argVals.generations):
+			saveState(argVals.checkpoint, generation, genes, stability, duration, progress)
+	# *** GENERATIONAL LOOP END
+	return (genes, stability, duration, generation)
 
 # FIXME: a fxn that builds candidates from a given gene
 
 # MAIN
-def main():
+def main(args=None):
+	global haltMode, lifeRule, simPool, fitnessMemo
 	# Parse the command line arguments
 	cmdArgs = argparse.ArgumentParser(description="Uses genetic algorithms to produce a maximally stable seed.")
 	cmdArgs.add_argument('-f', '--file', type=str, help="Use a Plaintext seed as the starting input.")
 	cmdArgs.add_argument('-p', '--population', type=int, default=20, help="Specify the size of the starting population of genetic candidates.")
 	cmdArgs.add_argument('-s', '--size', type=int, default=16, help="Sets the length of the genetic strings, if no file is specified.")
-	argVals = cmdArgs.parse_args()
+	cmdArgs.add_argument('--halt', type=str, default=haltMode, choices=st.haltModes, help="Sets how the simulation decides that a seed has settled.")
+	cmdArgs.add_argument('-r', '--rule', type=gameUtils.ruleNotation, default=lifeRule, help="Sets the Life-like rule in B/S notation (eg B36/S23) or by name.")
+	cmdArgs.add_argument('-w', '--workers', type=int, default=1, help="Sets the number of worker processes used for fitness runs (0 uses every core).")
+	cmdArgs.add_argument('--chunk', type=int, default=None, help="Sets the number of seeds sent to a worker at a time.")
+	cmdArgs.add_argument('--seed', type=int, default=None, help="Seeds the random number generators, for reproducible runs.")
+	cmdArgs.add_argument('--cache', type=str, default=None, help="Keeps fitness values in this SQLite file, to be reused across runs.")
+	cmdArgs.add_argument('-g', '--generations', type=int, default=20, help="Sets the maximum number of generations to run.")
+	cmdArgs.add_argument('--patience', type=int, default=5, help="Stops after this many generations without the best fitness improving (0 never stops early).")
+	cmdArgs.add_argument('--min-delta', dest='minDelta', type=float, default=0.0, help="Sets the smallest gain in the best stability that counts as an improvement.")
+	cmdArgs.add_argument('--selection', type=str, default='roulette', choices=selections, help="Sets how parents are chosen.")
+	cmdArgs.add_argument('--tournament', type=int, default=3, help="Sets the number of entrants in each selection tournament.")
+	cmdArgs.add_argument('--elite', type=int, default=None, help="Sets how many of the fittest parents survive each generation (default: all of them compete with the children).")
+	cmdArgs.add_argument('--crossover', type=str, default='single', choices=crossovers, help="Sets the crossover operator used on each parent pair.")
+	cmdArgs.add_argument('--bit-rate', dest='bitRate', type=float, default=0.0, help="Also flips every child gene with this probability.")
+	cmdArgs.add_argument('--islands', type=int, default=1, help="Evolves this many populations in parallel processes, with migration between them.")
+	cmdArgs.add_argument('--epoch', type=int, default=5, help="Sets the number of generations between migrations.")
+	cmdArgs.add_argument('--migrants', type=int, default=2, help="Sets how many of its fittest entries each island sends per migration.")
+	cmdArgs.add_argument('--topology', type=str, default='ring', choices=topologies, help="Sets which islands each island's migrants go to.")
+	cmdArgs.add_argument('--corpus', type=str, default=None, help="Appends the final population to this seed corpus directory.")
+	cmdArgs.add_argument('--checkpoint', type=str, default=None, help="Saves the search state to this folder as it runs.")
+	cmdArgs.add_argument('--checkpoint-every', dest='checkpointEvery', type=int, default=1, help="Sets the number of generations between checkpoints.")
+	cmdArgs.add_argument('--resume', action='store_true', help="Continues from the state saved in the checkpoint folder.")
+	instrument.addArguments(cmdArgs)
+	argVals = cmdArgs.parse_args(args)
+	instrument.startFromArguments(argVals)
+	haltMode = argVals.halt
+	lifeRule = argVals.rule
+	if argVals.seed is not None:
+		rng.seed(argVals.seed)
+		np.random.seed(argVals.seed)
+	# Island processes run their own simulations, so they get no pool
+	simPool = st.SimulationPool(argVals.workers if argVals.islands == 1 else 1, argVals.chunk)
+	fitnessMemo = fitnessCache.FitnessCache(path=argVals.cache, namespace=fitnessCache.namespaceFor(sideLength=10, maxDuration=1000, haltMode=haltMode, rule=lifeRule))
 	# FIXME: need handling for seed file inputs
-	populationSize = argVals.population
 	#geneSize = argVals.size # FIXME: has been hardcoded at top of file!
 	#mutationRate = argVals.rate # FIXME: has been hardcoded at top of file!
 	# METHOD
 	# Generate the initial population from the specified parameters
 	# either from a random seed with given params or from a specified seed file
-	# population[]: (seed string, fitness value)
-	population = randomPopnStrings(geneSize, populationSize)
-	# Determine how many parents will be in the propagation pool
-	# Always produce a whole integer
-	parentPoolSize = math.floor(len(population) / 2)
-	# Round down to nearest even value if needed
-	if parentPoolSize % 2 == 1:
-		parentPoolSize -= 1
-	# *** GENERATIONAL LOOP STARTS HERE
-	# Sort the population in descending order by their fitness rating
-	population.sort(reverse = True, key = lambda x: x[1])
-	# Slice the pool of candidate parents from the general population
-	parentPool = population[0:parentPoolSize]
-	#print("P:", len(parentPool)) # DEBUG
-	# Calculate the sum total fitness of the propagation pool
-	groupFitness = 0
-	for single in parentPool:
-		groupFitness += single[1][0]
-	# Add parents to the pool, selecting proportional to their fitness
-	# To obtain a normalized probability: p = this.fitness / groupFitness
-	# LOOP METHOD
-	# Is the current parent's fitness LOWER or HIGHER than the selValue?
-	# If parent.fitness < selValue
-	# -> check next parent
-	# If parent.fitness >= selValue
-	# -> select this parent
-	# where parent.fitness = (sum of all previous fitnesses)
-	remainingParents = parentPoolSize
-	while remainingParents > 0:
-		# The lucky singles in the front get to be the defaults
-		firstParent = parentPool[0]
-		secondParent = parentPool[1]
-		# Begin randomized selection
-		selection = rng.uniform(0.0, 1.0)
-		#print("selvalue: ", selection) # DEBUG
-		currentProbability = 0
-		for j in parentPool:
-			currentProbability += (j[1][0] / groupFitness)
-			#print("C1: ", currentProbability) # DEBUG
-			if selection <= currentProbability:
-				firstParent = j
-				remainingParents -= 1
-				break
-		#print(firstParent) # DEBUG
-		#select second
-		selection = rng.uniform(0.0, 1.0)
-		#print("selvalue: ", selection) # DEBUG
-		currentProbability = 0
-		for k in parentPool:
-			currentProbability += (k[1][0] / groupFitness)
-			#print("C2: ", currentProbability) # DEBUG
-			if selection <= currentProbability:
-				# select this one, as long as it's not the same as 1st
-				if k[0] != firstParent[0]:
-					secondParent = k
-					remainingParents -= 1
-					break
-		#print(secondParent.genes) # DEBUG
-		# Propagate the parents to produce two children
-		#print("PROPAGATE: ", firstParent[0], secondParent[0]) # DEBUG
-		newKids = propagate(firstParent[0], secondParent[0])
-		#print("New children:", newKids[0], newKids[1]) # DEBUG
-		# Check to see if any of the children genes mutate
-		firstChance = rng.randint(0, 100)
-		#print("chance value:", mutateChance, "mutation rate:", mutationRate) # DEBUG
-		if firstChance < mutationRate:
-			#print("Mutating first child") # DEBUG
-			mutate(newKids[0])
-		secondChance = rng.randint(0, 100)
-		if secondChance < mutationRate:
-			#print("Mutating second child") # DEBUG
-			mutate(newKids[1])
-		#print("New children:", newKids[0], newKids[1]) # DEBUG
-		population.append((newKids[0], fitness(newKids[0])))
-		population.append((newKids[1], fitness(newKids[1])))
-		#print("New citizens:", population[-1], population[-2]) # DEBUG
-		# Repeat until no more parents left
-	# *** GENERATIONAL LOOP END
+	# genes: one row per candidate; stability, duration: their fitness values
+	if argVals.islands > 1:
+		assert argVals.checkpoint is None, "Checkpoints only cover a single population, not islands!"
+		genes, stability, duration, generation = runIslands(argVals)
+	else:
+		genes, stability, duration, generation = runPopulation(argVals)
+	print("Ran", generation, "generations")
 	# Sort one final time so as to place the most fit specimens at the top
-	population.sort(reverse = True, key = lambda x: x[1])
+	order = rankPopulation(stability, duration)
+	genes, stability, duration = genes[order], stability[order], duration[order]
 	# Display the results for the top three contenders
 	print("Genetic Algorithm RESULTS:")
-	for index in range(3):
-		if population[index] == population[index + 1]: index += 1 # uniques only
-		print("Stability:", population[index][1][0], ", Sim duration:", population[index][1][1])
-		printAsSeed(population[index][0], seedWidth)
-		if fileFlag == True: saveToPlaintext(population[index], seedWidth)
+	# uniques only: migrants leave copies of the best genes on several islands
+	uniques = np.sort(np.unique(genes, axis=0, return_index=True)[1])
+	for index in uniques[:3]:
+		print("Stability:", stability[index], ", Sim duration:", duration[index])
+		printAsSeed(geneToStr(genes[index]), seedWidth)
+		if fileFlag == True: saveToPlaintext((geneToStr(genes[index]), (stability[index], duration[index])), seedWidth)
+	if argVals.corpus is not None:
+		corpus = seedCorpus.SeedCorpus(argVals.corpus, (seedWidth, seedWidth))
+		corpus.append(genes.reshape(-1, seedWidth, seedWidth), stability, duration)
+		print("Added", len(genes), "seeds to", argVals.corpus)
+	print(fitnessMemo.report())
+	fitnessMemo.close()
+	simPool.close()
 
 # The self-invocation method
 if __name__ == "__main__":
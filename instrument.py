@@ -0,0 +1,262 @@
+# instrument.py
+
+# Opt-in timing of the hot paths, to see where a search spends its time.
+# Nothing here touches the simulator until enable() is called: it then
+# swaps each probed function or method (see probes) for a wrapper that
+# times every call, so with instrumentation off the code runs exactly as
+# it always did, at no cost. Each probe counts its calls, sums their time
+# and keeps a log2 histogram of call times in microseconds; the simulation
+# probes also histogram how many generations each simulation ran. Methods
+# are probed on the named class and on every subclass that overrides them,
+# so each engine shows up under its own name.
+# Times are inclusive: runSimulation's time includes the steps it took,
+# and a step includes its convolve, applyConwayRules and takeCensus.
+# Only this process is measured. Worker processes (-w, --islands) keep
+# their own uncounted copies, so use one worker to see the simulation
+# phases of a generator run.
+# The tools enable this with --instrument, which prints a summary table at
+# exit or, given a .json file, writes a Chrome trace (chrome://tracing or
+# ui.perfetto.dev) with the summary under otherData. --cprofile and
+# --tracemalloc hook up the standard profilers the same way.
+
+import atexit
+import functools
+import json
+import os
+import sys
+import threading
+import time
+
+# (module, function or Class.method) for everything that is probed
+probes = (
+	('seedTester', 'runSimulation'),
+	('seedTester', 'runSimulationBatch'),
+	('seedTester', 'SimulationPool.evaluate'),
+	('gameUtils', 'GameOfLife.step'),
+	('gameUtils', 'GameOfLife.convolve'),
+	('gameUtils', 'GameOfLife.applyConwayRules'),
+	('gameUtils', 'GameOfLife.takeCensus'),
+	('gameUtils', 'stepBatch'),
+	('fitnessCache', 'FitnessCache.lookupMany'),
+	('geneticGenerator', 'fitness'),
+	('geneticGenerator', 'fitnessMatrix'),
+	('geneticGenerator', 'evolveGeneration'),
+	('neuralNetwork', 'neuralNetwork.applyWeights'),
+	('neuralNetwork', 'neuralNetwork.updateaWeights'),
+	('neuralNetwork', 'neuralNetwork.applyWeightsBatch'),
+	('neuralNetwork', 'neuralNetwork.updateWeightsBatch'),
+	('neuralNetwork', 'neuralNetwork.testSeeds'),
+)
+# Probes whose results are simulation results, for the generation histogram
+simulationProbes = {'seedTester.runSimulation': False, 'seedTester.runSimulationBatch': True}
+traceLimit = 1000000 # the most trace events kept; later calls are only counted
+
+class PhaseStats:
+	# The running totals of one probe
+	def __init__(self, name):
+		self.name = name
+		self.calls = 0
+		self.totalNs = 0
+		self.maxNs = 0
+		self.histogram = {} # log2 of the call time in us -> calls
+	def add(self, elapsedNs):
+		self.calls += 1
+		self.totalNs += elapsedNs
+		if elapsedNs > self.maxNs: self.maxNs = elapsedNs
+		bucket = (elapsedNs // 1000).bit_length()
+		self.histogram[bucket] = self.histogram.get(bucket, 0) + 1
+	def summary(self):
+		# Histogram keys are the upper bounds of the buckets, in us
+		return {'calls': self.calls, 'totalSeconds': self.totalNs / 1e9, 'meanMicroseconds': self.totalNs / max(1, self.calls) / 1e3,
+				'maxMicroseconds': self.maxNs / 1e3, 'histogram': {str(1 << bucket): count for bucket, count in sorted(self.histogram.items())}}
+
+# Module state, set up by enable()
+phases = {} # probe name -> PhaseStats
+generations = {} # generations run -> simulations
+trace = None # (name, start ns, elapsed ns, thread id) while tracing
+traceDropped = 0
+patched = [] # (owner, attribute, original) to undo the probes
+startNs = 0
+output = None
+profiler = None
+profilePath = None
+mallocTop = 0
+
+def findModule(name):
+	# Returns the loaded module of that name, including a tool that is being
+	# run as a script (and so is loaded as __main__); None if not loaded
+	if name in sys.modules: return sys.modules[name]
+	main = sys.modules.get('__main__')
+	mainFile = getattr(main, '__file__', None) or ''
+	if os.path.splitext(os.path.basename(mainFile))[0] == name: return main
+	return None
+
+def countGenerations(result, batched):
+	# Adds the simulations in a probed result to the generation histogram
+	for simulation in (result if batched else [result]):
+		duration = len(simulation[1])
+		generations[duration] = generations.get(duration, 0) + 1
+
+def makeProbe(name, function):
+	# Returns a wrapper that times every call of the function under the name
+	stats = phases.setdefault(name, PhaseStats(name))
+	batched = simulationProbes.get(name)
+	clock = time.perf_counter_ns
+	@functools.wraps(function)
+	def probe(*args, **kwargs):
+		global traceDropped
+		start = clock()
+		try:
+			result = function(*args, **kwargs)
+		finally:
+			elapsed = clock() - start
+			stats.add(elapsed)
+			if trace is not None:
+				if len(trace) < traceLimit: trace.append((name, start, elapsed, threading.get_ident()))
+				else: traceDropped += 1
+		if batched is not None: countGenerations(result, batched)
+		return result
+	probe.instrumentOriginal = function
+	return probe
+
+def patch(owner, attribute, name):
+	original = owner.__dict__[attribute]
+	setattr(owner, attribute, makeProbe(name, original))
+	patched.append((owner, attribute, original))
+
+def subclassesOf(cls):
+	# Every class derived from cls, however indirectly
+	for subclass in cls.__subclasses__():
+		yield subclass
+		yield from subclassesOf(subclass)
+
+def enable(tracing=False):
+	# Installs every probe whose module is loaded; calling it again only adds
+	# the probes of modules loaded since
+	# With tracing, every call is also kept for a Chrome trace
+	global trace, startNs
+	if not patched: startNs = time.perf_counter_ns()
+	if tracing and trace is None: trace = []
+	done = {(id(owner), attribute) for owner, attribute, original in patched}
+	for moduleName, target in probes:
+		module = findModule(moduleName)
+		if module is None: continue
+		if '.' not in target:
+			if (id(module), target) not in done: patch(module, target, moduleName + '.' + target)
+			continue
+		className, attribute = target.split('.')
+		cls = getattr(module, className)
+		for owner in [cls] + list(subclassesOf(cls)):
+			if attribute in owner.__dict__ and (id(owner), attribute) not in done:
+				patch(owner, attribute, owner.__module__.replace('__main__', moduleName) + '.' + owner.__name__ + '.' + attribute)
+
+def disable():
+	# Puts back the original functions; the recorded stats are kept
+	while patched:
+		owner, attribute, original = patched.pop()
+		setattr(owner, attribute, original)
+
+def summaryLines():
+	# Returns the summary as a table, busiest phase first
+	wallSeconds = (time.perf_counter_ns() - startNs) / 1e9
+	lines = ["Instrumentation: " + str(round(wallSeconds, 3)) + "s since enabled (times include the phases called within)",
+			'phase'.ljust(44) + 'calls'.rjust(10) + 'total s'.rjust(10) + 'mean us'.rjust(11) + 'max us'.rjust(11) + 'share'.rjust(8)]
+	for stats in sorted(phases.values(), key=lambda stats: -stats.totalNs):
+		if not stats.calls: continue
+		lines.append(stats.name.ljust(44) + str(stats.calls).rjust(10) + str(round(stats.totalNs / 1e9, 3)).rjust(10)
+				+ str(round(stats.totalNs / stats.calls / 1e3, 1)).rjust(11) + str(round(stats.maxNs / 1e3, 1)).rjust(11)
+				+ (str(round(100 * stats.totalNs / 1e9 / max(wallSeconds, 1e-9), 1)) + '%').rjust(8))
+	if generations:
+		buckets = {}
+		for duration, count in generations.items():
+			bound = 1 << max(0, duration - 1).bit_length()
+			buckets[bound] = buckets.get(bound, 0) + count
+		lines.append("Generations per simulation (up to): " + ', '.join(str(bound) + ': ' + str(count) for bound, count in sorted(buckets.items())))
+	if traceDropped: lines.append(str(traceDropped) + " calls were left out of the trace (see traceLimit)")
+	return lines
+
+def summary():
+	# Returns the summary as a JSON-ready dict
+	return {'wallSeconds': (time.perf_counter_ns() - startNs) / 1e9, 'traceDropped': traceDropped,
+			'phases': {name: stats.summary() for name, stats in phases.items() if stats.calls},
+			'generations': {str(duration): count for duration, count in sorted(generations.items())}}
+
+def writeTrace(path):
+	# Writes the recorded calls as Chrome trace events, in microseconds
+	pid = os.getpid()
+	events = [{'name': name, 'cat': name.split('.')[0], 'ph': 'X', 'ts': (start - startNs) / 1e3,
+			'dur': elapsed / 1e3, 'pid': pid, 'tid': thread} for name, start, elapsed, thread in trace or ()]
+	with open(path + '.tmp', 'w') as target:
+		json.dump({'traceEvents': events, 'displayTimeUnit': 'ms', 'otherData': summary()}, target)
+	os.replace(path + '.tmp', path)
+
+def start(instrumentOutput=None, cprofilePath=None, tracemallocTop=0):
+	# Turns on whichever of the probes, cProfile and tracemalloc are asked
+	# for; finish() reports them, and is registered to run at exit
+	# instrumentOutput: '-' prints the summary to stderr, a .json path gets a
+	# Chrome trace and any other path the summary table
+	global output, profiler, profilePath, mallocTop
+	if instrumentOutput is not None:
+		output = instrumentOutput
+		enable(tracing=output.endswith('.json'))
+	if tracemallocTop:
+		import tracemalloc
+		mallocTop = tracemallocTop
+		tracemalloc.start()
+	if cprofilePath is not None:
+		import cProfile
+		profilePath = cprofilePath
+		profiler = cProfile.Profile()
+		profiler.enable()
+	if output is not None or profiler is not None or mallocTop:
+		atexit.register(finish)
+
+def finish():
+	# Stops everything start() turned on and writes out the reports; only
+	# the first call does anything
+	global output, profiler, mallocTop
+	atexit.unregister(finish)
+	if profiler is not None:
+		profiler.disable()
+		if profilePath == '-':
+			import pstats
+			pstats.Stats(profiler, stream=sys.stderr).sort_stats('cumulative').print_stats(25)
+		else:
+			profiler.dump_stats(profilePath)
+			print("cProfile stats written to", profilePath, "(python -m pstats " + profilePath + ")", file=sys.stderr)
+		profiler = None
+	if mallocTop:
+		import tracemalloc
+		# Leave out the trace kept by the probes and any lazy imports
+		snapshot = tracemalloc.take_snapshot().filter_traces((tracemalloc.Filter(False, __file__),
+				tracemalloc.Filter(False, '<frozen importlib._bootstrap>'), tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>')))
+		current, peak = tracemalloc.get_traced_memory()
+		tracemalloc.stop()
+		print("tracemalloc: peak", round(peak / 2**20, 2), "MiB, still allocated", round(current / 2**20, 2), "MiB; largest sites:", file=sys.stderr)
+		for entry in snapshot.statistics('lineno')[:mallocTop]:
+			print("  ", entry, file=sys.stderr)
+		mallocTop = 0
+	if output is not None:
+		disable()
+		if output == '-':
+			print('\n'.join(summaryLines()), file=sys.stderr)
+		elif output.endswith('.json'):
+			writeTrace(output)
+			print("Chrome trace written to", output, file=sys.stderr)
+		else:
+			with open(output, 'w') as target:
+				target.write('\n'.join(summaryLines()) + '\n')
+		output = None
+
+def addArguments(cmdArgs):
+	# Adds the instrumentation options to a tool's argument parser
+	cmdArgs.add_argument('--instrument', type=str, nargs='?', const='-', default=None,
+			help="times the simulation and search phases, printing a summary at exit (or writing it to a file; a .json file gets a Chrome trace)")
+	cmdArgs.add_argument('--cprofile', type=str, default=None, help="runs under cProfile and writes its stats to this file ('-' prints the top entries)")
+	cmdArgs.add_argument('--tracemalloc', type=int, default=0, help="tracks allocations and prints this many of the largest allocation sites at exit")
+
+def startFromArguments(argVals):
+	# Starts whatever addArguments' options asked for
+	start(argVals.instrument, argVals.cprofile, argVals.tracemalloc)
+
+# EOF
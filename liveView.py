@@ -0,0 +1,203 @@
+# liveView.py
+
+# Watches a simulation as it runs, without holding it up.
+# The simulation offers the viewer its world once per generation. At most
+# fps times a second the viewer packs the state's rows into bits and hands
+# them to a separate rendering process through a small bounded queue; if
+# the queue is still full the frame is dropped rather than waited on, and
+# the renderer always skips ahead to the newest frame it has. So however
+# slow the drawing gets, the stepping loop only ever pays for an occasional
+# np.packbits.
+# Two renderers are available:
+# - 'ansi': draws into the terminal with half-block characters, two world
+#   rows per line, shrinking big worlds to fit; each frame is one write, to
+#   stderr, so that stdout stays free for results (eg seedTester's records)
+# - 'plot': a matplotlib window, updated with imshow.set_data and blitting
+
+import multiprocessing
+import os
+import queue
+import shutil
+import sys
+import time
+import numpy as np
+
+viewModes = ('ansi', 'plot')
+# Indexed by top + 2 * bottom: the character for a pair of stacked tiles
+halfBlocks = np.array([' ', '▀', '▄', '█'])
+
+def unpackFrame(packed, cols):
+	# Returns the bool world for rows packed with np.packbits(state, axis=1)
+	return np.unpackbits(packed, axis=1, count=cols).view(bool)
+
+def poolPacked(packed, cols, scale):
+	# Shrinks a world of packed rows by the given factor: a pooled tile is
+	# live if any tile in its scale x scale block is
+	# The rows are merged while still packed, so only 1/scale of the world
+	# is ever unpacked
+	if scale == 1: return unpackFrame(packed, cols)
+	merged = np.bitwise_or.reduceat(packed, np.arange(0, len(packed), scale), axis=0)
+	state = unpackFrame(merged, cols)
+	width = -(-cols // scale) * scale
+	if width != cols: state = np.pad(state, ((0, 0), (0, width - cols)))
+	return state.reshape(len(state), width // scale, scale).any(axis=2)
+
+def ansiFrame(packed, cols, columns, lines, header=''):
+	# Returns the escape codes and characters that redraw the whole terminal
+	# with the given world of packed rows, fitted into columns x lines
+	rows = len(packed)
+	scale = max(1, -(-cols // columns), -(-rows // (2 * max(1, lines - 1))))
+	pooled = poolPacked(packed, cols, scale)
+	if len(pooled) % 2:
+		pooled = np.vstack([pooled, np.zeros((1, pooled.shape[1]), dtype=bool)])
+	codes = pooled[0::2].view(np.uint8) + 2 * pooled[1::2].view(np.uint8)
+	text = [''.join(line) for line in halfBlocks[codes]]
+	if scale > 1: header += " (1:" + str(scale) + ")"
+	# Home the cursor and clear each line's tail instead of the whole screen,
+	# which would flicker
+	return '\x1b[H' + header + '\x1b[K\n' + '\x1b[K\n'.join(text) + '\x1b[J'
+
+class AnsiRenderer:
+	# Draws frames into the terminal, through stderr
+	def __init__(self, shape, title):
+		self.title = title
+		self.output = sys.stderr
+		self.output.write('\x1b[2J\x1b[?25l') # clear, hide the cursor
+	def draw(self, packed, cols, generation):
+		try:
+			columns, lines = os.get_terminal_size(self.output.fileno())
+		except (OSError, ValueError):
+			columns, lines = shutil.get_terminal_size()
+		header = self.title + " - generation " + str(generation)
+		self.output.write(ansiFrame(packed, cols, columns, lines - 1, header))
+		self.output.flush()
+		return True
+	def close(self):
+		self.output.write('\x1b[?25h\n') # show the cursor again
+		self.output.flush()
+
+class PlotRenderer:
+	# Draws frames into a matplotlib window, blitting only the image
+	def __init__(self, shape, title):
+		import matplotlib.pyplot as plt
+		self.plt = plt
+		self.figure, self.axes = plt.subplots()
+		self.figure.canvas.manager.set_window_title(title)
+		self.axes.set_axis_off()
+		self.image = self.axes.imshow(np.zeros(shape, dtype=bool), cmap='binary', vmin=0, vmax=1,
+				interpolation='nearest', animated=True)
+		self.label = self.axes.text(0.01, 0.99, '', transform=self.axes.transAxes, va='top',
+				color='tab:red', animated=True)
+		plt.show(block=False)
+		plt.pause(0.05)
+		self.background = None
+		self.figure.canvas.mpl_connect('draw_event', self.grabBackground)
+		self.grabBackground()
+	def grabBackground(self, event=None):
+		# The static parts of the figure, restored under every frame; taken
+		# again whenever the window is redrawn (eg resized)
+		canvas = self.figure.canvas
+		if canvas.supports_blit: self.background = canvas.copy_from_bbox(self.figure.bbox)
+	def draw(self, packed, cols, generation):
+		# Returns False once the window has been closed
+		if not self.plt.fignum_exists(self.figure.number): return False
+		canvas = self.figure.canvas
+		self.image.set_data(unpackFrame(packed, cols))
+		self.label.set_text("generation " + str(generation))
+		if self.background is not None:
+			canvas.restore_region(self.background)
+			self.axes.draw_artist(self.image)
+			self.axes.draw_artist(self.label)
+			canvas.blit(self.figure.bbox)
+		else:
+			canvas.draw_idle()
+		canvas.flush_events()
+		return True
+	def close(self):
+		# Leaves the last frame up until the window is closed
+		if self.plt.fignum_exists(self.figure.number):
+			self.image.set_animated(False)
+			self.label.set_animated(False)
+			self.plt.show()
+
+renderers = {'ansi': AnsiRenderer, 'plot': PlotRenderer}
+
+def renderLoop(frames, mode, shape, title, drawn):
+	# The body of the rendering process: draws the newest frame it has until
+	# the None sentinel arrives, counting the frames it draws in drawn
+	renderer = renderers[mode](shape, title)
+	finished = False
+	while not finished:
+		# Skip ahead past anything that queued up while the last frame drew
+		latest = None
+		item = frames.get()
+		while item is not None:
+			latest = item
+			try:
+				item = frames.get_nowait()
+			except queue.Empty:
+				break
+		finished = item is None
+		if latest is not None:
+			generation, packed = latest
+			if renderer.draw(packed, shape[1], generation): drawn.value += 1
+	renderer.close()
+
+class LiveViewer:
+	# Offers simulation frames to a rendering process
+	# mode: one of viewModes
+	# fps: the most frames per second that are sent on
+	# queueSize: the frames allowed in flight before new ones are dropped
+	def __init__(self, mode='ansi', fps=30, queueSize=2, title='Game of Life'):
+		assert mode in viewModes, "Unknown view mode: " + str(mode)
+		self.mode = mode
+		self.interval = 1 / fps if fps else 0
+		self.queueSize = queueSize
+		self.title = title
+		self.frames = None
+		self.process = None
+		self.nextFrame = 0.0
+		self.sent = 0
+		self.dropped = 0
+		# Frames the renderer actually drew: fewer than were sent if it
+		# skipped ahead, or if its window was closed early
+		self.drawnCount = multiprocessing.Value('l', 0, lock=False)
+	@property
+	def drawn(self):
+		return self.drawnCount.value
+	def start(self, shape):
+		self.frames = multiprocessing.Queue(self.queueSize)
+		self.process = multiprocessing.Process(target=renderLoop, args=(self.frames, self.mode, shape, self.title, self.drawnCount), daemon=True)
+		self.process.start()
+	def offer(self, world, generation, final=False):
+		# Sends the world's state on if a frame is due; the state is only
+		# read then, since some engines build it on demand
+		# A final frame is always sent, waiting for room in the queue if need be
+		# Returns True if a frame was queued
+		now = time.perf_counter()
+		if now < self.nextFrame and not final: return False
+		self.nextFrame = now + self.interval
+		state = np.asarray(world.state, dtype=bool)
+		if self.process is None: self.start(state.shape)
+		try:
+			self.frames.put((generation, np.packbits(state, axis=1)), block=final)
+		except queue.Full:
+			self.dropped += 1
+			return False
+		self.sent += 1
+		return True
+	def close(self):
+		# Waits for the renderer to finish (for the plot view, until its
+		# window is closed) and returns (frames sent, frames drawn, frames
+		# dropped)
+		if self.process is not None:
+			self.frames.put(None)
+			self.process.join()
+			self.process = None
+		return (self.sent, self.drawn, self.dropped)
+	def __enter__(self):
+		return self
+	def __exit__(self, *excInfo):
+		self.close()
+
+# EOF
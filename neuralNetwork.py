@@ -11,89 +11,152 @@ import numpy as np
 import random as rng
 import seedTester as st
 import gameUtils
+import fitnessCache
+import instrument
+import patternIO
+import seedCorpus
+import checkpoint
 
 #FIXME: magic numbers
 seedWidth = 3 #FIXME: indexing goes bad for n > 3?
 fileFlag = False
 
+def asSeed(values):
+    # Returns a bool seed matrix for either a bool array or rows of "O"/"."
+    values = np.asarray(values)
+    if values.dtype.kind in 'US': return values == gameUtils.liveChar
+    return values.astype(bool)
+
 class neuralNetwork:
     def __init__(self, sideLength, hiddenLayerSize):
         self.worldSize = int(sideLength**2)
         #For the following lists, [0] is for the input layer and [1] is the hidden layer
+        self.hiddenLayerSize = hiddenLayerSize
+        #Everything is kept in float32 so that whole batches stay cheap
         self.weights = []
-        self.weights.append((np.random.rand(self.worldSize, hiddenLayerSize) * 0.1) - 0.05)
-        self.weights.append((np.random.rand(hiddenLayerSize, self.worldSize) * 0.1) - 0.05)
+        self.weights.append(((np.random.rand(self.worldSize, hiddenLayerSize) * 0.1) - 0.05).astype(np.float32))
+        self.weights.append(((np.random.rand(hiddenLayerSize, self.worldSize) * 0.1) - 0.05).astype(np.float32))
         self.biases = []#Biases are using an implied 1. Since 1*w = w, the biases value is just w
-        self.biases.append((np.random.rand(hiddenLayerSize) * 0.1) - 0.05)
-        self.biases.append((np.random.rand(self.worldSize) * 0.1) - 0.05)
+        self.biases.append(((np.random.rand(hiddenLayerSize) * 0.1) - 0.05).astype(np.float32))
+        self.biases.append(((np.random.rand(self.worldSize) * 0.1) - 0.05).astype(np.float32))
         self.weightChange = []
-        self.weightChange.append(np.zeros([self.worldSize, hiddenLayerSize]))
-        self.weightChange.append(np.zeros([hiddenLayerSize, self.worldSize]))
+        self.weightChange.append(np.zeros([self.worldSize, hiddenLayerSize], dtype=np.float32))
+        self.weightChange.append(np.zeros([hiddenLayerSize, self.worldSize], dtype=np.float32))
         self.biasesChange = []
-        self.biasesChange.append(np.zeros(hiddenLayerSize))
-        self.biasesChange.append(np.zeros(self.worldSize))
+        self.biasesChange.append(np.zeros(hiddenLayerSize, dtype=np.float32))
+        self.biasesChange.append(np.zeros(self.worldSize, dtype=np.float32))
         self.momentum = 0.9
         self.learningRate = 0.1
         self.error = []
         self.activation = []
         self.layerOutputs = []
+        self.fitnessCache = None # a fitnessCache.FitnessCache, if one is attached
+        self.batchSize = 0 # the batch size the activation buffers are sized for
 
     def sigmoid(self, x):
         return 1.0/(1.0 + np.exp(-x)) #np.exp is better than ** cause you can pass it a vector/matrix
 
-    def applyWeights(self, inputGame):
-        sideLen = int(np.sqrt(self.worldSize))
-        newGame = []
-        for i in range(sideLen):
-            newGame.append([[] for x in range(sideLen)])
+    # Batch API
+    # Seeds go in as bool arrays, (B, side, side) or (B, worldSize), and are
+    # encoded as 0.9 (live) / 0.1 (dead) into preallocated float32 buffers.
+    # The activations of the last forwardBatch are kept in the buffers for
+    # the following updateWeightsBatch, and are overwritten by the next call.
+    def allocateBatch(self, batchSize):
+        # Sizes the activation and error buffers for batches of batchSize
+        self.batchSize = batchSize
+        self.batchInput = np.empty((batchSize, self.worldSize), dtype=np.float32)
+        self.batchHidden = np.empty((batchSize, self.hiddenLayerSize), dtype=np.float32)
+        self.batchOutput = np.empty((batchSize, self.worldSize), dtype=np.float32)
+        self.batchTarget = np.empty((batchSize, self.worldSize), dtype=np.float32)
+        self.batchHiddenError = np.empty((batchSize, self.hiddenLayerSize), dtype=np.float32)
+        self.weightGradients = [np.empty_like(self.weights[0]), np.empty_like(self.weights[1])]
 
-        inputGameArray = []
-        for i in range(self.worldSize):
-            inputTile = inputGame[i//sideLen][i%sideLen]
-            inputTile = 0.9 if inputTile == "O" else 0.1
-            inputGameArray.append(inputTile)
+    def encodeBatch(self, seeds, out):
+        # Writes bool seeds into out as 0.9 (live) / 0.1 (dead)
+        np.multiply(np.asarray(seeds, dtype=bool).reshape(len(out), self.worldSize), np.float32(0.8), out=out)
+        out += np.float32(0.1)
 
-        self.layerOutputs = []
-        self.layerOutputs.append(self.sigmoid(inputGameArray@self.weights[0] + self.biases[0]))
-        self.layerOutputs.append(self.sigmoid(self.layerOutputs[0]@self.weights[1] + self.biases[1]))
+    def sigmoidInto(self, x):
+        # The sigmoid, computed in place
+        np.negative(x, out=x)
+        np.exp(x, out=x)
+        x += np.float32(1.0)
+        np.reciprocal(x, out=x)
+
+    def forwardBatch(self, seeds):
+        # Runs the network forward on a batch of seeds
+        # Returns the (B, worldSize) output activations (a reused buffer)
+        if len(seeds) != self.batchSize: self.allocateBatch(len(seeds))
+        self.encodeBatch(seeds, self.batchInput)
+        np.matmul(self.batchInput, self.weights[0], out=self.batchHidden)
+        self.batchHidden += self.biases[0]
+        self.sigmoidInto(self.batchHidden)
+        np.matmul(self.batchHidden, self.weights[1], out=self.batchOutput)
+        self.batchOutput += self.biases[1]
+        self.sigmoidInto(self.batchOutput)
+        return self.batchOutput
 
-        for i in range(self.worldSize):
-            newGame[i//sideLen][i%sideLen] = "O" if self.layerOutputs[1][i] >= .5 else "."
-        return newGame
+    def applyWeightsBatch(self, seeds):
+        # Runs the network forward and returns the new seeds, shaped as given
+        seeds = np.asarray(seeds, dtype=bool)
+        return (self.forwardBatch(seeds) >= 0.5).reshape(seeds.shape)
+
+    def updateWeightsBatch(self, targets):
+        # Backpropagates the last forwardBatch towards the target seeds, with
+        # one target per seed in the batch; the gradients are averaged over
+        # the batch, so a batch of one is the classic single-seed update
+        self.encodeBatch(targets, self.batchTarget)
+        scale = np.float32(self.learningRate / self.batchSize)
+        # Output error, computed in the target buffer: a(1-a)(t-a)
+        outputError = self.batchTarget
+        outputError -= self.batchOutput
+        outputError *= self.batchOutput
+        outputError *= np.float32(1.0) - self.batchOutput
+        # Hidden error: a(1-a)(error @ W1^T), with the weights not yet updated
+        hiddenError = self.batchHiddenError
+        np.matmul(outputError, self.weights[1].T, out=hiddenError)
+        hiddenError *= self.batchHidden
+        hiddenError *= np.float32(1.0) - self.batchHidden
+        layerInputs = (self.batchInput, self.batchHidden)
+        layerErrors = (hiddenError, outputError)
+        for layer in range(2):
+            np.matmul(layerInputs[layer].T, layerErrors[layer], out=self.weightGradients[layer])
+            self.weightChange[layer] *= np.float32(self.momentum)
+            self.weightChange[layer] += scale * self.weightGradients[layer]
+            self.weights[layer] += self.weightChange[layer]
+            self.biasesChange[layer] *= np.float32(self.momentum)
+            self.biasesChange[layer] += scale * layerErrors[layer].sum(axis=0)
+            self.biases[layer] += self.biasesChange[layer]
+
+    def applyWeights(self, inputGame):
+        # Single-seed version of applyWeightsBatch, on lists of "O"/"." rows
+        newSeed = self.applyWeightsBatch(asSeed(inputGame)[None])[0]
+        self.layerOutputs = [self.batchHidden[0], self.batchOutput[0]]
+        return [[gameUtils.liveChar if entry else gameUtils.deadChar for entry in row] for row in newSeed]
 
     def updateaWeights(self, inputGame, moreStableGame):
-        sideLen = int(np.sqrt(self.worldSize))
-        inputGameArray = []
-        for i in range(self.worldSize):
-            inputTile = inputGame[i//sideLen][i%sideLen]
-            inputTile = 0.9 if inputTile == "O" else 0.1
-            inputGameArray.append(inputTile)
-
-        moreStableGameArray = []
-        for i in range(self.worldSize):
-            inputTile = moreStableGame[i//sideLen][i%sideLen]
-            inputTile = 0.9 if inputTile == "O" else 0.1
-            moreStableGameArray.append(inputTile)
+        # Single-seed version of updateWeightsBatch, following applyWeights
+        self.encodeBatch(asSeed(inputGame)[None], self.batchInput)
+        self.updateWeightsBatch(asSeed(moreStableGame)[None])
 
-        self.error = []
-        self.activation = self.layerOutputs[1]
-        self.error.append(self.activation * (1.0-self.activation) * (moreStableGameArray-self.activation))
-        self.activation = self.layerOutputs[0]
-        self.error.insert(0, self.activation * (1-self.activation) * (self.error[0]@np.transpose(self.weights[1])))
-
-        errorVec = np.reshape(self.error[0], (1,-1))
-        cur = np.reshape(inputGameArray, (-1,1))
-        self.weightChange[0] = (self.learningRate) * (cur@errorVec) + self.momentum * self.weightChange[0]
-        self.weights[0] += self.weightChange[0]
-        self.biasesChange[0] = (self.learningRate) * (self.error[0]) + self.momentum * self.biasesChange[0]
-        self.biases[0] += self.biasesChange[0]
-
-        errorVec = np.reshape(self.error[1], (1,-1))
-        cur = np.reshape(self.layerOutputs[0], (-1,1))
-        self.weightChange[1] = (self.learningRate) * (cur@errorVec) + self.momentum * self.weightChange[1]
-        self.weights[1] += self.weightChange[1]
-        self.biasesChange[1] = (self.learningRate) * (self.error[1]) + self.momentum * self.biasesChange[1]
-        self.biases[1] += self.biasesChange[1]
+    def getState(self):
+        # Returns the trainable state of the network as a dict of arrays
+        state = {}
+        for layer in range(2):
+            state['weights' + str(layer)] = self.weights[layer]
+            state['biases' + str(layer)] = self.biases[layer]
+            state['weightChange' + str(layer)] = self.weightChange[layer]
+            state['biasesChange' + str(layer)] = self.biasesChange[layer]
+        return state
+
+    def setState(self, state):
+        # Restores the state returned by getState
+        for layer in range(2):
+            self.weights[layer] = state['weights' + str(layer)].astype(np.float32)
+            self.biases[layer] = state['biases' + str(layer)].astype(np.float32)
+            self.weightChange[layer] = state['weightChange' + str(layer)].astype(np.float32)
+            self.biasesChange[layer] = state['biasesChange' + str(layer)].astype(np.float32)
+        self.batchSize = 0
 
     def getOutputAsStr(self):
         sideLen = int(np.sqrt(self.worldSize))
@@ -111,26 +174,28 @@ class neuralNetwork:
         return seedStr
 
     def toSeed(self, values):
-        seedMx = np.zeros((seedWidth, seedWidth))
-        for i in range(len(values)):
-            for j in range(len(values[i])):
-                if values[i][j] == 'O': seedMx[i, j] = True # PLAINTEXT Live
-        return seedMx
+        return asSeed(values)
 
     def toString(self, values):
-        seedStr = ''
-        for i in range(len(values)):
-            for j in range(len(values[i])):
-                if values[i][j] == 'O': seedStr += 'O' # PLAINTEXT Live
-                elif values[i][j] == '.': seedStr += '.' # PLAINTEXT Dead
-            seedStr += '\n'
-        return seedStr
+        return ''.join(row + '\n' for row in gameUtils.mxToStringList(asSeed(values)))
 
     def calcFitness(self, values):
         density = values[0][0] / values[0][1]
         duration = len(values[1])
         return ((density / duration), duration)
 
+    def testSeed(self, values, simPool, **simArgs):
+        # Runs the given seed through the simulator and returns calcFitness
+        # of the results, skipping the run if the fitness cache knows the seed
+        return self.testSeeds([self.toSeed(values)], simPool, **simArgs)[0]
+
+    def testSeeds(self, seeds, simPool, **simArgs):
+        # Batch version of testSeed, on a sequence of bool seeds
+        seeds = list(seeds)
+        evaluate = lambda batch: [self.calcFitness(fitnessData) for fitnessData in simPool.evaluate(batch, **simArgs)]
+        if self.fitnessCache is None: return evaluate(seeds)
+        return self.fitnessCache.lookupMany(seeds, evaluate)
+
     def loadPlaintext(self, path):
         print("Loading seed from", path)
         newSeed = []
@@ -141,31 +206,12 @@ class neuralNetwork:
     def saveToPlaintext(self, target, width, filename=''):
         # Saves the given seed as a Plaintext file
         # If a filename is not specified, then will be saved with timestamp
-        #print("T:", target) # DEBUG
-        import hashlib
-        seedStr = self.toString(target[0])
-        seedhash = hashlib.md5(seedStr.encode('utf-8')).hexdigest()
-        import time
-        datestamp = time.strftime("%Y%m%d")
-        timestamp = time.strftime("%H%M%S")
-        if filename == '':
-            filename = datestamp + '-' + timestamp + '_' + 'Nseed-' + seedhash[:8] + '.txt'
-        #print(filename)
-        newFile = open("outputs/" + filename, "w")
-        newFile.write("! seed: " + seedhash + '\n')
-        newFile.write("! This seed was created with neuralNetwork.py\n")
-        newFile.write("! Generated on " + time.strftime("%c") + " at " + time.strftime("%X") + '\n')
-        newFile.write("! Runtime: " + str(target[1][1]) + " iterations\n")
-        newFile.write("! Stability (density/time): " + str(target[1][0]) + '\n')
-        #col = 0
-        #for entry in target[0]:
-        #    newFile.write(entry)
-        #    col += 1
-        #    if col == width:
-        #        col = 0
-        #        newFile.write('\n')
-        newFile.write(seedStr)
-        newFile.close()
+        seed = asSeed(target[0])
+        patternIO.saveGeneratedSeed(seed, target[1], "neuralNetwork.py", 'Nseed', filename=filename)
+
+    def randomSeeds(self, count):
+        # Returns count random bool seeds as a (count, side, side) array
+        return np.random.randint(0, 2, size=(count, seedWidth, seedWidth)).astype(bool)
 
     def generateRandomSeed(self):
         newSeed = []
@@ -178,38 +224,100 @@ class neuralNetwork:
             newSeed.append(row)
         return newSeed
 
-def main():
+def saveState(folder, iteration, n, newGame, resultList):
+    # Checkpoints the network, the current seed and the results so far
+    arrays = n.getState()
+    arrays['newGame'] = asSeed(newGame)
+    arrays['results'] = np.array([asSeed(entry[0]) for entry in resultList])
+    arrays['stability'] = np.array([entry[1][0] for entry in resultList])
+    arrays['duration'] = np.array([entry[1][1] for entry in resultList])
+    # The fitness cache's counters are saved too, so the resumed run carries
+    # on counting from them; its entries are not (see FitnessCache.getState)
+    if n.fitnessCache is not None: arrays.update(n.fitnessCache.getState())
+    checkpoint.saveCheckpoint(folder, 'neuralNetwork', iteration, arrays, {'seedWidth': seedWidth})
+
+def loadState(folder, n):
+    # Restores the last checkpoint in the folder into the network
+    # Returns (iterations completed, newGame, resultList), or None if there is none
+    # The seeds come back as bool arrays
+    state = checkpoint.loadCheckpoint(folder, 'neuralNetwork')
+    if state is None: return None
+    iteration, arrays, values = state
+    assert values['seedWidth'] == seedWidth, "The checkpoint was made with a different seed width!"
+    n.setState(arrays)
+    if n.fitnessCache is not None: n.fitnessCache.setState(arrays)
+    resultList = [(seed, (float(stability), int(duration)))
+            for seed, stability, duration in zip(arrays['results'], arrays['stability'], arrays['duration'])]
+    return (iteration, arrays['newGame'], resultList)
+
+def main(args=None):
     cmdArgs = argparse.ArgumentParser(description="Uses a neural network algorithm to generate maximally stable seeds.")
     cmdArgs.add_argument('-f', '--file', type=str, help="Use a Plaintext seed as the starting input.")
-    argVals = cmdArgs.parse_args()
+    cmdArgs.add_argument('--halt', type=str, default='stability', choices=st.haltModes, help="Sets how the simulation decides that a seed has settled.")
+    cmdArgs.add_argument('-r', '--rule', type=gameUtils.ruleNotation, default=gameUtils.defaultRule, help="Sets the Life-like rule in B/S notation (eg B36/S23) or by name.")
+    cmdArgs.add_argument('-w', '--workers', type=int, default=1, help="Sets the number of worker processes used for fitness runs (0 uses every core).")
+    cmdArgs.add_argument('--seed', type=int, default=None, help="Seeds the random number generators, for reproducible runs.")
+    cmdArgs.add_argument('--cache', type=str, default=None, help="Keeps fitness values in this SQLite file, to be reused across runs.")
+    cmdArgs.add_argument('--corpus', type=str, default=None, help="Appends every tested seed to this seed corpus directory.")
+    cmdArgs.add_argument('-b', '--batch', type=int, default=1, help="Sets the number of seeds run through the network together each iteration.")
+    cmdArgs.add_argument('-i', '--iterations', type=int, default=5, help="Sets the number of training iterations.")
+    cmdArgs.add_argument('--checkpoint', type=str, default=None, help="Saves the search state to this folder as it runs.")
+    cmdArgs.add_argument('--checkpoint-every', dest='checkpointEvery', type=int, default=1, help="Sets the number of iterations between checkpoints.")
+    cmdArgs.add_argument('--resume', action='store_true', help="Continues from the state saved in the checkpoint folder.")
+    instrument.addArguments(cmdArgs)
+    argVals = cmdArgs.parse_args(args)
+    instrument.startFromArguments(argVals)
+    if argVals.seed is not None:
+        rng.seed(argVals.seed)
+        np.random.seed(argVals.seed)
+    simPool = st.SimulationPool(argVals.workers)
     n = neuralNetwork(seedWidth, 20)
-    if argVals.file is not None: newGame = n.loadPlaintext(argVals.file)
-    else: newGame = n.generateRandomSeed()
-    geneStr = ''
-    resultList = []
-    #print("N:", n.toSeed(newGame)) # DEBUG
-    # Perform an initial run to populate the results
-    fitnessData = st.runSimulation(n.toSeed(newGame))
-    fitStats = n.calcFitness(fitnessData)
-    resultList.append((newGame, fitStats)) # add initial state
-    #print(resultList[0]) # DEBUG
-    #FIXME: change loop condition
-    for i in range(5):
-        newGame = n.applyWeights(newGame) # run the network forward
+    n.fitnessCache = fitnessCache.FitnessCache(path=argVals.cache, namespace=fitnessCache.namespaceFor(sideLength=10, maxDuration=1000, haltMode=argVals.halt, rule=argVals.rule))
+    startIteration = 0
+    state = None
+    if argVals.resume:
+        assert argVals.checkpoint is not None, "--resume needs a --checkpoint folder to resume from!"
+        state = loadState(argVals.checkpoint, n)
+        if state is None: print("No checkpoint found in", argVals.checkpoint, "- starting afresh")
+    if state is not None:
+        startIteration, newGame, resultList = state
+        print("Resuming from iteration", startIteration, "of", argVals.checkpoint)
+    else:
+        # newGame: a batch of bool seeds, one per row of the network's batch
+        newGame = n.randomSeeds(argVals.batch)
+        if argVals.file is not None: newGame[0] = n.toSeed(n.loadPlaintext(argVals.file))
+        resultList = []
+        #print("N:", newGame) # DEBUG
+        # Perform an initial run to populate the results
+        fitStats = n.testSeeds(newGame, simPool, haltMode=argVals.halt, rule=argVals.rule)
+        resultList.extend(zip(newGame, fitStats)) # add initial state
+        #print(resultList[0]) # DEBUG
+        if argVals.checkpoint is not None: saveState(argVals.checkpoint, 0, n, newGame, resultList)
+    for i in range(startIteration, argVals.iterations):
+        newGame = n.applyWeightsBatch(newGame) # run the network forward
         #print(newGame) # DEBUG
-        fitnessData = st.runSimulation(n.toSeed(newGame)) # test the new seed
-        fitStats = n.calcFitness(fitnessData) # check how it did
-        resultList.append((newGame, fitStats)) # add the results to the list
+        fitStats = n.testSeeds(newGame, simPool, haltMode=argVals.halt, rule=argVals.rule) # test the new seeds and check how they did
+        resultList.extend(zip(newGame, fitStats)) # add the results to the list
         resultList.sort(reverse = True, key = lambda x: x[1]) #sort the list of results
         #print(resultList[0][0]) # DEBUG
-        n.updateaWeights(newGame, resultList[0][0]) #backprop with the most stable seed
+        n.updateWeightsBatch(np.broadcast_to(resultList[0][0], newGame.shape)) #backprop with the most stable seed
+        if argVals.checkpoint is not None and ((i + 1) % argVals.checkpointEvery == 0 or i + 1 == argVals.iterations):
+            saveState(argVals.checkpoint, i + 1, n, newGame, resultList)
     resultList.sort(reverse = True, key = lambda x: x[1]) #sort one last time
     # Display top three most stable results
     print("Neural Network RESULTS:")
-    for index in range(3):
+    for index in range(min(3, len(resultList))):
         print("Stability:", resultList[index][1][0], ", Sim duration:", resultList[index][1][1])
         print(n.toString(resultList[index][0]))
         if fileFlag == True: n.saveToPlaintext(resultList[index], seedWidth)
+    if argVals.corpus is not None:
+        corpus = seedCorpus.SeedCorpus(argVals.corpus, (seedWidth, seedWidth))
+        corpus.append([entry[0] for entry in resultList],
+                [entry[1][0] for entry in resultList], [entry[1][1] for entry in resultList])
+        print("Added", len(resultList), "seeds to", argVals.corpus)
+    print(n.fitnessCache.report())
+    n.fitnessCache.close()
+    simPool.close()
 
 # The self-invocation method
 if __name__ == "__main__":
@@ -0,0 +1,287 @@
+# patternIO.py
+
+# Reads and writes Game of Life patterns in the Plaintext, RLE and Life 1.06
+# formats. The decoders work on whole byte buffers with numpy (lookup
+# tables, cumulative sums and np.repeat) rather than one character at a
+# time, so multi-megabyte files decode quickly. iterPatterns streams the
+# patterns out of a directory or a concatenated archive file one by one.
+# Seeds are bool matrices indexed [row][col], matching the file layout.
+
+import hashlib
+import os
+import re
+import time
+from collections import namedtuple
+import numpy as np
+
+liveChar = 'O'
+deadChar = '.'
+# One decoded pattern: its name (file or header), seed matrix and comments
+Pattern = namedtuple('Pattern', ['name', 'seed', 'comments'])
+formatsByExtension = {
+	'.txt': 'plaintext', '.cells': 'plaintext',
+	'.rle': 'rle',
+	'.lif': 'life106', '.life': 'life106',
+}
+
+# Plaintext: 'O' is alive, '.' is dead, anything else is discarded
+plaintextTable = np.full(256, 255, dtype=np.uint8)
+plaintextTable[ord(deadChar)] = 0
+plaintextTable[ord(liveChar)] = 1
+
+def splitComments(data, marker):
+	# Separates the comment lines (starting with marker) from the body
+	# Returns (list of comment strings, body bytes)
+	# Blank lines inside the body are kept (in Plaintext they are empty rows);
+	# only those before and after it are dropped
+	comments = []
+	body = []
+	for line in data.splitlines():
+		if line.startswith(marker):
+			comments.append(line[len(marker):].decode('utf-8', 'replace').strip())
+		else:
+			body.append(line)
+	while body and not body[-1].strip(): body.pop()
+	start = 0
+	while start < len(body) and not body[start].strip(): start += 1
+	return (comments, b'\n'.join(body[start:]))
+
+def decodePlaintext(data):
+	# Decodes Plaintext bytes into (seed matrix, comments)
+	# Rows may be ragged: short rows are padded with dead tiles
+	comments, body = splitComments(data, b'!')
+	buffer = np.frombuffer(body, dtype=np.uint8)
+	codes = plaintextTable[buffer]
+	keep = codes != 255
+	# Row of every character, then the column of every kept character
+	rows = np.cumsum(buffer == ord('\n'))[keep]
+	values = codes[keep]
+	if len(values) == 0:
+		return (np.zeros((0, 0), dtype=bool), comments)
+	cols = np.arange(len(rows)) - np.searchsorted(rows, rows, side='left')
+	seed = np.zeros((rows[-1] + 1, cols.max() + 1), dtype=bool)
+	seed[rows, cols] = values.astype(bool)
+	return (seed, comments)
+
+def decodeRLE(data):
+	# Decodes RLE bytes into (seed matrix, comments)
+	# Multi-state patterns are flattened: every state other than b and . is alive
+	# Raises ValueError if the body ends in a run count with no tag after it
+	comments, body = splitComments(data, b'#')
+	width = height = 0
+	header = re.match(rb'\s*x\s*=\s*(\d+)\s*,\s*y\s*=\s*(\d+)[^\n]*\n?', body)
+	if header:
+		width, height = int(header.group(1)), int(header.group(2))
+		body = body[header.end():]
+	body = body.split(b'!')[0]
+	buffer = np.frombuffer(re.sub(rb'\s+', b'', body), dtype=np.uint8)
+	isDigit = (buffer >= ord('0')) & (buffer <= ord('9'))
+	tagPositions = np.flatnonzero(~isDigit)
+	tags = buffer[tagPositions]
+	# Each run count is the digits just before its tag: weight every digit by
+	# its power of ten and add the weights up per tag
+	digitPositions = np.flatnonzero(isDigit)
+	owners = np.searchsorted(tagPositions, digitPositions)
+	if len(owners) and owners[-1] == len(tagPositions):
+		raise ValueError("run count without a tag")
+	powers = tagPositions[owners] - 1 - digitPositions
+	weights = (buffer[digitPositions] - ord('0')) * (10.0 ** powers)
+	counts = np.bincount(owners, weights=weights, minlength=len(tags)).astype(np.int64)
+	counts[counts == 0] = 1
+	newRows = tags == ord('$')
+	cells = ~newRows
+	# Rows advance by the count of every $; columns restart at every $
+	rowOf = np.cumsum(np.where(newRows, counts, 0)) - np.where(newRows, counts, 0)
+	lengths = np.where(cells, counts, 0)
+	ends = np.cumsum(lengths)
+	rowBase = np.maximum.accumulate(np.where(newRows, ends, 0))
+	colOf = ends - lengths - rowBase
+	live = cells & (tags != ord('b')) & (tags != ord('.'))
+	runLengths = counts[live]
+	cellRows = np.repeat(rowOf[live], runLengths)
+	runStarts = np.repeat(colOf[live], runLengths)
+	offsets = np.arange(len(cellRows)) - np.repeat(np.cumsum(runLengths) - runLengths, runLengths)
+	cellCols = runStarts + offsets
+	if len(cellRows):
+		height = max(height, int(cellRows.max()) + 1)
+		width = max(width, int(cellCols.max()) + 1)
+	seed = np.zeros((height, width), dtype=bool)
+	seed[cellRows, cellCols] = True
+	return (seed, comments)
+
+def decodeLife106(data):
+	# Decodes Life 1.06 bytes (one "x y" pair per live tile) into
+	# (seed matrix, comments); the pattern is shifted to start at 0, 0
+	comments, body = splitComments(data, b'#')
+	coords = np.array(body.split(), dtype=np.int64).reshape(-1, 2)
+	if len(coords) == 0:
+		return (np.zeros((0, 0), dtype=bool), comments)
+	coords -= coords.min(axis=0)
+	seed = np.zeros((coords[:, 1].max() + 1, coords[:, 0].max() + 1), dtype=bool)
+	seed[coords[:, 1], coords[:, 0]] = True
+	return (seed, comments)
+
+decoders = {
+	'plaintext': decodePlaintext,
+	'rle': decodeRLE,
+	'life106': decodeLife106,
+}
+
+def sniffFormat(data, name=''):
+	# Guesses the format of a pattern from its file extension or contents
+	extension = os.path.splitext(name)[1].lower()
+	if extension in formatsByExtension:
+		return formatsByExtension[extension]
+	if data.lstrip().startswith(b'#Life 1.06'):
+		return 'life106'
+	if re.search(rb'^\s*x\s*=', data, re.MULTILINE):
+		return 'rle'
+	return 'plaintext'
+
+def decodePattern(data, name='', format=None):
+	# Decodes a pattern of any supported format into (seed, comments)
+	if format is None: format = sniffFormat(data, name)
+	return decoders[format](data)
+
+def readPattern(path, format=None):
+	# Reads a single pattern file and returns it as a Pattern
+	with open(path, 'rb') as source:
+		data = source.read()
+	seed, comments = decodePattern(data, path, format)
+	return Pattern(path, seed, comments)
+
+def splitArchive(lines):
+	# Splits the lines of a concatenated pattern file into one chunk of bytes
+	# per pattern, as they are read. A new pattern starts at a #Life 1.06 or
+	# RLE header, or at a comment that follows the previous pattern's cells;
+	# an RLE pattern ends at its !
+	chunk = []
+	seenBody = False
+	for line in lines:
+		stripped = line.strip()
+		isComment = stripped.startswith(b'!') or stripped.startswith(b'#')
+		startsNew = stripped.startswith(b'#Life') or (seenBody and (isComment or re.match(rb'x\s*=', stripped)))
+		if startsNew and chunk:
+			yield b''.join(chunk)
+			chunk = []
+			seenBody = False
+		chunk.append(line)
+		if stripped and not isComment:
+			seenBody = True
+		if seenBody and stripped.endswith(b'!') and not stripped.startswith(b'!'):
+			# The end of an RLE body
+			yield b''.join(chunk)
+			chunk = []
+			seenBody = False
+	if any(line.strip() for line in chunk):
+		yield b''.join(chunk)
+
+def iterPatternFiles(folder, format=None):
+	# Yields the path of every pattern file in a directory, searched
+	# recursively in name order; without a format, only files with a known
+	# pattern extension count
+	for folder, subfolders, files in os.walk(folder):
+		subfolders.sort()
+		for filename in sorted(files):
+			if format is None and os.path.splitext(filename)[1].lower() not in formatsByExtension:
+				continue
+			yield os.path.join(folder, filename)
+
+def iterPatterns(source, format=None):
+	# Lazily yields every pattern in a directory (see iterPatternFiles) or
+	# in a single, possibly concatenated, pattern file
+	if os.path.isdir(source):
+		for path in iterPatternFiles(source, format):
+			yield from iterPatterns(path, format)
+		return
+	with open(source, 'rb') as archive:
+		for index, chunk in enumerate(splitArchive(archive)):
+			seed, comments = decodePattern(chunk, source, format)
+			name = source if index == 0 else source + ':' + str(index)
+			for comment in comments:
+				if comment.startswith('Name:') or comment.startswith('N '):
+					name = comment.split(None, 1)[1] if ' ' in comment else name
+			yield Pattern(name, seed, comments)
+
+# Writers
+def encodePlaintext(seed, comments=()):
+	# Returns the Plaintext text for the seed
+	seed = np.asarray(seed, dtype=bool)
+	chars = np.array([ord(deadChar), ord(liveChar)], dtype=np.uint8)[seed.astype(np.uint8)]
+	lines = np.concatenate([chars, np.full((seed.shape[0], 1), ord('\n'), dtype=np.uint8)], axis=1)
+	header = ''.join('!' + comment + '\n' for comment in comments)
+	return header + lines.tobytes().decode('ascii')
+
+def encodeRLE(seed, comments=(), rule=None):
+	# Returns the RLE text for the seed, wrapped at 70 characters
+	# The header names the rule, by default the one the simulator runs
+	if rule is None:
+		import gameUtils # imported here, as gameUtils imports this module
+		rule = gameUtils.defaultRule
+	seed = np.asarray(seed, dtype=bool)
+	height, width = seed.shape
+	rows = []
+	for row in seed:
+		# Runs start wherever the value changes; trailing dead tiles are dropped
+		live = np.flatnonzero(row)
+		if len(live) == 0:
+			rows.append('')
+			continue
+		row = row[:live[-1] + 1]
+		starts = np.flatnonzero(np.diff(row.astype(np.int8), prepend=-1))
+		lengths = np.diff(np.append(starts, len(row)))
+		rows.append(''.join((str(length) if length > 1 else '') + ('o' if row[start] else 'b')
+				for start, length in zip(starts, lengths)))
+	# Collapse runs of empty rows into a single counted $
+	body = ''
+	pendingRows = 0
+	for index, row in enumerate(rows):
+		if index > 0: pendingRows += 1
+		if row:
+			if pendingRows: body += (str(pendingRows) if pendingRows > 1 else '') + '$'
+			pendingRows = 0
+			body += row
+	body += '!'
+	lines = ['#C ' + comment for comment in comments]
+	lines.append('x = ' + str(width) + ', y = ' + str(height) + ', rule = ' + rule)
+	lines.extend(body[index:index + 70] for index in range(0, len(body), 70))
+	return '\n'.join(lines) + '\n'
+
+def encodeLife106(seed, comments=()):
+	# Returns the Life 1.06 text for the seed
+	coords = np.argwhere(np.asarray(seed, dtype=bool))
+	lines = ['#Life 1.06'] + ['#D ' + comment for comment in comments]
+	lines.extend(str(col) + ' ' + str(row) for row, col in coords)
+	return '\n'.join(lines) + '\n'
+
+encoders = {
+	'plaintext': encodePlaintext,
+	'rle': encodeRLE,
+	'life106': encodeLife106,
+}
+
+def writePattern(path, seed, comments=(), format=None):
+	# Writes the seed to a file, in the format given or implied by its name
+	if format is None: format = formatsByExtension.get(os.path.splitext(path)[1].lower(), 'plaintext')
+	folder = os.path.dirname(path)
+	if folder: os.makedirs(folder, exist_ok=True)
+	with open(path, 'w') as target:
+		target.write(encoders[format](seed, comments))
+	return path
+
+def saveGeneratedSeed(seed, fitStats, generator, tag, folder='outputs', filename=''):
+	# Saves a seed found by one of the generators as a Plaintext file
+	# fitStats is the (stability, duration) pair the generators rank by
+	# If a filename is not specified, then will be saved with timestamp
+	seed = np.asarray(seed, dtype=bool)
+	seedhash = hashlib.md5(encodePlaintext(seed).encode('utf-8')).hexdigest()
+	if filename == '':
+		filename = time.strftime("%Y%m%d") + '-' + time.strftime("%H%M%S") + '_' + tag + '-' + seedhash[:8] + '.txt'
+	comments = [" seed: " + seedhash,
+			" This seed was created with " + generator,
+			" Generated on " + time.strftime("%c") + " at " + time.strftime("%X"),
+			" Runtime: " + str(fitStats[1]) + " iterations",
+			" Stability (density/time): " + str(fitStats[0])]
+	return writePattern(os.path.join(folder, filename), seed, comments, 'plaintext')
+
+# EOF
@@ -0,0 +1,231 @@
+# seedCorpus.py
+
+# A compact, append-only store for large numbers of screened seeds, as an
+# alternative to writing one small Plaintext file per seed.
+# A corpus is a directory holding:
+# - manifest.json: the seed shape and the column layout
+# - seeds.bin: every seed bit-packed into a fixed-width record
+# - one .bin file per metadata column (fitness, duration, population,
+#   period and the seed hash), each a flat array of one fixed dtype
+# Every file is memory-mapped for reading, so columns can be sliced and
+# sorted without copying the corpus into memory. Rows are only ever added
+# to the end; the row count is that of the shortest file, so a write that
+# was cut short is ignored and trimmed the next time the corpus is opened.
+
+import argparse
+import hashlib
+import json
+import os
+import numpy as np
+import patternIO
+
+manifestName = 'manifest.json'
+# The metadata columns; -1 marks a value that was not recorded
+columns = {
+	'fitness': np.dtype('<f8'),
+	'duration': np.dtype('<i4'),
+	'population': np.dtype('<i4'),
+	'period': np.dtype('<i4'),
+	'hash': np.dtype('S16'),
+}
+
+def seedHash(seed):
+	# Returns the 16-byte digest that identifies a seed in a corpus
+	# Trailing empty rows and columns are dropped first, so a seed hashes the
+	# same whether or not it has been padded out to a corpus's shape
+	seed = np.asarray(seed, dtype=bool)
+	rows = np.flatnonzero(seed.any(axis=1))
+	cols = np.flatnonzero(seed.any(axis=0))
+	seed = seed[:rows[-1] + 1 if len(rows) else 0, :cols[-1] + 1 if len(cols) else 0]
+	shape = np.array(seed.shape, dtype='<u4').tobytes()
+	return hashlib.blake2b(shape + np.packbits(seed).tobytes(), digest_size=16).digest()
+
+class SeedCorpus:
+	# An on-disk table of fixed-shape seeds and their simulation results
+	# path: the corpus directory, created if it does not exist yet
+	# seedShape: the (rows, cols) every seed is padded to; required when
+	# creating a corpus, and checked against the manifest otherwise
+	def __init__(self, path, seedShape=None):
+		self.path = path
+		manifestPath = os.path.join(path, manifestName)
+		if os.path.exists(manifestPath):
+			with open(manifestPath) as source:
+				manifest = json.load(source)
+			if seedShape is not None and tuple(seedShape) != tuple(manifest['seedShape']):
+				raise ValueError("Corpus " + path + " holds " + str(manifest['seedShape']) + " seeds, not " + str(seedShape))
+			seedShape = manifest['seedShape']
+		elif seedShape is None:
+			raise ValueError("A seed shape is needed to create the corpus " + path)
+		else:
+			os.makedirs(path, exist_ok=True)
+			manifest = {'version': 1, 'seedShape': list(seedShape),
+					'columns': {name: dtype.str for name, dtype in columns.items()}}
+			with open(manifestPath + '.tmp', 'w') as target:
+				json.dump(manifest, target, indent=1)
+			os.replace(manifestPath + '.tmp', manifestPath)
+		self.seedShape = tuple(seedShape)
+		self.recordSize = (self.seedShape[0] * self.seedShape[1] + 7) // 8
+		self.count = self.trim()
+		self.maps = {}
+		self.hashIndex = None
+	def filePath(self, name):
+		return os.path.join(self.path, name + '.bin')
+	def itemSize(self, name):
+		if name == 'seeds': return self.recordSize
+		return columns[name].itemsize
+	def trim(self):
+		# Finds the number of complete rows and cuts any partial tail off
+		names = ['seeds'] + list(columns)
+		for name in names:
+			if not os.path.exists(self.filePath(name)):
+				open(self.filePath(name), 'wb').close()
+		count = min(os.path.getsize(self.filePath(name)) // self.itemSize(name) for name in names)
+		for name in names:
+			if os.path.getsize(self.filePath(name)) != count * self.itemSize(name):
+				os.truncate(self.filePath(name), count * self.itemSize(name))
+		return count
+	def __len__(self):
+		return self.count
+	def mapped(self, name):
+		# Returns a read-only memory map of a column (or 'seeds' for the packed
+		# seed records), remapping it if rows were added since it was opened
+		if name not in self.maps or len(self.maps[name]) != self.count:
+			if self.count == 0:
+				shape = (0, self.recordSize) if name == 'seeds' else (0,)
+				dtype = np.uint8 if name == 'seeds' else columns[name]
+				self.maps[name] = np.zeros(shape, dtype=dtype)
+			elif name == 'seeds':
+				self.maps[name] = np.memmap(self.filePath(name), dtype=np.uint8, mode='r', shape=(self.count, self.recordSize))
+			else:
+				self.maps[name] = np.memmap(self.filePath(name), dtype=columns[name], mode='r', shape=(self.count,))
+		return self.maps[name]
+	def column(self, name):
+		# Returns a metadata column as a read-only (memory-mapped) array
+		return self.mapped(name)
+	def fitPacked(self, seed):
+		# Pads the seed out to the corpus shape and returns its packed bits
+		seed = np.asarray(seed, dtype=bool)
+		if seed.shape[0] > self.seedShape[0] or seed.shape[1] > self.seedShape[1]:
+			raise ValueError("A " + str(seed.shape) + " seed does not fit in a " + str(self.seedShape) + " corpus")
+		padded = np.zeros(self.seedShape, dtype=bool)
+		padded[:seed.shape[0], :seed.shape[1]] = seed
+		return padded, np.packbits(padded)
+	def append(self, seeds, fitness, duration, population=None, period=None):
+		# Adds one row per seed to the end of the corpus
+		# Returns the index of the first new row
+		count = len(seeds)
+		if population is None: population = np.full(count, -1)
+		if period is None: period = np.full(count, -1)
+		records = np.zeros((count, self.recordSize), dtype=np.uint8)
+		hashes = np.zeros(count, dtype=columns['hash'])
+		for index, seed in enumerate(seeds):
+			padded, records[index] = self.fitPacked(seed)
+			hashes[index] = seedHash(padded)
+		values = {'seeds': records, 'fitness': fitness, 'duration': duration,
+				'population': population, 'period': period, 'hash': hashes}
+		# The hash column goes last, so a row is only findable once it is whole
+		for name in ['seeds', 'fitness', 'duration', 'population', 'period', 'hash']:
+			dtype = np.uint8 if name == 'seeds' else columns[name]
+			with open(self.filePath(name), 'ab') as target:
+				target.write(np.ascontiguousarray(values[name], dtype=dtype).tobytes())
+		first = self.count
+		self.count += count
+		self.hashIndex = None
+		return first
+	def appendResults(self, seeds, results):
+		# Adds seeds together with their runSimulation results
+		fitness = []
+		duration = []
+		population = []
+		period = []
+		for result in results:
+			density = result[0][0] / result[0][1]
+			fitness.append(density / len(result[1]))
+			duration.append(len(result[1]))
+			population.append(result[0][0])
+			period.append(result[2][0] if len(result) > 2 and result[2] is not None else -1)
+		return self.append(seeds, fitness, duration, population, period)
+	def seed(self, index):
+		# Returns the seed stored in the given row as a bool matrix
+		bits = np.unpackbits(self.mapped('seeds')[index], count=self.seedShape[0] * self.seedShape[1])
+		return bits.reshape(self.seedShape).astype(bool)
+	def seeds(self, indices):
+		# Returns the seeds of several rows as a (count, rows, cols) bool array
+		records = self.mapped('seeds')[indices]
+		bits = np.unpackbits(records, axis=1, count=self.seedShape[0] * self.seedShape[1])
+		return bits.reshape((-1,) + self.seedShape).astype(bool)
+	def row(self, index):
+		# Returns the metadata of one row as a dict
+		info = {name: self.mapped(name)[index].item() for name in columns}
+		info['hash'] = info['hash'].ljust(columns['hash'].itemsize, b'\0')
+		return info
+	def find(self, target):
+		# Returns the row holding the given seed (or 16-byte seed hash), or
+		# None if it is not in the corpus
+		if not isinstance(target, bytes):
+			target = seedHash(self.fitPacked(target)[0])
+		# Stored as S16, which drops trailing null bytes on the way out
+		target = np.array(target, dtype=columns['hash'])[()]
+		if self.hashIndex is None:
+			# Sorted once per batch of appends, then binary searched
+			order = np.argsort(self.mapped('hash'), kind='stable')
+			self.hashIndex = (order, self.mapped('hash')[order])
+		order, sortedHashes = self.hashIndex
+		position = np.searchsorted(sortedHashes, target)
+		if position < self.count and sortedHashes[position] == target:
+			return int(order[position])
+		return None
+	def best(self, count=10, key='fitness'):
+		# Returns the indices of the rows with the highest values in a column
+		values = self.mapped(key)
+		count = min(count, self.count)
+		if count == 0: return np.zeros(0, dtype=np.int64)
+		top = np.argpartition(-values, count - 1)[:count]
+		return top[np.argsort(-values[top], kind='stable')]
+	def exportPlaintext(self, index, path):
+		# Writes the seed in the given row out as a Plaintext file
+		info = self.row(index)
+		comments = [" seed: " + info['hash'].hex(),
+				" Exported from the seed corpus " + self.path + ", row " + str(index)]
+		if info['duration'] >= 0: comments.append(" Runtime: " + str(info['duration']) + " iterations")
+		if info['fitness'] >= 0: comments.append(" Stability (density/time): " + str(info['fitness']))
+		if info['population'] >= 0: comments.append(" Final population: " + str(info['population']))
+		if info['period'] >= 0: comments.append(" Period: " + str(info['period']))
+		return patternIO.writePattern(path, self.seed(index), comments, 'plaintext')
+	def close(self):
+		# Releases the memory maps
+		self.maps = {}
+		self.hashIndex = None
+
+def main(args=None):
+	cmdArgs = argparse.ArgumentParser(description="Inspects a seed corpus and exports seeds from it.")
+	cmdArgs.add_argument('corpus', type=str, help="The corpus directory.")
+	cmdArgs.add_argument('-n', '--top', type=int, default=10, help="Lists this many of the fittest seeds.")
+	cmdArgs.add_argument('--sort', type=str, default='fitness', choices=[name for name in columns if name != 'hash'], help="Sets the column the listing is ranked by.")
+	cmdArgs.add_argument('--export', type=str, default=None, help="Exports the seed with this hash (or row number) as Plaintext.")
+	cmdArgs.add_argument('-o', '--output', type=str, default=None, help="Sets the file the exported seed is written to.")
+	cmdArgs.add_argument('--import', dest='source', type=str, default=None, help="Adds the patterns from a file or directory; their results are left unset (-1).")
+	cmdArgs.add_argument('--shape', type=int, nargs=2, default=None, help="Sets the seed rows and columns when creating a corpus.")
+	argVals = cmdArgs.parse_args(args)
+	corpus = SeedCorpus(argVals.corpus, argVals.shape)
+	if argVals.source is not None:
+		seeds = [pattern.seed for pattern in patternIO.iterPatterns(argVals.source)]
+		corpus.append(seeds, np.full(len(seeds), -1), np.full(len(seeds), -1))
+		print("Imported", len(seeds), "seeds")
+	if argVals.export is not None:
+		if argVals.export.isdigit(): index = int(argVals.export)
+		else: index = corpus.find(bytes.fromhex(argVals.export))
+		if index is None:
+			print("No seed with hash", argVals.export)
+			return
+		print("Wrote", corpus.exportPlaintext(index, argVals.output or argVals.export[:8] + '.txt'))
+		return
+	print(len(corpus), "seeds of", str(corpus.seedShape[0]) + 'x' + str(corpus.seedShape[1]))
+	for index in corpus.best(argVals.top, argVals.sort):
+		info = corpus.row(index)
+		print(str(index).rjust(8), info['hash'].hex(), "fitness:", info['fitness'], "duration:", info['duration'],
+				"population:", info['population'], "period:", info['period'])
+
+if __name__ == "__main__":
+	main()
+# EOF
@@ -0,0 +1,284 @@
+# seedEnumerator.py
+
+# Exhaustively evaluates every NxN seed, as ground truth for the generators.
+# Seeds are numbered by their bits (tile r, c is bit r * N + c), so the whole
+# space is the range 1 .. 2^(N*N) - 1. Only one seed from every family of
+# translations, rotations and reflections is simulated: the one that is
+# pushed against the top-left corner and has the smallest number among its
+# 8 symmetric variants. On the square torus the rest of the family behaves
+# identically (see fitnessCache), so nothing is lost.
+# The range is split into shards that are evaluated in batches. Each shard's
+# results go to their own .npz file in the output directory once the shard
+# is done, so an interrupted run picks up where it left off, and several
+# processes (or several invocations sharing the directory) can split the
+# work between them by claiming shards with lock files as they reach them.
+# A claim names the host and process that holds it, and claims of dead
+# processes on the same machine are taken over.
+# The folder's manifest.json records the seed width, shard count and
+# simulation settings it was started with; a run with different ones is
+# refused rather than mixing shards that cover other ranges or were scored
+# another way.
+
+import argparse
+import glob
+import json
+import os
+import socket
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import seedTester as st
+import gameUtils
+import seedCorpus
+
+def seedsFromNumbers(numbers, width):
+	# Turns an array of seed numbers into a (count, width, width) bool array
+	bits = (numbers[:, None] >> np.arange(width * width, dtype=np.int64)) & 1
+	return bits.reshape(-1, width, width).astype(bool)
+
+def numbersFromSeeds(seeds, width):
+	# The inverse of seedsFromNumbers
+	powers = np.int64(1) << np.arange(width * width, dtype=np.int64)
+	return seeds.reshape(len(seeds), -1).astype(np.int64) @ powers
+
+def shiftedNumbers(seeds, width):
+	# Returns the numbers of the seeds once pushed into the top-left corner
+	# With row-major bit numbering that is a single right shift: the empty
+	# leading rows and columns drop off the low end
+	numbers = numbersFromSeeds(seeds, width)
+	firstRow = seeds.any(axis=2).argmax(axis=1)
+	firstCol = seeds.any(axis=1).argmax(axis=1)
+	return numbers >> (firstRow * width + firstCol)
+
+def canonicalMask(numbers, width):
+	# Returns a bool array marking the seed numbers that represent their
+	# translation/rotation/reflection family
+	seeds = seedsFromNumbers(numbers, width)
+	# Translation: the top row and left column must both hold live tiles
+	keep = seeds[:, 0, :].any(axis=1) & seeds[:, :, 0].any(axis=1)
+	for turns in range(4):
+		rotated = np.rot90(seeds, turns, axes=(1, 2))
+		for variant in (rotated, rotated.transpose(0, 2, 1)):
+			keep &= numbers <= shiftedNumbers(variant, width)
+	return keep
+
+def shardBounds(shard, shardCount, width):
+	# Returns the [start, stop) range of seed numbers in the given shard
+	total = 1 << (width * width)
+	return (1 + (total - 1) * shard // shardCount, 1 + (total - 1) * (shard + 1) // shardCount)
+
+def scoreResults(results):
+	# Turns runSimulation results into metadata columns, scoring them the same
+	# way the generators do: stability is final density over duration
+	duration = np.array([len(result[1]) for result in results], dtype=np.int32)
+	population = np.array([result[0][0] for result in results], dtype=np.int32)
+	worldSize = results[0][0][1] if results else 1
+	period = np.array([result[2][0] if len(result) > 2 and result[2] is not None else -1 for result in results], dtype=np.int32)
+	return {'fitness': population / worldSize / duration, 'duration': duration,
+			'population': population, 'period': period}
+
+def shardPath(folder, shard):
+	return os.path.join(folder, 'shard-' + str(shard).zfill(5) + '.npz')
+
+manifestName = 'manifest.json'
+
+def checkManifest(folder, layout):
+	# Records the layout (seed width, shard count and simulation settings) in
+	# a new folder, or checks that an existing folder was started with the
+	# same one; returns the folder's layout
+	manifestPath = os.path.join(folder, manifestName)
+	if not os.path.exists(manifestPath):
+		# Runs starting together in an empty folder race to write it; the
+		# first link wins and the others check against it below
+		temporary = manifestPath + '.' + str(os.getpid()) + '.tmp'
+		with open(temporary, 'w') as target:
+			json.dump(layout, target, indent=1)
+		try:
+			os.link(temporary, manifestPath)
+		except FileExistsError:
+			pass
+		os.remove(temporary)
+	with open(manifestPath) as source:
+		return json.load(source)
+
+def claimOwner():
+	# Identifies this process in the claim files it writes
+	return socket.gethostname() + ' ' + str(os.getpid())
+
+def claimIsStale(owner):
+	# True if the claim was written by a process on this machine that is gone
+	# Claims from other machines cannot be checked, so they are never stale
+	host, _, pid = owner.strip().partition(' ')
+	if host != socket.gethostname() or not pid.isdigit(): return False
+	try:
+		os.kill(int(pid), 0)
+	except ProcessLookupError:
+		return True
+	except PermissionError:
+		pass # alive, but someone else's
+	return False
+
+def claimShard(folder, shard):
+	# Atomically claims a shard for this process, writing its host and PID
+	# into the claim file; False if the shard is done or held by a live run
+	# A claim left by a dead process on this machine is taken over. Two runs
+	# taking over the same stale claim at once can at worst evaluate the
+	# shard twice, which is harmless: both write identical results.
+	claimPath = shardPath(folder, shard) + '.claim'
+	for attempt in range(2):
+		if os.path.exists(shardPath(folder, shard)): return False
+		try:
+			descriptor = os.open(claimPath, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+		except FileExistsError:
+			try:
+				with open(claimPath) as source:
+					owner = source.read()
+			except FileNotFoundError:
+				continue # released meanwhile
+			# An empty claim may still be being written by its owner
+			if not owner or not claimIsStale(owner): return False
+			try:
+				os.remove(claimPath)
+			except FileNotFoundError:
+				pass
+			continue
+		with os.fdopen(descriptor, 'w') as target:
+			target.write(claimOwner())
+		return True
+	return False
+
+def runShard(folder, shard, shardCount, width, batchSize, simArgs):
+	# Evaluates every canonical seed in a shard and saves the results
+	# Returns the number of seeds that were simulated
+	start, stop = shardBounds(shard, shardCount, width)
+	found = {'number': [], 'fitness': [], 'duration': [], 'population': [], 'period': []}
+	# Candidates are pruned a block at a time; survivors fill up the batches
+	blockSize = max(batchSize, 1 << 16)
+	for blockStart in range(start, stop, blockSize):
+		numbers = np.arange(blockStart, min(blockStart + blockSize, stop), dtype=np.int64)
+		numbers = numbers[canonicalMask(numbers, width)]
+		for batchStart in range(0, len(numbers), batchSize):
+			batch = numbers[batchStart:batchStart + batchSize]
+			results = st.runSimulationBatch(list(seedsFromNumbers(batch, width)), **simArgs)
+			found['number'].append(batch)
+			for name, values in scoreResults(results).items():
+				found[name].append(values)
+	dtypes = {'number': np.int64, 'fitness': np.float64, 'duration': np.int32, 'population': np.int32, 'period': np.int32}
+	arrays = {name: np.concatenate(values) if values else np.zeros(0, dtype=dtypes[name]) for name, values in found.items()}
+	arrays['bounds'] = np.array([start, stop], dtype=np.int64)
+	# Write under a temporary name so a shard file is only ever complete
+	temporary = shardPath(folder, shard) + '.' + str(os.getpid()) + '.tmp.npz'
+	np.savez(temporary, **arrays)
+	os.replace(temporary, shardPath(folder, shard))
+	try:
+		os.remove(shardPath(folder, shard) + '.claim')
+	except FileNotFoundError:
+		pass
+	return len(arrays['number'])
+
+def claimAndRunShard(folder, shard, shardCount, width, batchSize, simArgs):
+	# Claims the shard just before evaluating it, so that other runs can
+	# take any shard this one has not reached yet
+	# Returns the number of seeds simulated, or None if the shard was taken
+	if not claimShard(folder, shard): return None
+	return runShard(folder, shard, shardCount, width, batchSize, simArgs)
+
+def discardStaleShards(folder, shardCount, width):
+	# Removes shard files that do not cover their range in the current
+	# layout, left by a run with other settings from before the manifest
+	for path in glob.glob(os.path.join(folder, 'shard-*[0-9].npz')):
+		shard = int(os.path.basename(path)[len('shard-'):-len('.npz')])
+		with np.load(path) as saved:
+			stale = shard >= shardCount or tuple(saved['bounds']) != shardBounds(shard, shardCount, width)
+		if stale:
+			print("Discarding", path, "- it covers a different range than this layout's shard", shard)
+			os.remove(path)
+
+def loadShards(folder, shards):
+	# Merges the given finished shards in the folder into one dict of columns
+	merged = {}
+	for shard in shards:
+		path = shardPath(folder, shard)
+		if not os.path.exists(path): continue
+		with np.load(path) as saved:
+			for name in ('number', 'fitness', 'duration', 'population', 'period'):
+				merged.setdefault(name, []).append(saved[name])
+	return {name: np.concatenate(values) for name, values in merged.items()}
+
+def rankTable(merged, width, count):
+	# Returns the lines of a table of the fittest seeds
+	order = np.argsort(-merged['fitness'], kind='stable')[:count]
+	lines = ['rank'.rjust(5) + 'seed'.rjust(12) + 'stability'.rjust(24) + 'duration'.rjust(10)
+			+ 'population'.rjust(12) + 'period'.rjust(8)]
+	for rank, index in enumerate(order):
+		lines.append(str(rank + 1).rjust(5) + hex(int(merged['number'][index])).rjust(12)
+				+ str(merged['fitness'][index]).rjust(24) + str(merged['duration'][index]).rjust(10)
+				+ str(merged['population'][index]).rjust(12) + str(merged['period'][index]).rjust(8))
+	return lines
+
+def main(args=None):
+	cmdArgs = argparse.ArgumentParser(description="Evaluates every NxN seed, skipping symmetric and translated duplicates.")
+	cmdArgs.add_argument('-n', '--width', type=int, default=4, help="Sets the side length of the seeds to enumerate.")
+	cmdArgs.add_argument('-o', '--output', type=str, default=None, help="Sets the folder for shard results (default: enumeration-N).")
+	cmdArgs.add_argument('--shards', type=int, default=64, help="Splits the seed space into this many resumable shards.")
+	cmdArgs.add_argument('-w', '--workers', type=int, default=1, help="Sets the number of worker processes (0 uses every core).")
+	cmdArgs.add_argument('-b', '--batch', type=int, default=4096, help="Sets the number of seeds stepped together.")
+	cmdArgs.add_argument('-s', '--size', type=int, default=10, help="Sets the side length of the game world.")
+	cmdArgs.add_argument('-t', '--time', type=int, default=1000, help="Sets the maximum number of generations per seed.")
+	cmdArgs.add_argument('--halt', type=str, default='stability', choices=st.haltModes, help="Sets how the simulation decides that a seed has settled.")
+	cmdArgs.add_argument('-r', '--rule', type=gameUtils.ruleNotation, default=gameUtils.defaultRule, help="Sets the Life-like rule in B/S notation (eg B36/S23) or by name.")
+	cmdArgs.add_argument('--top', type=int, default=20, help="Sets the number of seeds in the ranked table.")
+	cmdArgs.add_argument('--reclaim', action='store_true', help="Releases every shard claim, including those of runs on other machines (dead local runs are released automatically).")
+	cmdArgs.add_argument('--corpus', type=str, default=None, help="Also writes every evaluated seed to this seed corpus directory.")
+	argVals = cmdArgs.parse_args(args)
+	width = argVals.width
+	assert width * width < 63, "Seeds this wide do not fit in a 64-bit seed number!"
+	folder = argVals.output or 'enumeration-' + str(width)
+	os.makedirs(folder, exist_ok=True)
+	if argVals.reclaim:
+		for claim in glob.glob(os.path.join(folder, '*.claim')): os.remove(claim)
+	simArgs = {'sideLength': argVals.size, 'maxDuration': argVals.time, 'haltMode': argVals.halt, 'rule': argVals.rule}
+	layout = dict(width=width, shards=argVals.shards, **simArgs)
+	existing = checkManifest(folder, layout)
+	if existing != layout:
+		changed = ", ".join(name + " " + str(existing.get(name)) + " (not " + str(value) + ")" for name, value in layout.items() if existing.get(name) != value)
+		cmdArgs.error(folder + " holds an enumeration with " + changed + "; use another --output folder or the same settings")
+	discardStaleShards(folder, argVals.shards, width)
+	# Each shard is only claimed when a worker gets to it
+	shards = [shard for shard in range(argVals.shards) if not os.path.exists(shardPath(folder, shard))]
+	print(len(shards), "of", argVals.shards, "shards of the", str(width) + 'x' + str(width), "seed space are left to evaluate")
+	jobArgs = (argVals.shards, width, argVals.batch, simArgs)
+	workers = argVals.workers or os.cpu_count()
+	if workers > 1:
+		with ProcessPoolExecutor(max_workers=workers) as executor:
+			jobs = [executor.submit(claimAndRunShard, folder, shard, *jobArgs) for shard in shards]
+			outcomes = [job.result() for job in jobs]
+	else:
+		outcomes = [claimAndRunShard(folder, shard, *jobArgs) for shard in shards]
+	taken = outcomes.count(None)
+	print("Simulated", sum(outcome for outcome in outcomes if outcome is not None), "seeds in", len(shards) - taken, "shards")
+	if shards and taken == len(shards):
+		print("WARNING: every unfinished shard is claimed by another run. If that run is not going on (eg it was on another machine and was killed), rerun with --reclaim")
+	elif taken:
+		print(taken, "shards were claimed by other runs")
+	merged = loadShards(folder, range(argVals.shards))
+	finished = sum(os.path.exists(shardPath(folder, shard)) for shard in range(argVals.shards))
+	if finished < argVals.shards:
+		print("Only", finished, "of", argVals.shards, "shards are finished; the table is partial")
+	if not merged:
+		return
+	print('\n'.join(rankTable(merged, width, argVals.top)))
+	if argVals.corpus is not None:
+		# Only the shards finished by this run, so that rerunning (or
+		# resuming) an enumeration never adds a seed to the corpus twice
+		fresh = loadShards(folder, [shard for shard, outcome in zip(shards, outcomes) if outcome is not None])
+		if not fresh:
+			print("No new seeds to add to", argVals.corpus)
+			return
+		corpus = seedCorpus.SeedCorpus(argVals.corpus, (width, width))
+		corpus.append(seedsFromNumbers(fresh['number'], width), fresh['fitness'], fresh['duration'],
+				fresh['population'], fresh['period'])
+		print("Added", len(fresh['number']), "seeds to", argVals.corpus)
+
+if __name__ == "__main__":
+	main()
+# EOF
@@ -10,53 +10,93 @@
 
 # EXTERNALIA
 import argparse
-import random as rng
+import csv
+import glob
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 import numpy as np
-import matplotlib.pyplot as plt
 import gameUtils # The custom set of GoL tools
+import instrument
+import liveView
+import patternIO
+import seedCorpus
 
 # PRIMITIVES
-fullKernel = [[1, 1, 1], [1, 0, 1], [1, 1, 1]]
-#orthoKernel = [[0, 1, 0], [1, 0, 1], [0, 1, 0]] #note: untested
+fullKernel = gameUtils.fullKernel
+haltModes = ('stability', 'cycle')
+orthoKernel = gameUtils.orthoKernel
 
-def runSimulation(seed, sideLength=10, maxDuration=1000):
+def runSimulation(seed, sideLength=10, maxDuration=1000, engine='convolve', haltMode='stability', preallocate=False, statsLog=None, rule=None, viewer=None):
 	# Performs a GoL simulation run using the inputs
 	# The seed should be a numpy matrix of boolean/binary values
+	# The engine names one of the stepping backends in gameUtils.engines
+	# The haltMode is one of haltModes: 'stability' uses the moving average of
+	# the stability rates, 'cycle' halts as soon as the world repeats itself
+	# With preallocate set, the world steps between two fixed state buffers
+	# and the stability rates go into a StabilityTrace, so the loop does not
+	# allocate new matrices or lists as it runs
+	# The rule is a gameUtils.LifeRule or its B/S notation (eg 'B36/S23'),
+	# gameUtils.defaultRule (B2/S23) if not given
+	# If statsLog is a list, the gameUtils.StepStats of every generation
+	# (births, deaths, changed tiles...) is appended to it as the run goes
+	# If a liveView.LiveViewer is given, the world is offered to it every
+	# generation; it only takes as many frames as it can draw
 	# WARN: The seed will NOT be reshaped! Flattened arrays produce flat seeds
 	#print(seed)
 	#print(seed.shape)
 	assert seed.shape[0] < sideLength, "Seed is too big for the game world!"
 	assert seed.shape[1] < sideLength, "Seed is too big for the game world!"
-	# FIXME: allow realtime display of the simulation
 	# Returns the vital stats of the simulation run:
 	#	a tuple containing the live cell counts and world size (produces density)
 	#	the set of stability rates generated across the sim lifetime
+	#	in 'cycle' mode only: the detected cycle as (period, (row shift,
+	#	col shift)), or None
+	assert haltMode in haltModes, "Unknown halt mode: " + str(haltMode)
 	# Setting the kernel is equivalent to choosing which neighbors will be
-	# counted when convolving the world state
-	# FIXME: allow selection of other rulesets (kernels)
-	kernel = fullKernel
+	# counted when convolving the world state; the rule picks it
+	rule = gameUtils.parseRule(rule)
+	kernel = rule.kernel
 	# Initialize a new game
-	currentWorld = gameUtils.GameOfLife(seed, sideLength)
+	currentWorld = gameUtils.engines[engine](seed, sideLength, rule=rule)
 	# Begin the simulation process
 	convolutions = 0
 	stabilityRates = []
+	if preallocate:
+		currentWorld.allocateBuffers()
+		stabilityRates = StabilityTrace(maxDuration)
 	stabilityRates.append(calcStability(currentWorld, 1))
 	stabilityDelta = 0.0005 # FIXME: add this to CLI args
+	# NOTE: previousStability is never updated, so the 'stability' mode halts
+	# once the ten-sample average itself drops below stabilityDelta; use the
+	# 'cycle' mode for exact termination
 	previousStability = 0
+	cycle = None
+	if haltMode == 'cycle':
+		detector = gameUtils.CycleDetector(sideLength)
+		detector.check(currentWorld.state, 0)
+	if viewer is not None: viewer.offer(currentWorld, 0)
 	#print("Running simulation...") # DEBUG
 	for step in range(1, maxDuration):
 		#print("Iteration: ", step, "/", maxDuration, end='\r') # DEBUG
-		neighborMx = currentWorld.convolve(kernel)
+		currentWorld.step(kernel)
 		convolutions += 1
-		newState = currentWorld.applyConwayRules(neighborMx)
-		# Update to the new world state
-		currentWorld.state = newState
+		if statsLog is not None: statsLog.append(currentWorld.stepStats())
+		if viewer is not None: viewer.offer(currentWorld, step)
 		# Check the current stability and chart it
 		stabilityRates.append(calcStability(currentWorld, convolutions))
+		if haltMode == 'cycle':
+			if detector.check(currentWorld.state, step):
+				cycle = (detector.period, detector.displacement)
+				break
 		# calc the new stability average and check the rate of change on the
 		# last ten stability rates
-		if len(stabilityRates) > 10:
-			averageStability = sum(stabilityRates[-10:-1]) / 10
+		elif len(stabilityRates) > 10:
+			if preallocate: averageStability = stabilityRates.average()
+			else: averageStability = sum(stabilityRates[-10:-1]) / 10
 			if abs(averageStability - previousStability) < stabilityDelta:
 				break
 		# If the world's become unstable, then halt
@@ -66,7 +106,192 @@ def runSimulation(seed, sideLength=10, maxDuration=1000):
 		if currentWorld.calcDensity() > 0.9998:
 			break
 	#print("Simulation has finished") # DEBUG
-	return ((currentWorld.qtyLive, currentWorld.worldSize), stabilityRates)
+	if viewer is not None: viewer.offer(currentWorld, convolutions, final=True)
+	if preallocate: stabilityRates = stabilityRates.toList()
+	if haltMode != 'cycle': return ((currentWorld.qtyLive, currentWorld.worldSize), stabilityRates)
+	return ((currentWorld.qtyLive, currentWorld.worldSize), stabilityRates, cycle)
+
+class StabilityTrace:
+	# Preallocated record of the stability rates, used by runSimulation
+	# The rates are written into an array sized for the longest run, and the
+	# most recent ones also go into a fixed-size ring buffer so the moving
+	# average never has to slice the record
+	def __init__(self, maxDuration, windowSize=10):
+		self.rates = np.zeros(maxDuration)
+		self.window = [0.0] * windowSize
+		self.length = 0
+	def __len__(self):
+		return self.length
+	def append(self, rate):
+		self.rates[self.length] = rate
+		self.window[self.length % len(self.window)] = rate
+		self.length += 1
+	def average(self):
+		# Same as sum(rates[-10:-1]) / 10 on a list: every sample in the
+		# window except the newest, oldest first, over the window size
+		size = len(self.window)
+		total = 0
+		for back in range(size - 1, 0, -1):
+			total += self.window[(self.length - 1 - back) % size]
+		return total / size
+	def toList(self):
+		return self.rates[:self.length].tolist()
+
+def runSimulationBatch(seeds, sideLength=10, maxDuration=1000, haltMode='stability', rule=None):
+	# Performs a GoL simulation run for every seed in the given list at once
+	# All of the worlds are stacked into a single (N, side, side) array and
+	# stepped together; each world halts under the same conditions as
+	# runSimulation, after which it is dropped from the stack
+	# Returns a list with one runSimulation-style result per seed:
+	#	((live cell count, world size), [stability rates]), plus the cycle
+	#	in 'cycle' mode
+	assert haltMode in haltModes, "Unknown halt mode: " + str(haltMode)
+	rule = gameUtils.parseRule(rule)
+	seeds = list(seeds)
+	for seed in seeds:
+		assert seed.shape[0] < sideLength, "Seed is too big for the game world!"
+		assert seed.shape[1] < sideLength, "Seed is too big for the game world!"
+	worldSize = sideLength ** 2
+	stabilityDelta = 0.0005 # FIXME: add this to CLI args
+	previousStability = 0
+	if not seeds: return []
+	states = np.stack([gameUtils.placeSeed(seed, sideLength) for seed in seeds])
+	qtyLive = np.count_nonzero(states, axis=(1, 2))
+	# The moving average reads the last ten rates of each world from a ring
+	# buffer, as StabilityTrace does; the full record is kept as one array of
+	# the running worlds' rates per generation, so it only grows with the
+	# generations actually run
+	windowSize = 10
+	window = np.zeros((len(seeds), windowSize))
+	window[:, 0] = qtyLive / worldSize / 1
+	history = [(np.arange(len(seeds)), window[:, 0].copy())]
+	# The indices of the worlds that are still running, in stack order
+	active = np.arange(len(seeds))
+	cycles = [None] * len(seeds)
+	if haltMode == 'cycle':
+		detectors = [gameUtils.CycleDetector(sideLength) for seed in seeds]
+		for index in active: detectors[index].check(states[index], 0)
+	for step in range(1, maxDuration):
+		states = gameUtils.stepBatch(states, rule)
+		liveCounts = np.count_nonzero(states, axis=(1, 2))
+		qtyLive[active] = liveCounts
+		density = liveCounts / worldSize
+		rates = density / step
+		window[active, step % windowSize] = rates
+		history.append((active, rates))
+		halted = (liveCounts == 0) | (density > 0.9998)
+		if haltMode == 'cycle':
+			for position, index in enumerate(active):
+				if detectors[index].check(states[position], step):
+					cycles[index] = (detectors[index].period, detectors[index].displacement)
+					halted[position] = True
+		elif step + 1 > 10:
+			# Sum in the same order as runSimulation so the averages match
+			averageStability = 0
+			for sample in range(step - 9, step):
+				averageStability = averageStability + window[active, sample % windowSize]
+			averageStability = averageStability / 10
+			halted |= abs(averageStability - previousStability) < stabilityDelta
+		if halted.any():
+			states = states[~halted]
+			active = active[~halted]
+			if not len(active): break
+	stabilityRates = [[] for seed in seeds]
+	for indices, rates in history:
+		for index, rate in zip(indices.tolist(), rates.tolist()):
+			stabilityRates[index].append(rate)
+	if haltMode != 'cycle':
+		return [((int(qtyLive[index]), worldSize), stabilityRates[index]) for index in range(len(seeds))]
+	return [((int(qtyLive[index]), worldSize), stabilityRates[index], cycles[index])
+			for index in range(len(seeds))]
+
+# Parallel evaluation
+# A SimulationPool keeps a set of long-lived worker processes around, so the
+# numpy/scipy imports are paid once per worker rather than once per task.
+# Seeds are split into chunks and each chunk runs as a single batch; results
+# always come back in the order the seeds were given, so a fixed RNG seed in
+# the caller produces the same run no matter how many workers are used.
+def initWorker():
+	# Warms up a freshly started worker by running a throwaway simulation
+	runSimulation(np.zeros((1, 1), dtype=bool), 3, 2)
+
+# The simulation options a SimulationPool passes along; statsLog and viewer
+# follow a single simulation, so they only go to runSimulation directly
+poolArgs = ('sideLength', 'maxDuration', 'engine', 'haltMode', 'preallocate', 'rule')
+
+def checkPoolArgs(simArgs):
+	# Raises a TypeError for options a SimulationPool cannot pass along
+	unsupported = sorted(key for key in simArgs if key not in poolArgs)
+	if unsupported:
+		raise TypeError("SimulationPool does not take " + ', '.join(unsupported) + "; call runSimulation for each seed instead")
+
+def simulateChunk(seeds, simArgs):
+	# Evaluates one chunk of seeds inside a worker
+	# Batching only covers the default engine without preallocation, so
+	# anything else runs singly
+	if simArgs.get('engine', 'convolve') != 'convolve' or simArgs.get('preallocate'):
+		return [runSimulation(seed, **simArgs) for seed in seeds]
+	simArgs = {key: value for key, value in simArgs.items() if key not in ('engine', 'preallocate')}
+	return runSimulationBatch(seeds, **simArgs)
+
+class SimulationPool:
+	# Evaluates lists of seeds across a pool of worker processes
+	# workers: the number of processes; 0 uses every core, 1 stays in-process
+	# chunkSize: the number of seeds sent to a worker at a time
+	def __init__(self, workers=1, chunkSize=None):
+		if not workers: workers = os.cpu_count()
+		self.workers = workers
+		self.chunkSize = chunkSize
+		self.executor = None
+		if workers > 1:
+			self.executor = ProcessPoolExecutor(max_workers=workers, initializer=initWorker)
+	def evaluate(self, seeds, **simArgs):
+		# Returns the runSimulation results for every seed, in order
+		# Keyword args are passed along to the simulation (see poolArgs)
+		checkPoolArgs(simArgs)
+		seeds = list(seeds)
+		if self.executor is None:
+			return simulateChunk(seeds, simArgs)
+		# By default give every worker a few chunks to balance the load
+		chunkSize = self.chunkSize or max(1, -(-len(seeds) // (self.workers * 4)))
+		chunks = [seeds[index:index + chunkSize] for index in range(0, len(seeds), chunkSize)]
+		results = []
+		for chunkResults in self.executor.map(simulateChunk, chunks, [simArgs] * len(chunks)):
+			results.extend(chunkResults)
+		return results
+	def stream(self, seeds, **simArgs):
+		# Yields (position, result) for every seed as soon as its chunk is
+		# done, in whatever order the chunks finish
+		# The seeds may be any iterable: it is read lazily, a chunk at a time,
+		# with only a few chunks per worker in flight
+		checkPoolArgs(simArgs)
+		chunkSize = self.chunkSize or 8
+		numbered = enumerate(seeds)
+		chunks = iter(lambda: list(itertools.islice(numbered, chunkSize)), [])
+		if self.executor is None:
+			for chunk in chunks:
+				positions, batch = zip(*chunk)
+				yield from zip(positions, simulateChunk(list(batch), simArgs))
+			return
+		inFlight = {}
+		for chunk in itertools.chain(chunks, [None]):
+			if chunk is not None:
+				positions, batch = zip(*chunk)
+				inFlight[self.executor.submit(simulateChunk, list(batch), simArgs)] = positions
+			# Wait for room, or at the end for everything
+			while inFlight and (chunk is None or len(inFlight) >= self.workers * 2):
+				done, pending = wait(inFlight, return_when=FIRST_COMPLETED)
+				for future in done:
+					yield from zip(inFlight.pop(future), future.result())
+	def close(self):
+		# Shuts down the worker processes
+		if self.executor is not None:
+			self.executor.shutdown()
+			self.executor = None
+	def __enter__(self):
+		return self
+	def __exit__(self, *excInfo):
+		self.close()
 
 def checkStability(target, currentTurn):
 	# Counts the number of living tiles in the game world to assess the
@@ -97,7 +322,7 @@ def strToSeed(seedStr, width):
 	for index in range(size):
 		if seedStr[index] == '1': seedMx[index] = True # binary True
 		if seedStr[index] == 'O': seedMx[index] = True # Plaintext LIVE
-	seedMx = np.reshape(seedMx, (width, height))
+	seedMx = np.reshape(seedMx, (height, width))
 	return seedMx
 
 def displayResults(target):
@@ -107,59 +332,143 @@ def displayResults(target):
 	for line in finalState:
 		print(line)
 
+# Batch evaluation from the command line
+recordFields = ('source', 'name', 'rows', 'cols', 'hash', 'stability', 'duration', 'population', 'density', 'period', 'error')
+recordFormats = ('jsonl', 'csv')
+
+def iterSeeds(sources, corpusPath=None):
+	# Yields (source, name, seed or None, error or None) for every pattern
+	# in the given files, directories and glob patterns, then every seed in
+	# the corpus; a source that cannot be read yields a single error entry
+	for source in sources:
+		paths = [source]
+		if os.path.isdir(source):
+			paths = patternIO.iterPatternFiles(source)
+		elif not os.path.exists(source) and glob.has_magic(source):
+			paths = sorted(glob.glob(source, recursive=True))
+			if not paths: yield (source, source, None, "no files match")
+		for path in paths:
+			try:
+				for pattern in patternIO.iterPatterns(path):
+					yield (path, pattern.name, pattern.seed, None)
+			except (OSError, ValueError) as problem:
+				yield (path, path, None, str(problem))
+	if corpusPath is not None:
+		corpus = seedCorpus.SeedCorpus(corpusPath)
+		for index in range(len(corpus)):
+			yield (corpusPath, str(index), corpus.seed(index), None)
+
+def makeRecord(source, name, seed, result=None, error=None):
+	# Returns the output record of one seed: its simulation result, scored
+	# the same way the generators score it, or the error that stopped it
+	record = dict.fromkeys(recordFields)
+	record.update(source=source, name=name, error=error)
+	if seed is not None:
+		record.update(rows=seed.shape[0], cols=seed.shape[1], hash=seedCorpus.seedHash(seed).hex())
+	if result is not None:
+		(population, worldSize), stabilityRates = result[:2]
+		cycle = result[2] if len(result) > 2 else None
+		density = population / worldSize
+		record.update(stability=density / len(stabilityRates), duration=len(stabilityRates),
+				population=population, density=density, period=cycle[0] if cycle is not None else None)
+	return record
+
+class RecordWriter:
+	# Writes records to a stream as JSON lines or CSV rows, flushing after
+	# each one so that a pipe sees it straight away
+	def __init__(self, output, format='jsonl'):
+		assert format in recordFormats, "Unknown record format: " + str(format)
+		self.output = output
+		self.csv = None
+		if format == 'csv':
+			self.csv = csv.DictWriter(output, recordFields)
+			self.csv.writeheader()
+	def write(self, record):
+		if self.csv is None: self.output.write(json.dumps(record) + '\n')
+		else: self.csv.writerow(record)
+		self.output.flush()
+
+def evaluateAll(argVals, simArgs, seeds, waiting, emit):
+	# Simulates the seeds, in parallel unless they are being watched, and
+	# emits each one's record as soon as it is done
+	# waiting maps each seed's position to its (source, name, seed)
+	if argVals.view is not None:
+		for position, seed in enumerate(seeds):
+			source, name, seed = waiting.pop(position)
+			with liveView.LiveViewer(argVals.view, argVals.fps, title=name) as viewer:
+				result = runSimulation(seed, viewer=viewer, **simArgs)
+			emit(makeRecord(source, name, seed, result))
+			print("Live view:", viewer.sent, "frames sent,", viewer.drawn, "drawn,", viewer.dropped, "dropped", file=sys.stderr)
+	else:
+		with SimulationPool(argVals.workers, argVals.chunk) as pool:
+			for position, result in pool.stream(seeds, **simArgs):
+				source, name, seed = waiting.pop(position)
+				emit(makeRecord(source, name, seed, result))
+
 # MAIN
-def main():
+def main(args=None):
 	# Allows running this program as a CLI tool, for script automation
 	# Process command line argVals
-	cmdArgs = argparse.ArgumentParser(description="Runs Conway's Game of Life, given an initial seed configuration.",
+	cmdArgs = argparse.ArgumentParser(description="Runs Conway's Game of Life on seed files, printing one result record per seed as each finishes.",
 			epilog="See the README for information about the seed file specification.")
-	cmdArgs.add_argument('seedFile', type=str, help="the file that contains the initial seed")
+	cmdArgs.add_argument('seedFiles', type=str, nargs='*', help="seed files, directories of them, or glob patterns (eg 'patterns/**/*.rle')")
+	cmdArgs.add_argument('--corpus', type=str, default=None, help="also evaluates every seed in this seed corpus directory")
 	cmdArgs.add_argument('-s', '--size', type=int, default=100, help="sets the side length of the world grid")
 	cmdArgs.add_argument('-t', '--time', type=int, default=100, help="sets the maximum number of turns to simulate")
-	# FIXME: add flag to print contents of initial seed at program start?
-	print("Initializing environment...")
-	argVals = cmdArgs.parse_args()
-	maxDuration = argVals.time
-	# FIXME: allow selection of other kernel matrices
-	kernel = fullKernel
-	# Initialize a new game
-	# FIXME: need to fix loading seeds from file for demo mode
-	# ie load the seed from file and THEN pass to the call below
-	#currentWorld = gameUtils.GameOfLife(argVals.seedFile, argVals.size)
-	assert currentWorld, "Sorry, this is broken right now :( "
-	# Begin the simulation process
-	convolutions = 0
-	stabilityRates = []
-	stabilityDelta = 0.0001 # FIXME: add this to CLI args
-	previousStability = 0
-	print("Running simulation...")
-	for step in range(1, maxDuration):
-		#print("Iteration: ", step, "/", maxDuration, end='\r') # DEBUG
-		neighborMx = currentWorld.convolve(kernel)
-		convolutions += 1
-		newState = currentWorld.applyConwayRules(neighborMx)
-		# Check the current stability and chart it
-		stabilityRates.append(calcStability(currentWorld, convolutions))
-		# Update to the new world state
-		currentWorld.state = newState
-		# If the world's become unstable, then halt
-		if stabilityRates[-1] < 0.0001 and step > 10:
-			# early termination due to extinction
-			break
-		if stabilityRates[-1] > 0.9998:
-		# termination due to overpopulation
-			break
-		# calc the new stability average and check the rate of change
-		if len(stabilityRates) > 10:
-			averageStability = sum(stabilityRates[-10:-1]) / 10
-			if abs(averageStability - previousStability) < stabilityDelta:
-				break
-	print("Simulation has finished")
-	#displayResults(currentWorld)
-	print("Final Results:")
-	print("Stability: ", stabilityRates[-1])
-	print("Density: ", currentWorld.calcDensity(), "(", currentWorld.qtyLive, "/", currentWorld.qtyDead, ")")
-	print("Runtime: ", convolutions, "iterations")
+	cmdArgs.add_argument('-r', '--rule', type=gameUtils.ruleNotation, default=gameUtils.defaultRule,
+			help="sets the Life-like rule in B/S notation (eg B3/S23, B36/S23, B2/S013V) or by name (" + ', '.join(gameUtils.namedRules) + ")")
+	cmdArgs.add_argument('--halt', type=str, default='stability', choices=haltModes, help="sets how the simulation decides that a seed has settled")
+	cmdArgs.add_argument('--engine', type=str, default='convolve', choices=list(gameUtils.engines), help="sets the stepping engine")
+	cmdArgs.add_argument('-w', '--workers', type=int, default=1, help="sets the number of worker processes (0 uses every core)")
+	cmdArgs.add_argument('--chunk', type=int, default=None, help="sets the number of seeds sent to a worker at a time")
+	cmdArgs.add_argument('-f', '--format', type=str, default='jsonl', choices=recordFormats, help="sets the format of the result records")
+	cmdArgs.add_argument('--view', type=str, default=None, choices=liveView.viewModes, help="watches each simulation live, in the terminal or a plot window (runs them one at a time)")
+	cmdArgs.add_argument('--fps', type=int, default=30, help="sets the most frames per second the live view draws")
+	instrument.addArguments(cmdArgs)
+	argVals = cmdArgs.parse_args(args)
+	instrument.startFromArguments(argVals)
+	if not argVals.seedFiles and argVals.corpus is None:
+		cmdArgs.error("give at least one seed file or a --corpus")
+	try:
+		gameUtils.engines[argVals.engine].validate(argVals.size, argVals.rule)
+	except ValueError as problem:
+		cmdArgs.error(str(problem) + " (see --engine, -r and -s)")
+	if argVals.view == 'ansi' and not sys.stderr.isatty():
+		# The frames go to stderr, leaving stdout to the records
+		cmdArgs.error("--view ansi draws on stderr, which is not a terminal")
+	simArgs = {'sideLength': argVals.size, 'maxDuration': argVals.time, 'haltMode': argVals.halt,
+			'engine': argVals.engine, 'rule': gameUtils.parseRule(argVals.rule)}
+	print("Rule:", simArgs['rule'], file=sys.stderr)
+	writer = RecordWriter(sys.stdout, argVals.format)
+	startTime = time.perf_counter()
+	counts = {'seeds': 0, 'errors': 0}
+	def emit(record):
+		counts['seeds'] += 1
+		if record['error'] is not None: counts['errors'] += 1
+		writer.write(record)
+	# Seeds that cannot be simulated are reported as they are read; the rest
+	# are handed on, remembering where each came from
+	waiting = {}
+	positions = itertools.count()
+	def simulable():
+		for source, name, seed, error in iterSeeds(argVals.seedFiles, argVals.corpus):
+			if error is None and (seed.shape[0] >= argVals.size or seed.shape[1] >= argVals.size):
+				error = "seed is too big for a " + str(argVals.size) + "x" + str(argVals.size) + " world"
+			if error is not None:
+				emit(makeRecord(source, name, seed, error=error))
+				continue
+			waiting[next(positions)] = (source, name, seed)
+			yield seed
+	try:
+		evaluateAll(argVals, simArgs, simulable(), waiting, emit)
+	except BrokenPipeError:
+		# The reader went away (eg head): stop quietly, and keep Python's own
+		# final flush from failing as well
+		os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+		sys.exit(1)
+	print("Evaluated", counts['seeds'], "seeds (" + str(counts['errors']) + " errors) in",
+			round(time.perf_counter() - startTime, 2), "s", file=sys.stderr)
+	if counts['errors']: sys.exit(1)
 
 # The self-invocation method
 if __name__ == "__main__":
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+
+# thresher.py
+
+# A single entry point for the Thresher's tools:
+#	thresher.py sim|ga|nn|bench|enum|corpus [options for that tool]
+# Only the chosen tool is imported, so asking one for -h costs little more
+# than starting Python.
+# For scripts that run many short jobs, a worker can keep the interpreter
+# and every tool's imports warm between them:
+#	thresher.py serve &
+#	thresher.py --connect sim patterns/testGlider.txt
+#	thresher.py stop
+# The worker listens on a local socket in a folder only its user can enter,
+# and clients must prove they can read the key it leaves beside the socket;
+# it forks a fresh copy of itself for every job, so jobs start
+# with their imports done but never see each other's module globals, and
+# several can run at once. A job's output is sent back and printed by the
+# client, which exits with the job's exit code. Output written straight to
+# file descriptors (eg by a job's own worker processes, or the ansi live
+# view) goes to the worker's terminal instead. If no worker is listening,
+# --connect fails rather than running the job somewhere it was not asked to.
+
+import argparse
+import importlib
+import io
+import os
+import stat
+import sys
+
+# command -> (module, what it does)
+commands = {
+	'sim': ('seedTester', "runs seed files through the simulator"),
+	'ga': ('geneticGenerator', "searches for stable seeds with a genetic algorithm"),
+	'nn': ('neuralNetwork', "searches for stable seeds with a neural network"),
+	'bench': ('bench.suite', "runs the benchmark suite"),
+	'enum': ('seedEnumerator', "evaluates every NxN seed"),
+	'corpus': ('seedCorpus', "inspects a seed corpus"),
+}
+workerCommands = ('serve', 'stop')
+
+def privateFolder(path):
+	# Makes sure the folder exists, belongs to this user and is closed to
+	# everyone else, creating it if need be
+	# Raises OSError if another user could get at it
+	try:
+		os.mkdir(path, 0o700)
+	except FileExistsError:
+		pass
+	info = os.lstat(path)
+	if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+		raise OSError("Refusing to use " + path + ": it must be a folder owned by you that only you can open")
+	return path
+
+def defaultSocket():
+	# One worker per user: the socket lives in the user's runtime folder if
+	# there is one, or else in a private folder of their own in the temp folder
+	runtime = os.environ.get('XDG_RUNTIME_DIR')
+	if runtime and os.path.isdir(runtime):
+		folder = os.path.join(runtime, 'thresher')
+	else:
+		import tempfile
+		folder = os.path.join(tempfile.gettempdir(), 'thresher-' + str(os.getuid()))
+	return os.path.join(privateFolder(folder), 'worker.sock')
+
+def keyFile(address):
+	# The worker's authentication key is kept beside its socket
+	return address + '.key'
+
+def checkOwner(path):
+	# Raises OSError unless the file belongs to this user, so that a socket or
+	# key planted by someone else is never trusted
+	if os.stat(path).st_uid != os.getuid():
+		raise OSError("Refusing to use " + path + ": it belongs to another user")
+
+def runCommand(command, args):
+	# Runs a tool's main() with the given arguments in this process
+	# Returns the exit code
+	module = importlib.import_module(commands[command][0])
+	sys.argv = [os.path.basename(sys.argv[0]) + ' ' + command] + list(args)
+	try:
+		module.main(args)
+	except SystemExit as stop:
+		if stop.code is None: return 0
+		if isinstance(stop.code, int): return stop.code
+		print(stop.code, file=sys.stderr)
+		return 1
+	return 0
+
+class ConnectionWriter(io.TextIOBase):
+	# Stands in for stdout or stderr in a job, sending what is written back
+	# to the client a line (or a few kilobytes) at a time
+	def __init__(self, connection, stream):
+		self.connection = connection
+		self.stream = stream
+		self.pending = []
+		self.pendingSize = 0
+	def writable(self):
+		return True
+	def isatty(self):
+		return False
+	def write(self, text):
+		self.pending.append(text)
+		self.pendingSize += len(text)
+		if '\n' in text or self.pendingSize > 4096: self.flush()
+		return len(text)
+	def flush(self):
+		if self.pending:
+			self.connection.send((self.stream, ''.join(self.pending)))
+			self.pending = []
+			self.pendingSize = 0
+
+def runJob(connection, request):
+	# The body of a forked job: runs the request with its output sent back
+	# over the connection, then reports the exit code
+	import random
+	import traceback
+	import numpy as np
+	# Every job is forked from the same worker, so without fresh seeds they
+	# would all draw the same 'random' numbers
+	random.seed()
+	np.random.seed()
+	sys.stdout = ConnectionWriter(connection, 'out')
+	sys.stderr = ConnectionWriter(connection, 'err')
+	code = 1
+	try:
+		os.chdir(request['cwd'])
+		code = runCommand(request['command'], request['args'])
+	except BaseException:
+		traceback.print_exc()
+	finally:
+		# Forked jobs leave through os._exit, which skips atexit
+		if 'instrument' in sys.modules: sys.modules['instrument'].finish()
+		try:
+			sys.stdout.flush()
+			sys.stderr.flush()
+			connection.send(('exit', code))
+		except OSError:
+			pass # the client went away
+	return code
+
+def serve(address):
+	# Imports every tool once, then forks a job for every request that comes
+	# in until told to stop
+	from multiprocessing import AuthenticationError
+	from multiprocessing.connection import Listener
+	for module, description in commands.values():
+		importlib.import_module(module)
+	# A fresh key for every worker, readable by this user only
+	authkey = os.urandom(32)
+	for path in (address, keyFile(address)):
+		if os.path.lexists(path): os.remove(path) # left behind by a killed worker
+	previousMask = os.umask(0o177)
+	try:
+		descriptor = os.open(keyFile(address), os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+		with os.fdopen(descriptor, 'wb') as keyOut:
+			keyOut.write(authkey)
+		listener = Listener(address, family='AF_UNIX', authkey=authkey)
+	finally:
+		os.umask(previousMask)
+	print("Thresher worker listening on", address, file=sys.stderr)
+	running = True
+	while running:
+		try:
+			connection = listener.accept()
+		except (AuthenticationError, OSError):
+			continue # a client without the key, or one that hung up
+		try:
+			request = connection.recv()
+		except EOFError:
+			connection.close()
+			continue
+		if request['command'] == 'stop':
+			connection.send(('exit', 0))
+			running = False
+		elif os.fork() == 0:
+			# The child never returns to the loop, and leaves through _exit
+			# so that the listener's cleanup (which removes the socket) only
+			# ever runs in the worker
+			code = runJob(connection, request)
+			os._exit(code if 0 <= code < 256 else 1)
+		connection.close()
+		# Collect any jobs that have finished since the last request
+		try:
+			while os.waitpid(-1, os.WNOHANG)[0] != 0: pass
+		except ChildProcessError:
+			pass
+	listener.close()
+	try:
+		os.remove(keyFile(address))
+	except OSError:
+		pass
+
+def connect(address, command, args):
+	# Sends a job to the worker and relays its output
+	# Returns the job's exit code, or None if no worker is listening
+	# Raises OSError if the socket or its key belong to another user
+	from multiprocessing import AuthenticationError
+	from multiprocessing.connection import Client
+	try:
+		checkOwner(address)
+		checkOwner(keyFile(address))
+		with open(keyFile(address), 'rb') as keyIn:
+			authkey = keyIn.read()
+	except FileNotFoundError:
+		return None
+	try:
+		connection = Client(address, family='AF_UNIX', authkey=authkey)
+	except (ConnectionError, FileNotFoundError):
+		return None # a socket left behind by a killed worker
+	except AuthenticationError:
+		raise OSError("The worker on " + address + " did not accept its own key")
+	with connection:
+		connection.send({'command': command, 'args': list(args), 'cwd': os.getcwd()})
+		while True:
+			try:
+				kind, value = connection.recv()
+			except EOFError:
+				print("The worker closed the connection before the job finished", file=sys.stderr)
+				return 1
+			if kind == 'exit': return value
+			stream = sys.stdout if kind == 'out' else sys.stderr
+			stream.write(value)
+			stream.flush()
+
+def splitOptions(args):
+	# Pulls thresher's own options out of the arguments given after the
+	# command, which would otherwise be handed on to the tool
+	# Returns (thresher's options, the tool's arguments)
+	ownArgs, toolArgs = [], []
+	index = 0
+	while index < len(args):
+		arg = args[index]
+		if arg == '--':
+			toolArgs.extend(args[index:])
+			break
+		if arg in ('-c', '--connect') or arg.startswith('--socket='):
+			ownArgs.append(arg)
+		elif arg == '--socket':
+			ownArgs.extend(args[index:index + 2])
+			index += 1
+		else:
+			toolArgs.append(arg)
+		index += 1
+	return ownArgs, toolArgs
+
+def main(args=None):
+	cmdArgs = argparse.ArgumentParser(description="Runs the Game of Life Thresher's tools from one place.",
+			epilog="Commands: " + "; ".join(name + ": " + entry[1] for name, entry in commands.items())
+			+ "; serve: starts a worker that keeps the tools loaded; stop: stops the worker. "
+			+ "Add -h after a command for its own options.")
+	cmdArgs.add_argument('command', type=str, choices=list(commands) + list(workerCommands), help="the tool to run")
+	cmdArgs.add_argument('args', nargs=argparse.REMAINDER, help="the options for that tool")
+	cmdArgs.add_argument('-c', '--connect', action='store_true', help="runs the command on the worker, failing if none is listening")
+	cmdArgs.add_argument('--socket', type=str, default=None, help="sets the worker's socket (default: one per user in $XDG_RUNTIME_DIR, or else in the temp folder)")
+	argVals = cmdArgs.parse_args(args)
+	# The options may also come after the command (no tool has options of
+	# the same names), and serve and stop take no others
+	ownArgs, argVals.args = splitOptions(argVals.args)
+	if argVals.command in workerCommands and argVals.args:
+		cmdArgs.error("unrecognized arguments: " + " ".join(argVals.args))
+	ownVals = cmdArgs.parse_args(ownArgs + [argVals.command])
+	argVals.connect = argVals.connect or ownVals.connect
+	argVals.socket = ownVals.socket or argVals.socket
+	try:
+		address = argVals.socket or defaultSocket()
+		if argVals.command == 'serve':
+			serve(address)
+			return 0
+		if argVals.command == 'stop':
+			if connect(address, 'stop', []) is None:
+				print("No worker is listening on", address, file=sys.stderr)
+				return 1
+			return 0
+		if argVals.connect:
+			code = connect(address, argVals.command, argVals.args)
+			if code is None:
+				print("No worker is listening on", address, "- start one with thresher.py serve, or leave out --connect", file=sys.stderr)
+				return 1
+			return code
+	except OSError as error:
+		print(error, file=sys.stderr)
+		return 1
+	return runCommand(argVals.command, argVals.args)
+
+# The self-invocation method
+if __name__ == "__main__":
+	sys.exit(main())
+# EOF